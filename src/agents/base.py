@@ -1,6 +1,15 @@
 from abc import ABC, abstractmethod
+from typing import Optional
+from pydantic import BaseModel, Field
 from llm.base import BaseLLM
 
+class AgentAnswer(BaseModel):
+    sql: Optional[str] = Field(None, description="SQL the agent answered with or last executed")
+    answer: Optional[str] = Field(None, description="Final text output of the agent")
+    prompt_tokens: Optional[int] = Field(None, description="Prompt tokens over all model calls")
+    completion_tokens: Optional[int] = Field(None, description="Completion tokens over all model calls")
+    iterations: int = Field(1, description="Model calls or agent steps taken")
+
 class BaseAgent(ABC):
     """
     Base class for all LLM agents.
@@ -22,6 +31,9 @@ class BaseAgent(ABC):
     def act(self, **kwargs) -> any:
         pass
 
-    # @abstractmethod
-    # def evaluate(self, **kwargs) -> any:
-    #     pass
\ No newline at end of file
+    @abstractmethod
+    def evaluate(self, question: str, **kwargs) -> AgentAnswer:
+        """
+        Answer a natural language question end to end, for head-to-head comparisons.
+        """
+        pass
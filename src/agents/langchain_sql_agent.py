@@ -1,15 +1,22 @@
-from .base import BaseAgent
+import time
+from .base import AgentAnswer, BaseAgent
 from langchain_community.agent_toolkits.sql.base import create_sql_agent
 from langchain_openai import ChatOpenAI
 from langchain_community.utilities import SQLDatabase
 from langchain_community.agent_toolkits import SQLDatabaseToolkit
 from langchain_community.callbacks.openai_info import OpenAICallbackHandler
+from langchain.agents.mrkl.prompt import FORMAT_INSTRUCTIONS
+from langchain_core.prompts import PromptTemplate
 from config import settings
 from typing import Optional
-from llm import openrouter_llm_info, LLMExtraConfig
-from prompts import LLMPromptTemplate
+from llm import get_openrouter_llm_info, get_shared_http_clients, LLMExtraConfig
+from prompts import LLMPromptTemplate, SQL_AGENT_PREFIX, SQL_AGENT_SUFFIX, TABLE_INFO
 from logger import housing_logger
 from utils import timer
+from db import ResultSummarizer, SharedSQLDatabase, get_duckdb_file_path
+from db.connection import DUCKDB_URI_PREFIX
+from tools.sql_tools import AgentSQLDatabaseToolkit, SummarizingSQLDatabaseToolkit
+from tools.geo_tools import get_geo_tools
 
 class LangChainSqlAgent(BaseAgent):    
     """
@@ -26,7 +33,9 @@ class LangChainSqlAgent(BaseAgent):
         self.db: SQLDatabase = None
         self.toolkit: SQLDatabaseToolkit = None
         self.agent = None
+        self.setup_seconds: Optional[float] = None
         self.token_count = OpenAICallbackHandler()
+        self.last_token_count: Optional[OpenAICallbackHandler] = None
 
     
     def set_model(self,
@@ -35,14 +44,14 @@ class LangChainSqlAgent(BaseAgent):
                   ) -> None:
         if model_id:
             # Verify if model_id allowed
-            model_info = openrouter_llm_info.get_model_info_by_id(model_id)
+            model_info = get_openrouter_llm_info().get_model_info_by_id(model_id)
             if not model_info:
                 housing_logger.error(f"Model ID '{model_id}' not found.")
                 raise ValueError(f"Model ID '{model_id}' not found.")
             self.model_name = model_info.name
         elif model_name:
             # Verify if model_name allowed
-            model_info = openrouter_llm_info.get_model_info_by_name(model_name)
+            model_info = get_openrouter_llm_info().get_model_info_by_name(model_name)
             if not model_info:
                 housing_logger.error(f"Model name '{model_name}' not found.")
                 raise ValueError(f"Model name '{model_name}' not found.")
@@ -52,11 +61,23 @@ class LangChainSqlAgent(BaseAgent):
             housing_logger.error("Either model_name or model_id must be provided.")
             raise ValueError("Either model_name or model_id must be provided.")
 
-    def setup_agent(self, db_path: str, 
-                    model_params: Optional[LLMExtraConfig]) -> None:
+    def setup_agent(self, db_path: Optional[str] = None, 
+                    model_params: Optional[LLMExtraConfig] = None,
+                    result_token_budget: Optional[int] = 500,
+                    geo_tools: bool = False,
+                    table_names: Optional[list[str]] = None,
+                    preseed_schema: bool = True) -> None:
         """
-        Setup SQL Agent for SINGLE duckdb/sqlite.
+        Setup SQL Agent for SINGLE duckdb/sqlite, the configured DuckDB by default.
+        Query results are fed back as summaries of at most result_token_budget tokens,
+        pass None to feed back raw results. geo_tools adds the estate location tools,
+        DuckDB only.
+        Only table_names are reflected, the tables with prompt descriptions by default,
+        in a SQLDatabase shared with every other agent on the file. With preseed_schema
+        their schema is in the prompt and the agent only gets the query tool, rather
+        than spending turns listing tables, fetching schemas and checking queries.
         """
+        start_time = time.perf_counter()
         if not self.model_id:
             housing_logger.error("Model not set. Call set_model() first.")
             raise ValueError("Model not set. Call set_model() first.")
@@ -66,29 +87,68 @@ class LangChainSqlAgent(BaseAgent):
         else:
             model_params = {}
 
+        http_client, http_async_client = get_shared_http_clients()
         self.model = ChatOpenAI(
             api_key=settings.openrouter_api_key,
             base_url=settings.openrouter_api_url,
             model_name=self.model_id,
+            # The shared clients pool connections, keep to the model's rate limits and retry
+            http_client=http_client,
+            http_async_client=http_async_client,
+            max_retries=0,
             **model_params,
         )
-        self.db = SQLDatabase.from_uri(db_path)
+        extra_tools = []
+        if not db_path or db_path.startswith(DUCKDB_URI_PREFIX):
+            if geo_tools:
+                extra_tools = get_geo_tools(get_duckdb_file_path(db_path))
+            # Queried read-only through the process-wide DuckDBPool, shared with the scorer
+            db_path = DUCKDB_URI_PREFIX + get_duckdb_file_path(db_path)
+        elif geo_tools:
+            housing_logger.error("Geo tools need a DuckDB database.")
+            raise ValueError("Geo tools need a DuckDB database.")
+        self.db = SharedSQLDatabase.get(
+            db_path,
+            include_tables=table_names or list(TABLE_INFO),
+        )
         if not self.db:
             housing_logger.error("Failed to connect to the database.")
             raise ValueError("Failed to connect to the database.")
 
-        self.toolkit = SQLDatabaseToolkit(db=self.db, llm=self.model)
+        if result_token_budget:
+            self.toolkit = SummarizingSQLDatabaseToolkit(
+                db=self.db,
+                llm=self.model,
+                summarizer=ResultSummarizer(token_budget=result_token_budget),
+                schema_in_prompt=preseed_schema,
+            )
+        else:
+            self.toolkit = AgentSQLDatabaseToolkit(db=self.db, llm=self.model, schema_in_prompt=preseed_schema)
 
+        prompt = None
+        if preseed_schema:
+            # create_sql_agent fills in table_names and table_info from the shared database
+            prompt = PromptTemplate.from_template("\n\n".join(
+                [SQL_AGENT_PREFIX.strip(), "{tools}", FORMAT_INSTRUCTIONS, SQL_AGENT_SUFFIX]
+            ))
         self.agent = create_sql_agent(
             llm=self.model,
             toolkit=self.toolkit,
             verbose=True,  # Add verbose for debugging
             handle_parsing_errors=True,
-            max_iterations=5
+            max_iterations=5,
+            extra_tools=extra_tools,
+            prompt=prompt,
+            agent_executor_kwargs={"return_intermediate_steps": True},
         )
         if not self.agent:
             housing_logger.error("Failed to create SQL agent.")
             raise ValueError("Failed to create SQL agent.")
+        self.setup_seconds = time.perf_counter() - start_time
+        housing_logger.info(
+            f"Set up {self.model_name} in {self.setup_seconds:.2f} seconds, "
+            f"shared databases {SharedSQLDatabase.stats()}."
+        )
 
     @timer
     def act(self, prompt: LLMPromptTemplate) -> any:
@@ -96,9 +156,11 @@ class LangChainSqlAgent(BaseAgent):
             housing_logger.error("Agent not set up. Call setup_agent() first.")
             raise ValueError("Agent not set up. Call setup_agent() first.")
         
+        # Per-call handler, self.token_count keeps the running total for the agent's lifetime
+        self.last_token_count = OpenAICallbackHandler()
         response = self.agent.invoke(
             input=prompt.user_messages, 
-            callbacks=[self.token_count]
+            callbacks=[self.last_token_count, self.token_count]
             )
 
         if not response:
@@ -106,8 +168,29 @@ class LangChainSqlAgent(BaseAgent):
             raise ValueError("Agent failed to produce a response.")
         
         # Log token usage
-        housing_logger.info(f"Prompt Tokens: {self.token_count.prompt_tokens}, "
-                            f"Completion Tokens: {self.token_count.completion_tokens}, "
-                            f"Total Tokens: {self.token_count.total_tokens}")
+        housing_logger.info(f"Prompt Tokens: {self.last_token_count.prompt_tokens}, "
+                            f"Completion Tokens: {self.last_token_count.completion_tokens}, "
+                            f"Total Tokens: {self.last_token_count.total_tokens}")
         
-        return response
\ No newline at end of file
+        return response
+
+    def evaluate(self, question: str, table_name: Optional[str] = None) -> AgentAnswer:
+        """
+        Run the agent on question and return the last SQL it executed.
+        table_name is ignored, the agent works on the tables it was set up with.
+        """
+        prompt = LLMPromptTemplate(user_messages=question)
+        response = self.act(prompt)
+        steps = response.get("intermediate_steps", [])
+        sql = None
+        for action, _ in steps:
+            if action.tool == "sql_db_query":
+                tool_input = action.tool_input
+                sql = tool_input.get("query") if isinstance(tool_input, dict) else tool_input
+        return AgentAnswer(
+            sql=sql,
+            answer=response.get("output"),
+            prompt_tokens=self.last_token_count.prompt_tokens,
+            completion_tokens=self.last_token_count.completion_tokens,
+            iterations=len(steps),
+        )
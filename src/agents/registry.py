@@ -0,0 +1,41 @@
+import importlib
+from typing import Union
+
+from logger import housing_logger
+from .base import BaseAgent
+
+# Dotted paths, so looking up one agent never imports the others' dependencies
+AGENT_REGISTRY: dict[str, Union[str, type[BaseAgent]]] = {
+    "simple_sql": "agents.sql_query_agent:SqlQueryAgent",
+    "langchain_sql": "agents.langchain_sql_agent:LangChainSqlAgent",
+}
+
+
+def register_agent(name: str, agent: Union[str, type[BaseAgent]]) -> None:
+    """
+    Register a BaseAgent subclass, or its 'module:Class' path, under name.
+    Use a path for agents run in a process pool, so workers can import them.
+    """
+    AGENT_REGISTRY[name] = agent
+
+
+def get_agent_path(name: str) -> str:
+    """
+    'module:Class' path of a registered agent, importable from a fresh process.
+    """
+    if name not in AGENT_REGISTRY:
+        housing_logger.error(f"Agent '{name}' is not registered.")
+        raise ValueError(f"Agent '{name}' is not registered.")
+    agent = AGENT_REGISTRY[name]
+    if isinstance(agent, str):
+        return agent
+    return f"{agent.__module__}:{agent.__qualname__}"
+
+
+def load_agent_class(path: str) -> type[BaseAgent]:
+    module_name, class_name = path.split(":")
+    return getattr(importlib.import_module(module_name), class_name)
+
+
+def get_agent_class(name: str) -> type[BaseAgent]:
+    return load_agent_class(get_agent_path(name))
@@ -0,0 +1,180 @@
+import asyncio
+import hashlib
+import math
+import re
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+import pyarrow as pa
+from pydantic import BaseModel, Field
+
+from db import QueryExecutor, QueryGuard, QueryOutcome, QueryResultCache
+from logger import housing_logger
+from prompts import LLMPromptTemplate
+from .sql_query_agent import SqlQueryAgent
+from .sql_stream import SqlStatementDetector
+
+
+class SqlCandidate(BaseModel):
+    sql: Optional[str] = Field(None, description="SQL extracted from the sampled response")
+    samples: int = Field(1, description="Sampled responses that produced this SQL")
+    result_key: Optional[str] = Field(None, description="Fingerprint of the result set, None if it failed")
+    rows: int = Field(0, description="Rows returned by the SQL")
+    error: Optional[str] = Field(None, description="Sampling or execution error, if any")
+
+
+class ConsistencyResult(BaseModel):
+    sql: Optional[str] = Field(None, description="Representative SQL of the majority cluster")
+    rows: Optional[list[tuple]] = Field(None, description="Result rows of the majority cluster")
+    requested: int = Field(0, description="Candidates requested from the model")
+    valid: int = Field(0, description="Candidates that executed successfully")
+    unique_sql: int = Field(0, description="Distinct SQL strings executed")
+    cluster_sizes: list[int] = Field(default_factory=list, description="Samples per result cluster, largest first")
+    agreement: float = Field(0.0, description="Share of valid samples in the majority cluster")
+    candidates: list[SqlCandidate] = Field(default_factory=list, description="Every distinct candidate")
+
+
+def normalize_sql(sql: str) -> str:
+    """
+    Whitespace-collapsed SQL without the trailing semicolon, used to deduplicate candidates.
+    """
+    return re.sub(r"\s+", " ", sql).strip().rstrip(";").strip()
+
+
+def _fingerprint_value(value: any, decimals: int) -> str:
+    if isinstance(value, float):
+        if math.isnan(value):
+            return "None"
+        value = round(value, decimals)
+        if value.is_integer():
+            value = int(value)
+    return repr(value)
+
+
+def result_fingerprint(table: pa.Table, float_tolerance: float = 1e-4) -> str:
+    """
+    Hash of a result set that ignores row order and column order, with float tolerance.
+    """
+    decimals = max(0, round(-math.log10(float_tolerance)))
+    columns = [
+        [_fingerprint_value(value, decimals) for value in column.to_pylist()]
+        for column in table.columns
+    ]
+    # Canonical column order, by each column's sorted values
+    columns.sort(key=sorted)
+    rows = sorted(zip(*columns)) if columns else []
+    payload = repr((len(columns), table.num_rows, rows))
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class SelfConsistencySampler:
+    """
+    Self-consistency voting over several SQL samples for one question.
+    Candidates are requested concurrently and each distinct SQL is executed in a worker
+    thread as soon as it arrives, so the added latency is about one model round-trip.
+    Candidates are clustered by result set and the largest cluster wins.
+    """
+
+    def __init__(
+        self,
+        agent: SqlQueryAgent,
+        n_candidates: int = 5,
+        guard: Optional[QueryGuard] = None,
+        max_workers: Optional[int] = None,
+        float_tolerance: float = 1e-4,
+        result_cache: Optional[QueryResultCache] = None,
+    ):
+        if n_candidates < 1:
+            housing_logger.error("n_candidates must be at least 1.")
+            raise ValueError("n_candidates must be at least 1.")
+        if not agent.model_params.get("temperature"):
+            housing_logger.warning(
+                "Sampling candidates without a temperature, they may all be identical."
+            )
+        self.agent = agent
+        self.n_candidates = n_candidates
+        self.guard = guard or QueryGuard()
+        self.float_tolerance = float_tolerance
+        self.result_cache = result_cache
+        self.pool = ThreadPoolExecutor(max_workers=max_workers or n_candidates)
+
+    def _execute(self, sql: str) -> QueryOutcome:
+        with self.agent.db.pool.cursor() as cursor:
+            return QueryExecutor(cursor, self.result_cache).execute_guarded_query(sql, self.guard)
+
+    async def _sample(self, prompt: LLMPromptTemplate) -> Optional[str]:
+        # Identical prompts would otherwise all be answered from the response cache
+        response = await self.agent.aact(prompt, use_cache=False)
+        detector = SqlStatementDetector()
+        detector.feed(response.content, final=True)
+        return normalize_sql(detector.statement) if detector.statement else None
+
+    async def asample(self, prompt: LLMPromptTemplate) -> ConsistencyResult:
+        loop = asyncio.get_running_loop()
+        executions: dict[str, asyncio.Future] = {}
+        samples: Counter = Counter()
+        errors: list[str] = []
+
+        for sample in asyncio.as_completed(
+            [self._sample(prompt) for _ in range(self.n_candidates)]
+        ):
+            try:
+                sql = await sample
+            except Exception as e:
+                housing_logger.error(f"Candidate request failed on {self.agent.model_name}: {e}")
+                errors.append(str(e))
+                continue
+            if not sql:
+                errors.append("No SQL in response.")
+                continue
+            samples[sql] += 1
+            if sql not in executions:
+                executions[sql] = loop.run_in_executor(self.pool, self._execute, sql)
+
+        outcomes = dict(zip(executions, await asyncio.gather(*executions.values())))
+        candidates = []
+        clusters: Counter = Counter()
+        cluster_rows: dict[str, pa.Table] = {}
+        cluster_sql: dict[str, str] = {}
+        for sql, outcome in outcomes.items():
+            candidate = SqlCandidate(sql=sql, samples=samples[sql])
+            if outcome.ok:
+                candidate.rows = outcome.table.num_rows
+                candidate.result_key = result_fingerprint(outcome.table, self.float_tolerance)
+                clusters[candidate.result_key] += candidate.samples
+                cluster_rows.setdefault(candidate.result_key, outcome.table)
+                # Most sampled SQL represents its cluster
+                best = cluster_sql.get(candidate.result_key)
+                if best is None or samples[sql] > samples[best]:
+                    cluster_sql[candidate.result_key] = sql
+            else:
+                candidate.error = outcome.error
+            candidates.append(candidate)
+        candidates.extend(SqlCandidate(samples=1, error=error) for error in errors)
+
+        result = ConsistencyResult(
+            requested=self.n_candidates,
+            valid=sum(clusters.values()),
+            unique_sql=len(outcomes),
+            cluster_sizes=sorted(clusters.values(), reverse=True),
+            candidates=candidates,
+        )
+        if clusters:
+            majority_key, majority_size = clusters.most_common(1)[0]
+            table = cluster_rows[majority_key]
+            result.sql = cluster_sql[majority_key]
+            result.rows = [tuple(row.values()) for row in table.to_pylist()]
+            result.agreement = majority_size / result.valid
+        housing_logger.info(
+            f"Self-consistency on {self.agent.model_name}: {result.valid}/{result.requested} "
+            f"valid, {result.unique_sql} distinct SQL, clusters {result.cluster_sizes}, "
+            f"agreement {result.agreement:.0%}."
+        )
+        return result
+
+    def sample(self, prompt: LLMPromptTemplate) -> ConsistencyResult:
+        return asyncio.run(self.asample(prompt))
+
+    def close(self) -> None:
+        self.pool.shutdown(wait=True)
@@ -1,18 +1,32 @@
-from .base import BaseAgent
-from llm import openrouter_llm_info, LLMExtraConfig
-from prompts import LLMPromptTemplate
+from .base import AgentAnswer, BaseAgent
+from .sql_stream import SqlStatementDetector
+from llm import get_openrouter_llm_info, get_shared_http_clients, LLMExtraConfig, LLMResponseCache
+from prompts import (
+    GEO_TOOLS_SYSTEM_MESSAGE,
+    LLMPromptTemplate,
+    create_sql_prompt_from_catalog,
+    needs_cache_control,
+)
 from logger import housing_logger
-from utils import timer
+from utils import timer, estimate_tokens
 from config import settings
-from db import DuckDBManager, QueryExecutor
+from db import DuckDBManager, QueryExecutor, SchemaCatalog
 
-from typing import Optional
-from langchain_openai import ChatOpenAI
-from langchain.chains.base import Chain
-from langchain_core.messages import AIMessage
+import time
+from contextlib import aclosing, closing
+from typing import TYPE_CHECKING, Optional
+from langchain_core.messages import AIMessage, AIMessageChunk, ToolMessage
+from langchain_core.messages.ai import add_usage
 from langchain_community.callbacks.openai_info import OpenAICallbackHandler
 from langchain_core.output_parsers import StrOutputParser
 
+if TYPE_CHECKING:
+    from langchain_core.tools import BaseTool
+    from langchain_openai import ChatOpenAI
+
+# Model calls allowed to request tools, the next one has to answer
+MAX_TOOL_ROUNDS = 3
+
 
 class SqlQueryAgent(BaseAgent):
     """
@@ -28,10 +42,29 @@ class SqlQueryAgent(BaseAgent):
 
         self.model_name: Optional[str] = None
         self.model_id: Optional[str] = None
-        self.db = DuckDBManager()
-        self.query_executor = QueryExecutor(self.db.conn)
+        self._db: Optional[DuckDBManager] = None
+        self._query_executor: Optional[QueryExecutor] = None
         self.chain = None
         self.token_count = OpenAICallbackHandler()
+        self.model_params: dict = {}
+        self.response_cache: Optional[LLMResponseCache] = None
+        self.streaming: bool = False
+        self.schema_catalog: Optional[SchemaCatalog] = None
+        self.tools: dict[str, "BaseTool"] = {}
+        self.tool_model = None
+
+    @property
+    def db(self) -> DuckDBManager:
+        # Opened on first use, so building an agent costs nothing until it queries
+        if self._db is None:
+            self._db = DuckDBManager()
+        return self._db
+
+    @property
+    def query_executor(self) -> QueryExecutor:
+        if self._query_executor is None:
+            self._query_executor = QueryExecutor(self.db.conn)
+        return self._query_executor
 
     def set_model(
         self,
@@ -39,13 +72,13 @@ class SqlQueryAgent(BaseAgent):
         model_id: Optional[str] = None,
     ) -> None:
         if model_id:
-            model_info = openrouter_llm_info.get_model_info_by_id(model_id)
+            model_info = get_openrouter_llm_info().get_model_info_by_id(model_id)
             if not model_info:
                 housing_logger.error(f"Model ID '{model_id}' not found.")
                 raise ValueError(f"Model ID '{model_id}' not found.")
             self.model_name = model_info.name
         elif model_name:
-            model_info = openrouter_llm_info.get_model_info_by_name(model_name)
+            model_info = get_openrouter_llm_info().get_model_info_by_name(model_name)
             if not model_info:
                 housing_logger.error(f"Model name '{model_name}' not found.")
                 raise ValueError(f"Model name '{model_name}' not found.")
@@ -55,21 +88,48 @@ class SqlQueryAgent(BaseAgent):
             housing_logger.error("Either model_name or model_id must be provided.")
             raise ValueError("Either model_name or model_id must be provided.")
 
-    def setup_agent(self, model_params: Optional[LLMExtraConfig]) -> None:
+    def setup_agent(
+        self,
+        model_params: Optional[LLMExtraConfig],
+        response_cache: Optional[LLMResponseCache] = None,
+        streaming: bool = False,
+        geo_tools: bool = False,
+    ) -> None:
+        """
+        streaming=True streams tokens and stops the generation as soon as the
+        first complete SQL statement has been produced. geo_tools lets the model
+        call the estate location tools before answering with SQL.
+        """
         if not self.model_id:
             housing_logger.error("Model not set. Call set_model() first.")
             raise ValueError("Model not set. Call set_model() first.")
+        if geo_tools and streaming:
+            housing_logger.error("Streaming stops at the first SQL statement, it cannot run tools.")
+            raise ValueError("Streaming stops at the first SQL statement, it cannot run tools.")
 
         if model_params:
             model_params = model_params.to_dict()
         else:
             model_params = {}
+        self.model_params = model_params
+        self.response_cache = response_cache
+        self.streaming = streaming
 
-        self.model: ChatOpenAI = ChatOpenAI(
+        # Imported here, langchain_openai is the slowest import of the stack
+        from langchain_openai import ChatOpenAI
+
+        http_client, http_async_client = get_shared_http_clients()
+        self.model: "ChatOpenAI" = ChatOpenAI(
             api_key=settings.openrouter_api_key,
             base_url=settings.openrouter_api_url,
             model_name=self.model_id,
+            # The shared clients pool connections, keep to the model's rate limits and retry
+            http_client=http_client,
+            http_async_client=http_async_client,
+            max_retries=0,
             callbacks=[self.token_count],
+            # Usage arrives in the last chunk, only when the stream runs to the end
+            stream_usage=streaming or None,
             **model_params,
         )
 
@@ -77,12 +137,241 @@ class SqlQueryAgent(BaseAgent):
             housing_logger.error("Failed to initialize the model.")
             raise ValueError("Failed to initialize the model.")
 
+        self.tools = {}
+        self.tool_model = None
+        if geo_tools:
+            from tools.geo_tools import get_geo_tools
+
+            self.tools = {tool.name: tool for tool in get_geo_tools()}
+            self.tool_model = self.model.bind_tools(list(self.tools.values()))
+
+    def _get_cached_response(self, cache_key: Optional[str]) -> Optional[AIMessage]:
+        if not cache_key:
+            return None
+        cached = self.response_cache.get(cache_key)
+        if not cached:
+            return None
+        response = AIMessage.model_validate_json(cached)
+        response.response_metadata["cached"] = True
+        response.response_metadata.pop("ttft", None)
+        return response
+
+    def _cache_response(self, cache_key: Optional[str], response: AIMessage) -> None:
+        if cache_key:
+            self.response_cache.set(
+                cache_key, self.model_id, response.model_dump_json()
+            )
+
+    def _get_cache_key(self, prompt: LLMPromptTemplate) -> Optional[str]:
+        if not self.response_cache:
+            return None
+        return LLMResponseCache.make_key(
+            self.model_id,
+            self.model_params,
+            prompt,
+            response_mode="stream" if self.streaming else None,
+        )
+
+    def _stream_response(
+        self,
+        prompt: LLMPromptTemplate,
+        detector: SqlStatementDetector,
+        response: Optional[AIMessageChunk],
+        start_time: float,
+        ttft: Optional[float],
+        stopped_early: bool,
+    ) -> AIMessage:
+        if response is None:
+            housing_logger.error("No response from the model.")
+            raise ValueError("No response from the model.")
+        response_metadata = dict(response.response_metadata)
+        response_metadata.setdefault("model_name", self.model_id)
+        response_metadata["ttft"] = ttft
+        response_metadata["stopped_early"] = stopped_early
+        usage_metadata = response.usage_metadata
+        if stopped_early:
+            # The provider never sent usage for the cancelled stream, estimate it instead
+            prompt_tokens = estimate_tokens(prompt.to_str())
+            completion_tokens = estimate_tokens(detector.text)
+            usage_metadata = {
+                "input_tokens": prompt_tokens,
+                "output_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            }
+            housing_logger.info(
+                f"Stopped {self.model_name} after the first SQL statement "
+                f"({time.perf_counter() - start_time:.2f} seconds, ~{completion_tokens} completion tokens)."
+            )
+        return AIMessage(
+            content=detector.statement or response.content,
+            response_metadata=response_metadata,
+            usage_metadata=usage_metadata,
+        )
+
+    def _stream(self, prompt: LLMPromptTemplate) -> AIMessage:
+        detector = SqlStatementDetector()
+        response: Optional[AIMessageChunk] = None
+        ttft = None
+        stopped_early = False
+        start_time = time.perf_counter()
+        # Closing the generator closes the HTTP stream, which cancels the generation
+        with closing(self.model.stream(input=prompt.to_list())) as stream:
+            for chunk in stream:
+                if ttft is None and chunk.content:
+                    ttft = time.perf_counter() - start_time
+                response = chunk if response is None else response + chunk
+                if detector.feed(chunk.content):
+                    stopped_early = True
+                    break
+            else:
+                detector.feed("", final=True)
+        return self._stream_response(
+            prompt, detector, response, start_time, ttft, stopped_early
+        )
+
+    async def _astream(self, prompt: LLMPromptTemplate) -> AIMessage:
+        detector = SqlStatementDetector()
+        response: Optional[AIMessageChunk] = None
+        ttft = None
+        stopped_early = False
+        start_time = time.perf_counter()
+        async with aclosing(self.model.astream(input=prompt.to_list())) as stream:
+            async for chunk in stream:
+                if ttft is None and chunk.content:
+                    ttft = time.perf_counter() - start_time
+                response = chunk if response is None else response + chunk
+                if detector.feed(chunk.content):
+                    stopped_early = True
+                    break
+            else:
+                detector.feed("", final=True)
+        return self._stream_response(
+            prompt, detector, response, start_time, ttft, stopped_early
+        )
+
+    def _prepare_prompt(self, prompt: LLMPromptTemplate) -> LLMPromptTemplate:
+        update = {}
+        if self.tools:
+            update["system_messages"] = (prompt.system_messages or "") + GEO_TOOLS_SYSTEM_MESSAGE
+        if needs_cache_control(self.model_id):
+            update["cache_control"] = True
+        return prompt.model_copy(update=update) if update else prompt
+
+    def _tool_round_model(self, tool_round: int):
+        return self.tool_model if tool_round < MAX_TOOL_ROUNDS else self.model
+
+    def _run_tool_calls(self, messages: list, response: AIMessage) -> None:
+        messages.append(response)
+        for tool_call in response.tool_calls:
+            tool = self.tools.get(tool_call["name"])
+            if tool is None:
+                content = f"Error: unknown tool '{tool_call['name']}'."
+            else:
+                content = tool.invoke(tool_call["args"])
+            messages.append(ToolMessage(content=content, tool_call_id=tool_call["id"]))
+
+    @staticmethod
+    def _total_usage(response: AIMessage, usages: list[Optional[dict]], model_calls: int) -> AIMessage:
+        usages = [usage for usage in usages if usage]
+        if usages:
+            total = usages[0]
+            for usage in usages[1:]:
+                total = add_usage(total, usage)
+            response.usage_metadata = total
+        response.response_metadata["model_calls"] = model_calls
+        return response
+
+    def _invoke_with_tools(self, prompt: LLMPromptTemplate) -> AIMessage:
+        messages = prompt.to_list()
+        usages = []
+        for tool_round in range(MAX_TOOL_ROUNDS + 1):
+            response: AIMessage = self._tool_round_model(tool_round).invoke(input=messages)
+            usages.append(response.usage_metadata)
+            if not response.tool_calls:
+                break
+            self._run_tool_calls(messages, response)
+        return self._total_usage(response, usages, tool_round + 1)
+
+    async def _ainvoke_with_tools(self, prompt: LLMPromptTemplate) -> AIMessage:
+        messages = prompt.to_list()
+        usages = []
+        for tool_round in range(MAX_TOOL_ROUNDS + 1):
+            response: AIMessage = await self._tool_round_model(tool_round).ainvoke(input=messages)
+            usages.append(response.usage_metadata)
+            if not response.tool_calls:
+                break
+            # Index lookups take well under a millisecond, no need to leave the event loop
+            self._run_tool_calls(messages, response)
+        return self._total_usage(response, usages, tool_round + 1)
+
     @timer
-    def act(self, prompt: LLMPromptTemplate) -> Optional[AIMessage]:
-        full_prompt = prompt.to_list()
-        response: AIMessage = self.model.invoke(input=full_prompt)
+    def act(self, prompt: LLMPromptTemplate, use_cache: bool = True) -> Optional[AIMessage]:
+        prompt = self._prepare_prompt(prompt)
+        cache_key = self._get_cache_key(prompt) if use_cache else None
+        cached = self._get_cached_response(cache_key)
+        if cached:
+            return cached
+
+        if self.streaming:
+            response = self._stream(prompt)
+            self._cache_response(cache_key, response)
+            return response
+
+        if self.tools:
+            response = self._invoke_with_tools(prompt)
+        else:
+            response: AIMessage = self.model.invoke(input=prompt.to_list())
         if not response:
             housing_logger.error("No response from the model.")
             raise ValueError("No response from the model.")
+        self._cache_response(cache_key, response)
         return response
-   
\ No newline at end of file
+
+    async def aact(self, prompt: LLMPromptTemplate, use_cache: bool = True) -> Optional[AIMessage]:
+        """
+        Async counterpart of act(), used by the evaluation runner to fan out requests.
+        use_cache=False skips the response cache, e.g. to draw several samples.
+        """
+        prompt = self._prepare_prompt(prompt)
+        cache_key = self._get_cache_key(prompt) if use_cache else None
+        cached = self._get_cached_response(cache_key)
+        if cached:
+            return cached
+
+        if self.streaming:
+            response = await self._astream(prompt)
+            self._cache_response(cache_key, response)
+            return response
+
+        if self.tools:
+            response = await self._ainvoke_with_tools(prompt)
+        else:
+            response: AIMessage = await self.model.ainvoke(input=prompt.to_list())
+        if not response:
+            housing_logger.error("No response from the model.")
+            raise ValueError("No response from the model.")
+        self._cache_response(cache_key, response)
+        return response
+
+    def evaluate(self, question: str, table_name: str = "estate_info") -> AgentAnswer:
+        """
+        Prompt with the catalog schema of table_name and return the generated SQL.
+        """
+        if self.schema_catalog is None:
+            self.schema_catalog = SchemaCatalog(self.db.conn, self.db.db_path).load()
+        prompt = create_sql_prompt_from_catalog(
+            user_question=question,
+            schema_catalog=self.schema_catalog,
+            table_names=[table_name],
+        )
+        response = self.act(prompt)
+        detector = SqlStatementDetector()
+        detector.feed(response.content, final=True)
+        usage = response.usage_metadata or {}
+        return AgentAnswer(
+            sql=detector.statement,
+            answer=response.content,
+            prompt_tokens=usage.get("input_tokens"),
+            completion_tokens=usage.get("output_tokens"),
+            iterations=response.response_metadata.get("model_calls", 1),
+        )
@@ -0,0 +1,160 @@
+from typing import Optional
+
+THINK_OPEN = "<think>"
+THINK_CLOSE = "</think>"
+FENCE = "```"
+# Words an unfenced statement may start with, and the lookahead to match them and the next character
+SQL_START_KEYWORDS = ("SELECT", "WITH")
+KEYWORD_LOOKAHEAD = max(len(keyword) for keyword in SQL_START_KEYWORDS) + 1
+
+
+class SqlStatementDetector:
+    """
+    Incrementally scan streamed model output for the end of the first SQL statement.
+    Inside a markdown fence the statement is whatever follows the opening fence. Without
+    one it starts at SELECT or WITH, uppercase or at the start of a line, so leading
+    prose is skipped, and a fence showing up later still restarts it after the fence.
+    A statement ends at a semicolon outside quotes, comments and parentheses, or at the
+    closing markdown fence. Each character is scanned once, however the text is chunked.
+    Leading <think> blocks from reasoning models are skipped.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.position = 0
+        self.start: Optional[int] = None
+        self.end: Optional[int] = None
+        self.depth = 0
+        self.quote: Optional[str] = None
+        self.line_comment = False
+        self.block_comment = False
+        self.fenced = False
+        self._at_line_start = True
+        self._skipped_think = False
+
+    @property
+    def complete(self) -> bool:
+        return self.end is not None
+
+    @property
+    def statement(self) -> Optional[str]:
+        """
+        The statement found so far, without fences, ending with its semicolon if it had one.
+        """
+        if self.start is None:
+            return None
+        text = self.text[self.start : self.end]
+        if self.fenced and text[:3].lower() == "sql":
+            text = text[3:]
+        return text.strip() or None
+
+    def _skip_think(self) -> bool:
+        if self._skipped_think:
+            return True
+        stripped = self.text.lstrip()
+        if not stripped:
+            return False
+        if not THINK_OPEN.startswith(stripped[: len(THINK_OPEN)]):
+            self._skipped_think = True
+            return True
+        if len(stripped) < len(THINK_OPEN):
+            return False
+        close = self.text.find(THINK_CLOSE)
+        if close == -1:
+            return False
+        self.position = close + len(THINK_CLOSE)
+        self._skipped_think = True
+        return True
+
+    def _open_fence(self) -> None:
+        # Anything before the fence was prose, scan the statement afresh after it
+        self.fenced = True
+        self.start = None
+        self.depth = 0
+        self.quote = None
+        self.line_comment = False
+        self.block_comment = False
+
+    def _keyword_at(self, text: str, i: int) -> bool:
+        if i > 0 and (text[i - 1].isalnum() or text[i - 1] == "_"):
+            return False
+        for keyword in SQL_START_KEYWORDS:
+            word = text[i : i + len(keyword)]
+            if word == keyword or (self._at_line_start and word.upper() == keyword):
+                after = text[i + len(keyword) : i + len(keyword) + 1]
+                return not after or after.isspace() or after == "("
+        return False
+
+    def feed(self, chunk: str, final: bool = False) -> bool:
+        """
+        Append a chunk and return True once a complete statement has been seen.
+        final=True marks the end of the stream and scans the lookahead tail too.
+        """
+        if self.complete:
+            return True
+        self.text += chunk
+        if not self._skip_think():
+            return False
+
+        # Keep two characters of lookahead for '--', '/*', '*/' and fences split across chunks
+        limit = len(self.text) if final else len(self.text) - 2
+        keyword_limit = len(self.text) if final else len(self.text) - KEYWORD_LOOKAHEAD
+        text = self.text
+        i = self.position
+        while i < limit:
+            char = text[i]
+            if self.start is None:
+                if text.startswith(FENCE, i):
+                    self._open_fence()
+                    i += len(FENCE)
+                    continue
+                if self.fenced:
+                    if char.isspace() or char == "`":
+                        i += 1
+                        continue
+                    self.start = i
+                elif i >= keyword_limit:
+                    break
+                elif self._keyword_at(text, i):
+                    self.start = i
+                else:
+                    # Prose is not tokenized, its apostrophes would open quotes
+                    self._at_line_start = char == "\n" or (self._at_line_start and char.isspace())
+                    i += 1
+                    continue
+            if self.line_comment:
+                self.line_comment = char != "\n"
+            elif self.block_comment:
+                if text.startswith("*/", i):
+                    self.block_comment = False
+                    i += 1
+            elif self.quote:
+                if char == self.quote:
+                    self.quote = None
+            elif char in ("'", '"'):
+                self.quote = char
+            elif text.startswith("--", i):
+                self.line_comment = True
+            elif text.startswith("/*", i):
+                self.block_comment = True
+                i += 1
+            elif char == "(":
+                self.depth += 1
+            elif char == ")":
+                self.depth = max(self.depth - 1, 0)
+            elif char == ";" and self.depth == 0:
+                self.end = i + 1
+                break
+            elif text.startswith(FENCE, i):
+                if not self.fenced:
+                    self._open_fence()
+                    i += len(FENCE)
+                    continue
+                self.end = i
+                break
+            i += 1
+        self.position = i
+
+        if final and not self.complete and self.start is not None:
+            self.end = len(self.text)
+        return self.complete
@@ -16,6 +16,19 @@ class EvalSettings(BaseSettings):
     llm_info_json_path: Optional[str] = Field(
         default="src/llm/model_info.json", env="LLM_INFO_JSON_PATH"
     )
+    # Saved copy of OpenRouter's /api/v1/models response, merged into the model info
+    openrouter_catalogue_path: Optional[str] = Field(
+        default=None, env="OPENROUTER_CATALOGUE_PATH"
+    )
+    llm_info_reload_interval: float = Field(default=5.0, env="LLM_INFO_RELOAD_INTERVAL")
+
+    eval_cache_dir: str = Field(default=".cache", env="EVAL_CACHE_DIR")
+
+    llm_cache_path: str = Field(
+        default=".cache/llm_responses.sqlite", env="LLM_CACHE_PATH"
+    )
+    llm_cache_max_mb: float = Field(default=512, env="LLM_CACHE_MAX_MB")
+    llm_cache_bypass: bool = Field(default=False, env="LLM_CACHE_BYPASS")
 
     model_config = SettingsConfigDict(
         case_sensitive=False, env_file=".env", env_file_encoding="utf-8"
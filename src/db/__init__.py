@@ -1,2 +1,26 @@
-from .connection import DuckDBManager
-from .sql_queries import QueryExecutor
\ No newline at end of file
+from utils import lazy_exports
+
+# Submodules are imported on first use, so importing one name does not pull in all of db
+_EXPORTS = {
+    "DuckDBManager": ".connection",
+    "DuckDBPool": ".connection",
+    "get_db_fingerprint": ".connection",
+    "get_duckdb_file_path": ".connection",
+    "QueryExecutor": ".sql_queries",
+    "SchemaCatalog": ".schema_catalog",
+    "TableInfo": ".schema_catalog",
+    "ColumnInfo": ".schema_catalog",
+    "QueryGuard": ".query_guard",
+    "QueryOutcome": ".query_guard",
+    "QueryStatus": ".query_guard",
+    "QueryResultCache": ".result_cache",
+    "canonicalize_sql": ".result_cache",
+    "SharedSQLDatabase": ".sql_database",
+    "SplitEngine": ".splits",
+    "create_synthetic_estate_db": ".synthetic",
+    "ResultSummarizer": ".result_summary",
+    "ResultSummary": ".result_summary",
+    "ColumnStats": ".result_summary",
+}
+__all__ = list(_EXPORTS)
+__getattr__, __dir__ = lazy_exports(__name__, _EXPORTS)
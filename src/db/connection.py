@@ -1,18 +1,186 @@
 import duckdb
+import hashlib
+import os
+import threading
+from contextlib import contextmanager
+from duckdb import DuckDBPyConnection
+from typing import Iterator, Optional
 from logger import housing_logger
 from config import settings
 
-class DuckDBManager:
-    def __init__(self):
-        self.db_path = settings.duckdb_path
-        self.conn = duckdb.connect(database=self.db_path)
+DUCKDB_URI_PREFIX = "duckdb:///"
+FINGERPRINT_CHUNK_SIZE = 1024 * 1024
+
+
+def get_duckdb_file_path(db_path: Optional[str] = None) -> str:
+    """
+    Resolve DuckDB file path, stripping the SQLAlchemy style 'duckdb:///' prefix used by LangChain.
+    """
+    db_path = db_path or settings.duckdb_path
+    if db_path and db_path.startswith(DUCKDB_URI_PREFIX):
+        db_path = db_path[len(DUCKDB_URI_PREFIX):]
+    return db_path
+
+
+def get_db_fingerprint(db_path: Optional[str] = None) -> str:
+    """
+    Cheap fingerprint of a DuckDB file: size, mtime and a hash of its first and last chunks.
+    Changes whenever the crawler writes a new snapshot, without hashing the whole file.
+    """
+    db_path = get_duckdb_file_path(db_path)
+    stat = os.stat(db_path)
+    digest = hashlib.sha256(f"{stat.st_size}:{stat.st_mtime_ns}".encode())
+    with open(db_path, "rb") as f:
+        digest.update(f.read(FINGERPRINT_CHUNK_SIZE))
+        if stat.st_size > FINGERPRINT_CHUNK_SIZE:
+            f.seek(max(stat.st_size - FINGERPRINT_CHUNK_SIZE, FINGERPRINT_CHUNK_SIZE))
+            digest.update(f.read(FINGERPRINT_CHUNK_SIZE))
+    return digest.hexdigest()[:16]
+
+
+class DuckDBPool:
+    """
+    Process-wide DuckDB connection per database file, handing out cursors.
+    Cursors share the underlying database instance, so concurrent readers
+    neither reopen the file nor fight over its write lock.
+    Model-generated SQL runs on these cursors, so unless external_access is set the
+    database opens with access to other files and the network turned off and its
+    configuration locked. DuckDB opens a file once per process and refuses a second
+    configuration, so everything reading the file should go through the pool.
+    """
+
+    _pools: dict[str, "DuckDBPool"] = {}
+    _pools_lock = threading.Lock()
+
+    def __init__(
+        self,
+        db_path: str,
+        read_only: bool = True,
+        max_idle_cursors: int = 16,
+        external_access: bool = False,
+    ):
+        self.db_path = db_path
+        self.read_only = read_only
+        self.external_access = external_access
+        self.max_idle_cursors = max_idle_cursors
+        config = {} if external_access else {"enable_external_access": False, "lock_configuration": True}
+        self.conn = duckdb.connect(database=db_path, read_only=read_only, config=config)
         if not self.conn:
-            housing_logger.error(f"Failed to connect to DuckDB at {self.db_path}")
-            raise ConnectionError(f"Failed to connect to DuckDB at {self.db_path}")
-        housing_logger.info(f"Connected to DuckDB at {self.db_path}")
+            housing_logger.error(f"Failed to connect to DuckDB at {db_path}")
+            raise ConnectionError(f"Failed to connect to DuckDB at {db_path}")
+        housing_logger.info(
+            f"Connected to DuckDB at {db_path} (read_only={read_only}, external_access={external_access})"
+        )
+
+        self._lock = threading.Lock()
+        self._idle: list[DuckDBPyConnection] = []
+        self._local = threading.local()
+        self._thread_cursors: list[DuckDBPyConnection] = []
+        self.cursors_created = 0
+        self.checkouts = 0
+        self.in_use = 0
+        self.peak_in_use = 0
+
+    @classmethod
+    def get_pool(
+        cls, db_path: Optional[str] = None, read_only: bool = True, external_access: bool = False
+    ) -> "DuckDBPool":
+        db_path = get_duckdb_file_path(db_path)
+        with cls._pools_lock:
+            pool = cls._pools.get(db_path)
+            if pool is None:
+                pool = cls(db_path, read_only=read_only, external_access=external_access)
+                cls._pools[db_path] = pool
+            # DuckDB refuses a second connection to one file with another configuration
+            elif pool.read_only and not read_only:
+                housing_logger.error(f"DuckDB at {db_path} is already open read-only.")
+                raise ValueError(f"DuckDB at {db_path} is already open read-only.")
+            elif pool.external_access != external_access:
+                housing_logger.error(
+                    f"DuckDB at {db_path} is already open with external_access={pool.external_access}."
+                )
+                raise ValueError(
+                    f"DuckDB at {db_path} is already open with external_access={pool.external_access}."
+                )
+            return pool
+
+    def _new_cursor(self) -> DuckDBPyConnection:
+        cursor = self.conn.cursor()
+        self.cursors_created += 1
+        return cursor
+
+    @contextmanager
+    def cursor(self) -> Iterator[DuckDBPyConnection]:
+        """
+        Check out a cursor for the duration of a with-block.
+        """
+        with self._lock:
+            cursor = self._idle.pop() if self._idle else self._new_cursor()
+            self.checkouts += 1
+            self.in_use += 1
+            self.peak_in_use = max(self.peak_in_use, self.in_use)
+        try:
+            yield cursor
+        finally:
+            with self._lock:
+                self.in_use -= 1
+                if len(self._idle) < self.max_idle_cursors:
+                    self._idle.append(cursor)
+                else:
+                    cursor.close()
+
+    def thread_cursor(self) -> DuckDBPyConnection:
+        """
+        Cursor bound to the calling thread, created on first use.
+        """
+        cursor = getattr(self._local, "cursor", None)
+        if cursor is None:
+            with self._lock:
+                cursor = self._new_cursor()
+                self._thread_cursors.append(cursor)
+            self._local.cursor = cursor
+        return cursor
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "db_path": self.db_path,
+                "read_only": self.read_only,
+                "external_access": self.external_access,
+                "cursors_created": self.cursors_created,
+                "checkouts": self.checkouts,
+                "in_use": self.in_use,
+                "peak_in_use": self.peak_in_use,
+                "idle": len(self._idle),
+                "thread_cursors": len(self._thread_cursors),
+            }
+
+    def close(self) -> None:
+        with self._lock:
+            for cursor in self._idle + self._thread_cursors:
+                cursor.close()
+            self._idle.clear()
+            self._thread_cursors.clear()
+            self.conn.close()
+        with DuckDBPool._pools_lock:
+            if DuckDBPool._pools.get(self.db_path) is self:
+                del DuckDBPool._pools[self.db_path]
+        housing_logger.info(f"Closed DuckDB pool at {self.db_path}")
+
+
+class DuckDBManager:
+    """
+    Per-agent handle on the shared DuckDBPool, with its own cursor as conn.
+    Opens read-only by default, pass read_only=False for writes such as train/test splits.
+    """
+
+    def __init__(self, read_only: bool = True):
+        self.db_path = get_duckdb_file_path(settings.duckdb_path)
+        self.pool = DuckDBPool.get_pool(self.db_path, read_only=read_only)
+        self.conn = self.pool.conn.cursor()
 
     def close_connection(self):
         if self.conn:
-            housing_logger.info(f"Closing DuckDB connection at {self.db_path}")
+            housing_logger.info(f"Closing DuckDB cursor at {self.db_path}")
             self.conn.close()
-            self.conn = None
\ No newline at end of file
+            self.conn = None
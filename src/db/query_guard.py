@@ -0,0 +1,206 @@
+import json
+import threading
+import time
+from enum import Enum
+from typing import Optional
+
+import duckdb
+import pyarrow as pa
+from duckdb import DuckDBPyConnection
+from pydantic import BaseModel, ConfigDict, Field
+
+from logger import housing_logger
+
+class QueryStatus(str, Enum):
+    OK = "ok"
+    REJECTED = "rejected"
+    TIMEOUT = "timeout"
+    ERROR = "error"
+
+
+class QueryOutcome(BaseModel):
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    status: QueryStatus = Field(QueryStatus.OK, description="How the execution ended")
+    query: str = Field(..., description="Query as submitted")
+    executed_query: Optional[str] = Field(None, description="Query actually run, after LIMIT injection")
+    table: Optional[pa.Table] = Field(None, description="Result table when status is ok")
+    estimated_rows: Optional[int] = Field(None, description="Largest operator cardinality from EXPLAIN")
+    elapsed: float = Field(0.0, description="Wall-clock seconds spent executing")
+    error: Optional[str] = Field(None, description="Rejection reason or error message")
+    cached: bool = Field(False, description="Result served from a QueryResultCache")
+
+    @property
+    def ok(self) -> bool:
+        return self.status == QueryStatus.OK
+
+
+def _strip_terminator(query: str) -> str:
+    """
+    Query up to its last character of code, dropping trailing semicolons and comments.
+    Semicolons and comment markers inside string literals and quoted identifiers are kept.
+    """
+    end = 0
+    index = 0
+    while index < len(query):
+        char = query[index]
+        if query.startswith("--", index):
+            newline = query.find("\n", index)
+            index = len(query) if newline == -1 else newline
+            continue
+        if query.startswith("/*", index):
+            close = query.find("*/", index + 2)
+            index = len(query) if close == -1 else close + 2
+            continue
+        if char in ("'", '"'):
+            close = query.find(char, index + 1)
+            # A doubled quote escapes itself and simply reads as two literals here
+            index = len(query) if close == -1 else close + 1
+            end = index
+            continue
+        if not char.isspace() and char != ";":
+            end = index + 1
+        index += 1
+    return query[:end]
+
+
+def _estimate_node(node: dict) -> int:
+    children = [_estimate_node(child) for child in node.get("children", [])]
+    estimate = node.get("extra_info", {}).get("Estimated Cardinality")
+    if estimate is not None:
+        try:
+            return int(estimate)
+        except (TypeError, ValueError):
+            pass
+    if "CROSS_PRODUCT" in node.get("name", "") and children:
+        product = 1
+        for child in children:
+            product *= max(child, 1)
+        return product
+    return max(children, default=0)
+
+
+def _max_estimate(node: dict) -> int:
+    # Largest intermediate result, not just the final one, is what blows memory
+    return max(
+        [_estimate_node(node)] + [_max_estimate(child) for child in node.get("children", [])]
+    )
+
+
+class QueryGuard:
+    """
+    Pre-execution guard for model-generated SQL.
+    Allows a single read-only SELECT, rejects plans whose EXPLAIN cardinality is too large,
+    caps returned rows with an injected LIMIT and interrupts queries running past the timeout.
+    Failures come back as a QueryOutcome instead of an exception.
+    """
+
+    def __init__(
+        self,
+        max_rows: int = 10_000,
+        max_estimated_rows: int = 50_000_000,
+        timeout: float = 10.0,
+    ):
+        self.max_rows = max_rows
+        self.max_estimated_rows = max_estimated_rows
+        self.timeout = timeout
+
+    def validate(self, conn: DuckDBPyConnection, query: str) -> Optional[str]:
+        """
+        Return the rejection reason, or None if the query may run.
+        """
+        try:
+            statements = conn.extract_statements(query)
+        except duckdb.Error as e:
+            return f"Failed to parse query: {e}"
+        if len(statements) != 1:
+            return f"Expected a single statement, got {len(statements)}."
+        if statements[0].type != duckdb.StatementType.SELECT:
+            return f"Only SELECT statements are allowed, got {statements[0].type.name}."
+        return None
+
+    def check_file_access(self, conn: DuckDBPyConnection) -> Optional[str]:
+        """
+        Return the rejection reason if conn's database may read other files or the
+        network, as read_csv and friends or a quoted file path used as a table would.
+        The guard does not change the setting, run model SQL on a DuckDBPool cursor,
+        which opens the database with it turned off and locked.
+        """
+        external_access = conn.execute("SELECT current_setting('enable_external_access')").fetchone()[0]
+        if external_access:
+            return "Model SQL needs a connection with external access disabled, e.g. a DuckDBPool cursor."
+        return None
+
+    def estimate_rows(self, conn: DuckDBPyConnection, query: str) -> Optional[int]:
+        try:
+            plan = conn.execute(f"EXPLAIN (FORMAT JSON) {query}").fetchall()
+            nodes = json.loads(plan[0][1])
+        except Exception as e:
+            housing_logger.warning(f"Could not estimate query cardinality: {e}")
+            return None
+        return max((_max_estimate(node) for node in nodes), default=0)
+
+    def apply_limit(self, query: str, max_rows: Optional[int] = None) -> str:
+        # The newline keeps a comment the strip missed from swallowing the parenthesis
+        query = _strip_terminator(query)
+        return f"SELECT * FROM (\n{query}\n) AS guarded_query LIMIT {max_rows or self.max_rows}"
+
+    def execute(
+        self, conn: DuckDBPyConnection, query: str, max_rows: Optional[int] = None
+    ) -> QueryOutcome:
+        """
+        Run query on conn, which should be a cursor owned by the calling thread,
+        since the watchdog interrupts whatever that connection is running.
+        max_rows overrides the guard's row cap for this call.
+        """
+        outcome = QueryOutcome(query=query)
+        reason = self.validate(conn, query) or self.check_file_access(conn)
+        if reason:
+            outcome.status = QueryStatus.REJECTED
+            outcome.error = reason
+            return outcome
+
+        outcome.estimated_rows = self.estimate_rows(conn, query)
+        if outcome.estimated_rows and outcome.estimated_rows > self.max_estimated_rows:
+            outcome.status = QueryStatus.REJECTED
+            outcome.error = (
+                f"Estimated {outcome.estimated_rows} intermediate rows, "
+                f"above the limit of {self.max_estimated_rows}."
+            )
+            return outcome
+
+        outcome.executed_query = self.apply_limit(query, max_rows)
+        timed_out = threading.Event()
+        finished = False
+        finished_lock = threading.Lock()
+
+        def interrupt() -> None:
+            # Once the query finished, conn may already run the caller's next statement
+            with finished_lock:
+                if finished:
+                    return
+                timed_out.set()
+                conn.interrupt()
+
+        watchdog = threading.Timer(self.timeout, interrupt)
+        watchdog.daemon = True
+        start_time = time.perf_counter()
+        watchdog.start()
+        try:
+            outcome.table = conn.execute(outcome.executed_query).fetch_arrow_table()
+        except duckdb.PermissionException as e:
+            outcome.status = QueryStatus.REJECTED
+            outcome.error = f"File access is not allowed: {e}"
+        except Exception as e:
+            if timed_out.is_set():
+                outcome.status = QueryStatus.TIMEOUT
+                outcome.error = f"Query interrupted after {self.timeout} seconds."
+            else:
+                outcome.status = QueryStatus.ERROR
+                outcome.error = str(e)
+        finally:
+            with finished_lock:
+                finished = True
+            watchdog.cancel()
+            outcome.elapsed = time.perf_counter() - start_time
+        return outcome
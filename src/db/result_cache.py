@@ -0,0 +1,327 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Optional
+
+import pyarrow as pa
+from duckdb import DuckDBPyConnection
+
+from config import settings
+from logger import housing_logger
+from .connection import get_db_fingerprint, get_duckdb_file_path
+
+# Results of these change between executions, so queries calling them are never cached
+VOLATILE_FUNCTIONS = {
+    "random",
+    "setseed",
+    "uuid",
+    "gen_random_uuid",
+    "now",
+    "today",
+    "current_date",
+    "current_time",
+    "current_timestamp",
+    "get_current_time",
+    "get_current_timestamp",
+    "transaction_timestamp",
+    "nextval",
+    "currval",
+}
+TABLE_REF_TYPES = {"BASE_TABLE", "SUBQUERY", "TABLE_FUNCTION", "JOIN", "EXPRESSION_LIST"}
+SOURCE_TYPES = {"BASE_TABLE", "SUBQUERY", "TABLE_FUNCTION", "EXPRESSION_LIST"}
+LOWERCASE_KEYS = {"table_name", "schema_name", "catalog_name", "schema", "catalog", "function_name"}
+
+
+def _is_table_ref(node: dict) -> bool:
+    # "type" also holds nested value types, which are dicts
+    return isinstance(node.get("type"), str) and node["type"] in TABLE_REF_TYPES
+
+
+def _collect(
+    node: any,
+    sources: list[dict],
+    table_aliases: list[str],
+    column_refs: set[str],
+    volatile: list[str],
+) -> None:
+    if isinstance(node, list):
+        for child in node:
+            _collect(child, sources, table_aliases, column_refs, volatile)
+        return
+    if not isinstance(node, dict):
+        return
+    if _is_table_ref(node) and node["type"] in SOURCE_TYPES:
+        sources.append(node)
+    if _is_table_ref(node) and node.get("alias"):
+        alias = node["alias"].lower()
+        if alias not in table_aliases:
+            table_aliases.append(alias)
+    if node.get("class") == "COLUMN_REF" and len(node.get("column_names", [])) == 1:
+        column_refs.add(node["column_names"][0].lower())
+    if str(node.get("function_name", "")).lower() in VOLATILE_FUNCTIONS:
+        volatile.append(node["function_name"])
+    for value in node.values():
+        _collect(value, sources, table_aliases, column_refs, volatile)
+
+
+def _canonical(node: any, table_aliases: dict[str, Optional[str]]) -> any:
+    """
+    Copy of a parse tree node with locations removed and identifiers lowercased.
+    table_aliases maps alias names to canonical ones, None dropping the alias and
+    any column qualifier using it.
+    """
+    if isinstance(node, list):
+        return [_canonical(child, table_aliases) for child in node]
+    if not isinstance(node, dict):
+        return node
+    canonical = {}
+    for key, value in node.items():
+        if key == "query_location":
+            continue
+        if key in LOWERCASE_KEYS and isinstance(value, str):
+            value = value.lower()
+        elif key == "alias" and isinstance(value, str):
+            value = value.lower()
+            if _is_table_ref(node) and value in table_aliases:
+                value = table_aliases[value] or ""
+        elif key == "column_names" and node.get("class") == "COLUMN_REF":
+            value = [name.lower() for name in value]
+            # Only qualifiers are renamed, a bare name may be a real column
+            if len(value) > 1 and value[0] in table_aliases:
+                if table_aliases[value[0]] is None:
+                    value = value[1:]
+                else:
+                    value[0] = table_aliases[value[0]]
+        else:
+            value = _canonical(value, table_aliases)
+        canonical[key] = value
+    return canonical
+
+
+def canonicalize_sql(conn: DuckDBPyConnection, query: str) -> Optional[str]:
+    """
+    Canonical form of a single SELECT, from DuckDB's own parse tree.
+    Whitespace, keyword and identifier casing, trailing semicolons, table alias names
+    and unreferenced output column aliases do not change it. Returns None for anything
+    that should not be cached: non-SELECTs, several statements, parse errors and
+    queries calling volatile functions.
+    """
+    try:
+        serialized = conn.execute("SELECT json_serialize_sql(?)", [query]).fetchone()[0]
+    except Exception as e:
+        housing_logger.warning(f"Could not serialize query for the result cache: {e}")
+        return None
+    tree = json.loads(serialized)
+    if tree.get("error") or len(tree.get("statements", [])) != 1:
+        return None
+    node = tree["statements"][0]["node"]
+
+    sources: list[dict] = []
+    table_aliases: list[str] = []
+    column_refs: set[str] = set()
+    volatile: list[str] = []
+    _collect(node, sources, table_aliases, column_refs, volatile)
+    if volatile:
+        return None
+    canonical_aliases: dict[str, Optional[str]] = {
+        alias: f"$t{i}" for i, alias in enumerate(table_aliases)
+    }
+    if len(sources) == 1 and sources[0]["type"] == "BASE_TABLE":
+        # With a single table every qualifier is redundant, so e.name, estate_info.name
+        # and name are the same column
+        table = sources[0]
+        canonical_aliases = {table["table_name"].lower(): None}
+        if table.get("alias"):
+            canonical_aliases[table["alias"].lower()] = None
+    if node.get("type") == "SELECT_NODE":
+        # Output aliases only name the result columns, which are restored on a hit
+        for item in node["select_list"]:
+            if item.get("alias") and item["alias"].lower() not in column_refs:
+                item["alias"] = ""
+    canonical = _canonical(node, canonical_aliases)
+    return json.dumps(canonical, sort_keys=True, separators=(",", ":"))
+
+
+class QueryResultCache:
+    """
+    Result cache for read-only SELECTs, keyed on canonical SQL and the database fingerprint.
+    Tables stay in an in-memory LRU bounded by Arrow bytes and are written through to
+    Arrow IPC files, so other processes and later runs share them. Files live under the
+    database file's fingerprint, and directories of older snapshots are removed, so a new
+    crawl invalidates every entry.
+    """
+
+    def __init__(
+        self,
+        db_path: Optional[str] = None,
+        cache_dir: Optional[str] = None,
+        max_memory_mb: float = 256,
+        persist: bool = True,
+    ):
+        self.db_path = get_duckdb_file_path(db_path)
+        self.db_fingerprint = get_db_fingerprint(self.db_path)
+        self.max_memory_bytes = int(max_memory_mb * 1024 * 1024)
+        self.persist = persist
+        db_dir = (
+            Path(cache_dir or settings.eval_cache_dir)
+            / "query_results"
+            / hashlib.sha256(os.path.abspath(self.db_path).encode()).hexdigest()[:12]
+        )
+        self.cache_dir = db_dir / self.db_fingerprint
+        if self.persist:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            for stale in db_dir.iterdir():
+                if stale.is_dir() and stale.name != self.db_fingerprint:
+                    shutil.rmtree(stale, ignore_errors=True)
+                    housing_logger.info(f"Removed query results of stale snapshot {stale.name}.")
+
+        self._lock = threading.Lock()
+        self._tables: OrderedDict[str, pa.Table] = OrderedDict()
+        self._memory_bytes = 0
+        self._inflight: dict[str, threading.Event] = {}
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.uncacheable = 0
+
+    def make_key(self, conn: DuckDBPyConnection, query: str, variant: str = "") -> Optional[str]:
+        """
+        Cache key of query, None if it cannot be cached. variant separates results
+        of the same query under different execution settings, such as a row cap.
+        """
+        canonical = canonicalize_sql(conn, query)
+        if canonical is None:
+            return None
+        payload = f"{self.db_fingerprint}\n{variant}\n{canonical}"
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.arrow"
+
+    def _remember(self, key: str, table: pa.Table) -> None:
+        with self._lock:
+            if key in self._tables:
+                self._tables.move_to_end(key)
+                return
+            self._tables[key] = table
+            self._memory_bytes += table.nbytes
+            while self._memory_bytes > self.max_memory_bytes and len(self._tables) > 1:
+                _, evicted = self._tables.popitem(last=False)
+                self._memory_bytes -= evicted.nbytes
+
+    def get(self, key: str) -> Optional[pa.Table]:
+        with self._lock:
+            table = self._tables.get(key)
+            if table is not None:
+                self._tables.move_to_end(key)
+                self.hits += 1
+                return table
+        path = self._path(key)
+        if not self.persist or not path.exists():
+            return None
+        try:
+            with pa.memory_map(str(path)) as source:
+                table = pa.ipc.open_file(source).read_all()
+        except Exception as e:
+            housing_logger.warning(f"Dropping unreadable cached result {path.name}: {e}")
+            path.unlink(missing_ok=True)
+            return None
+        self._remember(key, table)
+        with self._lock:
+            self.hits += 1
+            self.disk_hits += 1
+        return table
+
+    def put(self, key: str, table: pa.Table) -> None:
+        self._remember(key, table)
+        if not self.persist:
+            return
+        path = self._path(key)
+        # Write then rename, so a concurrent reader never sees a partial file
+        temp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            with pa.OSFile(str(temp_path), "wb") as sink:
+                with pa.ipc.new_file(sink, table.schema) as writer:
+                    writer.write_table(table)
+            os.replace(temp_path, path)
+        except Exception as e:
+            housing_logger.warning(f"Could not persist cached result {path.name}: {e}")
+            temp_path.unlink(missing_ok=True)
+
+    def get_or_execute(
+        self,
+        conn: DuckDBPyConnection,
+        query: str,
+        execute: Callable[[], Optional[pa.Table]],
+        variant: str = "",
+        output_query: Optional[str] = None,
+    ) -> tuple[Optional[pa.Table], bool]:
+        """
+        Cached table of query, or execute() on a miss, caching what it returns unless None.
+        Returns (table, hit). On a hit the columns take the names output_query (query by
+        default) produces, since aliases and casing are not part of the key.
+        """
+        key = self.make_key(conn, query, variant)
+        if key is None:
+            with self._lock:
+                self.uncacheable += 1
+            return execute(), False
+
+        table = self.get(key)
+        if table is None:
+            with self._lock:
+                pending = self._inflight.get(key)
+                if pending is None:
+                    self._inflight[key] = threading.Event()
+                    self.misses += 1
+            if pending is None:
+                try:
+                    table = execute()
+                    if table is not None:
+                        self.put(key, table)
+                finally:
+                    with self._lock:
+                        self._inflight.pop(key).set()
+                return table, False
+            # Another thread is running the same query, reuse its result
+            pending.wait()
+            table = self.get(key)
+            if table is None:
+                # It failed, run it here too rather than queueing behind each other
+                with self._lock:
+                    self.misses += 1
+                return execute(), False
+
+        try:
+            names = conn.sql(output_query or query).columns
+        except Exception:
+            names = None
+        if names is None or len(names) != table.num_columns:
+            # Same key but the query does not bind, let the execution report why
+            return execute(), False
+        return table.rename_columns(names), True
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "uncacheable": self.uncacheable,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "memory_entries": len(self._tables),
+                "memory_mb": self._memory_bytes / (1024 * 1024),
+            }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._tables.clear()
+            self._memory_bytes = 0
+        if self.persist:
+            for path in self.cache_dir.glob("*.arrow"):
+                path.unlink(missing_ok=True)
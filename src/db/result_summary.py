@@ -0,0 +1,270 @@
+from collections import deque
+from typing import TYPE_CHECKING, Iterable, Optional
+
+import pyarrow as pa
+from duckdb import DuckDBPyConnection
+from pydantic import BaseModel, Field
+
+from logger import housing_logger
+from utils import CHARS_PER_TOKEN, estimate_tokens
+
+if TYPE_CHECKING:
+    from sqlalchemy import Engine
+
+SUMMARY_BATCH_SIZE = 10_000
+
+
+class ColumnStats(BaseModel):
+    name: str = Field(..., description="Column name")
+    non_null: int = Field(0, description="Non-null values")
+    distinct: int = Field(0, description="Distinct non-null values")
+    min: Optional[str] = Field(None, description="Smallest value, as text")
+    max: Optional[str] = Field(None, description="Largest value, as text")
+
+
+class ResultSummary(BaseModel):
+    query: str = Field(..., description="Summarised query")
+    columns: list[str] = Field(default_factory=list, description="Result column names")
+    total_rows: int = Field(0, description="Rows in the full result")
+    head: list[tuple] = Field(default_factory=list, description="First rows of the result")
+    tail: list[tuple] = Field(default_factory=list, description="Last rows, never overlapping head")
+    stats: list[ColumnStats] = Field(default_factory=list, description="Column statistics, only for truncated results")
+
+    @property
+    def truncated(self) -> bool:
+        return self.total_rows > len(self.head) + len(self.tail)
+
+
+class _SampleBuffer:
+    """
+    Head rows plus a rolling window of tail rows, so memory stays bounded while streaming.
+    """
+
+    def __init__(self, head_rows: int, tail_rows: int):
+        self.head_rows = head_rows
+        self.head: list[tuple] = []
+        self.tail: deque = deque(maxlen=tail_rows)
+        self.total_rows = 0
+
+    def add_rows(self, rows: list[tuple]) -> None:
+        self.total_rows += len(rows)
+        needed = self.head_rows - len(self.head)
+        if needed > 0:
+            self.head.extend(rows[:needed])
+            rows = rows[needed:]
+        if self.tail.maxlen:
+            self.tail.extend(rows[-self.tail.maxlen :])
+
+    def add_batch(self, batch: pa.RecordBatch) -> None:
+        # Only the rows kept are converted to Python objects
+        self.total_rows += batch.num_rows
+        offset = 0
+        needed = self.head_rows - len(self.head)
+        if needed > 0:
+            head = batch.slice(0, needed)
+            self.head.extend(tuple(row.values()) for row in head.to_pylist())
+            offset = head.num_rows
+        keep = min(self.tail.maxlen or 0, batch.num_rows - offset)
+        if keep > 0:
+            tail = batch.slice(batch.num_rows - keep, keep)
+            self.tail.extend(tuple(row.values()) for row in tail.to_pylist())
+
+
+def _format_cell(value: any, max_chars: int) -> str:
+    if value is None:
+        return "NULL"
+    if isinstance(value, float):
+        cell = f"{value:.6g}"
+    else:
+        cell = str(value)
+    cell = cell.replace("|", "\\|").replace("\n", " ")
+    if len(cell) > max_chars:
+        cell = cell[: max_chars - 1] + "…"
+    return cell
+
+
+def _markdown_table(header: list[str], rows: Iterable[list[str]]) -> list[str]:
+    lines = ["| " + " | ".join(header) + " |", "|" + "---|" * len(header)]
+    lines.extend("| " + " | ".join(row) + " |" for row in rows)
+    return lines
+
+
+class ResultSummarizer:
+    """
+    Render query results as a compact markdown summary for the LLM.
+    The result is streamed keeping only a head/tail sample. Truncated results add
+    per-column counts, distinct counts and min/max computed by the database, and the
+    rendering shrinks until it fits the token budget, so it stays flat in result size.
+    """
+
+    def __init__(
+        self,
+        token_budget: int = 500,
+        head_rows: int = 5,
+        tail_rows: int = 3,
+        max_cell_chars: int = 40,
+        batch_size: int = SUMMARY_BATCH_SIZE,
+    ):
+        self.token_budget = token_budget
+        self.head_rows = head_rows
+        self.tail_rows = tail_rows
+        self.max_cell_chars = max_cell_chars
+        self.batch_size = batch_size
+
+    @staticmethod
+    def _stats_query(query: str, columns: list[str]) -> str:
+        # Plain SQL aggregates, so the same query runs on DuckDB and SQLite
+        aggregates = []
+        for column in columns:
+            quoted = '"' + column.replace('"', '""') + '"'
+            aggregates.extend(
+                [
+                    f"COUNT({quoted})",
+                    f"COUNT(DISTINCT {quoted})",
+                    f"CAST(MIN({quoted}) AS VARCHAR)",
+                    f"CAST(MAX({quoted}) AS VARCHAR)",
+                ]
+            )
+        return f"SELECT {', '.join(aggregates)} FROM ({query}) AS summarized_query"
+
+    @staticmethod
+    def _parse_stats(columns: list[str], row: tuple) -> list[ColumnStats]:
+        return [
+            ColumnStats(
+                name=column,
+                non_null=row[4 * i] or 0,
+                distinct=row[4 * i + 1] or 0,
+                min=row[4 * i + 2],
+                max=row[4 * i + 3],
+            )
+            for i, column in enumerate(columns)
+        ]
+
+    def _new_buffer(self) -> _SampleBuffer:
+        return _SampleBuffer(self.head_rows, self.tail_rows)
+
+    @staticmethod
+    def _make_summary(query: str, columns: list[str], buffer: _SampleBuffer) -> ResultSummary:
+        return ResultSummary(
+            query=query,
+            columns=columns,
+            total_rows=buffer.total_rows,
+            head=buffer.head,
+            tail=list(buffer.tail),
+        )
+
+    def summarize(self, conn: DuckDBPyConnection, query: str) -> ResultSummary:
+        """
+        Summarise a query on a DuckDB connection, streaming Arrow record batches.
+        """
+        query = query.strip().rstrip(";")
+        reader = conn.execute(query).fetch_record_batch(self.batch_size)
+        columns = reader.schema.names
+        buffer = self._new_buffer()
+        for batch in reader:
+            buffer.add_batch(batch)
+        summary = self._make_summary(query, columns, buffer)
+        if summary.truncated and columns:
+            row = conn.execute(self._stats_query(query, columns)).fetchone()
+            summary.stats = self._parse_stats(columns, row)
+        return summary
+
+    def summarize_engine(self, engine: "Engine", query: str) -> ResultSummary:
+        """
+        Summarise a query through a SQLAlchemy engine, streaming rows in partitions.
+        """
+        query = query.strip().rstrip(";")
+        with engine.connect() as conn:
+            result = conn.execution_options(stream_results=True).exec_driver_sql(query)
+            columns = list(result.keys())
+            buffer = self._new_buffer()
+            for partition in result.partitions(self.batch_size):
+                buffer.add_rows([tuple(row) for row in partition])
+            summary = self._make_summary(query, columns, buffer)
+            if summary.truncated and columns:
+                row = conn.exec_driver_sql(self._stats_query(query, columns)).fetchone()
+                summary.stats = self._parse_stats(columns, tuple(row))
+        return summary
+
+    def _render(
+        self,
+        summary: ResultSummary,
+        head_rows: int,
+        tail_rows: int,
+        max_cell_chars: int,
+        stats_columns: int,
+    ) -> str:
+        head = summary.head[:head_rows]
+        tail = summary.tail[len(summary.tail) - tail_rows :] if tail_rows else []
+        shown = len(head) + len(tail)
+        if summary.total_rows == shown:
+            lines = [f"{summary.total_rows} rows."]
+        else:
+            lines = [
+                f"{summary.total_rows} rows, showing the first {len(head)} and last {len(tail)}."
+            ]
+        if not summary.columns:
+            return lines[0]
+
+        def cells(row: tuple) -> list[str]:
+            return [_format_cell(value, max_cell_chars) for value in row]
+
+        rows = [cells(row) for row in head]
+        if summary.total_rows > shown and shown:
+            rows.append(["…"] * len(summary.columns))
+        rows.extend(cells(row) for row in tail)
+        header = [_format_cell(column, max_cell_chars) for column in summary.columns]
+        if shown:
+            lines.extend(_markdown_table(header, rows))
+
+        if summary.stats and stats_columns:
+            lines.append("")
+            lines.append("Column statistics:")
+            lines.extend(
+                _markdown_table(
+                    ["column", "non-null", "distinct", "min", "max"],
+                    (
+                        [
+                            _format_cell(stats.name, max_cell_chars),
+                            str(stats.non_null),
+                            str(stats.distinct),
+                            _format_cell(stats.min, max_cell_chars),
+                            _format_cell(stats.max, max_cell_chars),
+                        ]
+                        for stats in summary.stats[:stats_columns]
+                    ),
+                )
+            )
+            if stats_columns < len(summary.stats):
+                lines.append(f"({len(summary.stats) - stats_columns} more columns omitted)")
+        return "\n".join(lines)
+
+    def render(self, summary: ResultSummary, token_budget: Optional[int] = None) -> str:
+        """
+        Markdown summary within token_budget, dropping sample rows, then shortening
+        cells, then dropping statistics until it fits.
+        """
+        token_budget = token_budget or self.token_budget
+        head_rows, tail_rows = len(summary.head), len(summary.tail)
+        stats_columns = len(summary.stats)
+        max_cell_chars = self.max_cell_chars
+        while True:
+            rendered = self._render(summary, head_rows, tail_rows, max_cell_chars, stats_columns)
+            if estimate_tokens(rendered) <= token_budget:
+                return rendered
+            if tail_rows > 0 and tail_rows >= head_rows:
+                tail_rows -= 1
+            elif head_rows > 1:
+                head_rows -= 1
+            elif max_cell_chars > 12:
+                max_cell_chars //= 2
+            elif stats_columns > 0:
+                stats_columns -= 1
+            elif head_rows > 0:
+                head_rows -= 1
+            else:
+                break
+        housing_logger.warning(
+            f"Result summary exceeds {token_budget} tokens even at its smallest, cutting it."
+        )
+        return rendered[: token_budget * CHARS_PER_TOKEN]
@@ -0,0 +1,191 @@
+import json
+import re
+from pathlib import Path
+from typing import Optional
+
+from duckdb import DuckDBPyConnection
+from pydantic import BaseModel, Field
+
+from logger import housing_logger
+from .connection import get_db_fingerprint, get_duckdb_file_path
+
+NUMERIC_TYPE_PATTERN = re.compile(
+    r"^(U?(TINY|SMALL|BIG|HUGE)?INT(EGER)?|FLOAT|DOUBLE|REAL|DECIMAL.*|NUMERIC.*)$",
+    re.IGNORECASE,
+)
+MAX_SAMPLE_LENGTH = 50
+
+
+def _format_value(value: any) -> str:
+    # Full float precision only costs prompt tokens
+    if isinstance(value, float):
+        return f"{value:.6g}"
+    return str(value)
+
+
+class ColumnInfo(BaseModel):
+    name: str = Field(..., description="Column name")
+    type: str = Field(..., description="DuckDB column type")
+    sample_values: list[str] = Field(default_factory=list, description="Distinct sample values")
+    min_value: Optional[str] = Field(None, description="Minimum value for numeric columns")
+    max_value: Optional[str] = Field(None, description="Maximum value for numeric columns")
+
+    @property
+    def is_numeric(self) -> bool:
+        return bool(NUMERIC_TYPE_PATTERN.match(self.type))
+
+    def render(self, with_samples: bool = True) -> str:
+        line = f"{self.name}: {self.type}"
+        if not with_samples:
+            return line
+        if self.min_value is not None and self.max_value is not None:
+            line += f" -- range {self.min_value} to {self.max_value}"
+        elif self.sample_values:
+            samples = ", ".join(f"'{value}'" for value in self.sample_values)
+            line += f" -- e.g. {samples}"
+        return line
+
+
+class TableInfo(BaseModel):
+    name: str = Field(..., description="Table name")
+    row_count: int = Field(0, description="Number of rows in the table")
+    columns: list[ColumnInfo] = Field(default_factory=list, description="Table columns")
+
+    def render_schema(
+        self, with_samples: bool = True, column_names: Optional[list[str]] = None
+    ) -> str:
+        columns = self.columns
+        if column_names is not None:
+            selected = set(column_names)
+            columns = [column for column in columns if column.name in selected]
+        return "\n".join(column.render(with_samples) for column in columns)
+
+
+class SchemaCatalog:
+    """
+    Introspect every table of a DuckDB file once and keep the result in memory and in
+    a JSON sidecar next to the database, invalidated when the database fingerprint changes.
+    """
+
+    def __init__(
+        self,
+        conn: DuckDBPyConnection,
+        db_path: Optional[str] = None,
+        sidecar_path: Optional[str] = None,
+        sample_size: int = 3,
+    ):
+        self.conn = conn
+        self.db_path = get_duckdb_file_path(db_path)
+        self.sidecar_path = Path(sidecar_path or f"{self.db_path}.schema.json")
+        self.sample_size = sample_size
+        self.fingerprint: Optional[str] = None
+        self.tables: dict[str, TableInfo] = {}
+        self._rendered: dict[tuple[str, bool], str] = {}
+
+    def load(self) -> "SchemaCatalog":
+        self.fingerprint = get_db_fingerprint(self.db_path)
+        if not self._load_sidecar():
+            self.tables = self._introspect()
+            self._save_sidecar()
+        self._rendered = {}
+        return self
+
+    def _load_sidecar(self) -> bool:
+        if not self.sidecar_path.exists():
+            return False
+        try:
+            with open(self.sidecar_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except Exception as e:
+            housing_logger.warning(f"Ignoring unreadable schema sidecar {self.sidecar_path}: {e}")
+            return False
+        if data.get("fingerprint") != self.fingerprint:
+            housing_logger.info("Database changed since schema sidecar was written, re-introspecting.")
+            return False
+        self.tables = {
+            table["name"]: TableInfo(**table) for table in data.get("tables", [])
+        }
+        housing_logger.info(
+            f"Loaded schema for {len(self.tables)} tables from {self.sidecar_path}."
+        )
+        return True
+
+    def _save_sidecar(self) -> None:
+        data = {
+            "fingerprint": self.fingerprint,
+            "tables": [table.model_dump() for table in self.tables.values()],
+        }
+        try:
+            with open(self.sidecar_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, indent=2, ensure_ascii=False)
+        except OSError as e:
+            # Read-only data directories still get the in-memory catalog
+            housing_logger.warning(f"Could not write schema sidecar {self.sidecar_path}: {e}")
+
+    def _introspect(self) -> dict[str, TableInfo]:
+        table_names = [
+            row[0]
+            for row in self.conn.execute(
+                "SELECT table_name FROM information_schema.tables "
+                "WHERE table_schema = 'main' ORDER BY table_name"
+            ).fetchall()
+        ]
+        tables = {name: self._introspect_table(name) for name in table_names}
+        housing_logger.info(f"Introspected schema for {len(tables)} tables.")
+        return tables
+
+    def _introspect_table(self, table_name: str) -> TableInfo:
+        columns = [
+            ColumnInfo(name=row[0], type=row[1])
+            for row in self.conn.execute(f'DESCRIBE "{table_name}"').fetchall()
+        ]
+        row_count = self.conn.execute(f'SELECT COUNT(*) FROM "{table_name}"').fetchone()[0]
+
+        numeric_columns = [column for column in columns if column.is_numeric]
+        if numeric_columns:
+            select_list = ", ".join(
+                f'MIN("{column.name}"), MAX("{column.name}")' for column in numeric_columns
+            )
+            ranges = self.conn.execute(f'SELECT {select_list} FROM "{table_name}"').fetchone()
+            for i, column in enumerate(numeric_columns):
+                min_value, max_value = ranges[2 * i], ranges[2 * i + 1]
+                if min_value is not None:
+                    column.min_value = _format_value(min_value)
+                    column.max_value = _format_value(max_value)
+
+        for column in columns:
+            if column.is_numeric:
+                continue
+            rows = self.conn.execute(
+                f'SELECT DISTINCT "{column.name}" FROM "{table_name}" '
+                f'WHERE "{column.name}" IS NOT NULL LIMIT {self.sample_size}'
+            ).fetchall()
+            column.sample_values = [str(row[0])[:MAX_SAMPLE_LENGTH] for row in rows]
+
+        return TableInfo(name=table_name, row_count=row_count, columns=columns)
+
+    def get_table_names(self) -> list[str]:
+        return list(self.tables.keys())
+
+    def get_table(self, table_name: str) -> TableInfo:
+        if table_name not in self.tables:
+            housing_logger.error(f"Table '{table_name}' does not exist in schema catalog.")
+            raise ValueError(f"Table '{table_name}' does not exist in schema catalog.")
+        return self.tables[table_name]
+
+    def get_schema_str(
+        self,
+        table_name: str,
+        with_samples: bool = True,
+        column_names: Optional[list[str]] = None,
+    ) -> str:
+        """
+        Pre-rendered schema string of a table for llm prompts.
+        Passing column_names renders only those columns, e.g. after schema pruning.
+        """
+        if column_names is not None:
+            return self.get_table(table_name).render_schema(with_samples, column_names)
+        key = (table_name, with_samples)
+        if key not in self._rendered:
+            self._rendered[key] = self.get_table(table_name).render_schema(with_samples)
+        return self._rendered[key]
@@ -0,0 +1,207 @@
+from typing import Optional
+
+from duckdb import DuckDBPyConnection
+
+from logger import housing_logger
+
+SPLIT_METADATA_TABLE = "split_metadata"
+# 2**128, scales md5_number onto [0, 1); a UHUGEINT modulo is ~30x slower than the cast
+MD5_NUMBER_RANGE = "340282366920938463463374607431768211456.0"
+
+
+class SplitEngine:
+    """
+    Deterministic, incremental dataset splits stored as a compact membership table.
+    Every distinct key gets one bucket in [0, 1) from an md5 hash of the key and the
+    seed, in a single scan, so identical rows hashed as a whole share a split.
+    Train/test and k-fold splits are views over the source table filtered on the
+    bucket, so no table is duplicated. Rows appended by later crawls are bucketed
+    on their own and existing assignments never move.
+    """
+
+    def __init__(self, conn: DuckDBPyConnection):
+        self.conn = conn
+
+    @staticmethod
+    def _membership_table(table_name: str) -> str:
+        return f"{table_name}_split_membership"
+
+    @staticmethod
+    def _key_expression(key_column: Optional[str], alias: str) -> str:
+        # Without a stable id column, hash the whole row
+        if key_column:
+            return f'{alias}."{key_column}"'
+        return f"md5(CAST({alias} AS VARCHAR))"
+
+    @staticmethod
+    def _hash_bucket(key: str, seed: int) -> str:
+        return f"md5_number(CAST({key} AS VARCHAR) || ':{seed}')::DOUBLE / {MD5_NUMBER_RANGE}"
+
+    def _check_unique_key(self, table_name: str, key_column: str) -> None:
+        total, distinct = self.conn.execute(
+            f'SELECT COUNT(*), COUNT(DISTINCT "{key_column}") FROM {table_name}'
+        ).fetchone()
+        if distinct != total:
+            housing_logger.error(
+                f"Key column '{key_column}' of '{table_name}' has {total - distinct} "
+                "duplicate or NULL values."
+            )
+            raise ValueError(f"Key column '{key_column}' must be unique and not NULL.")
+
+    def _relation_type(self, name: str) -> Optional[str]:
+        row = self.conn.execute(
+            "SELECT table_type FROM information_schema.tables "
+            "WHERE table_schema = 'main' AND table_name = ?",
+            [name],
+        ).fetchone()
+        return row[0] if row else None
+
+    def _drop_relation(self, name: str) -> None:
+        relation_type = self._relation_type(name)
+        if relation_type == "VIEW":
+            self.conn.execute(f'DROP VIEW "{name}"')
+        elif relation_type:
+            self.conn.execute(f'DROP TABLE "{name}"')
+
+    def _get_metadata(self, table_name: str) -> Optional[tuple]:
+        self.conn.execute(
+            f"""
+            CREATE TABLE IF NOT EXISTS {SPLIT_METADATA_TABLE} (
+                table_name VARCHAR PRIMARY KEY,
+                key_column VARCHAR,
+                seed INTEGER,
+                stratify_by VARCHAR
+            )
+            """
+        )
+        return self.conn.execute(
+            f"SELECT key_column, seed, stratify_by FROM {SPLIT_METADATA_TABLE} "
+            "WHERE table_name = ?",
+            [table_name],
+        ).fetchone()
+
+    def assign(
+        self,
+        table_name: str,
+        key_column: Optional[str] = None,
+        seed: int = 42,
+        stratify_by: Optional[str] = None,
+    ) -> int:
+        """
+        Bucket rows without a split assignment yet and return how many were added.
+        A different key, seed or stratification rebuilds the membership from scratch.
+        key_column must be unique and not NULL, without one whole rows are the key.
+        """
+        if key_column:
+            self._check_unique_key(table_name, key_column)
+        membership_table = self._membership_table(table_name)
+        metadata = self._get_metadata(table_name)
+        if metadata != (key_column, seed, stratify_by) or not self._relation_type(
+            membership_table
+        ):
+            return self._build(table_name, key_column, seed, stratify_by)
+
+        key = self._key_expression(key_column, "t")
+        before = self.conn.execute(f"SELECT COUNT(*) FROM {membership_table}").fetchone()[0]
+        self.conn.execute(
+            f"""
+            INSERT INTO {membership_table}
+            SELECT k.split_key, {self._hash_bucket("k.split_key", seed)} AS bucket
+            FROM (SELECT DISTINCT {key} AS split_key FROM {table_name} t) k
+            ANTI JOIN {membership_table} m ON k.split_key = m.split_key
+            """
+        )
+        added = self.conn.execute(f"SELECT COUNT(*) FROM {membership_table}").fetchone()[0] - before
+        housing_logger.info(f"Assigned {added} new keys of '{table_name}' to splits.")
+        return added
+
+    def _build(
+        self,
+        table_name: str,
+        key_column: Optional[str],
+        seed: int,
+        stratify_by: Optional[str],
+    ) -> int:
+        membership_table = self._membership_table(table_name)
+        key = self._key_expression(key_column, "t")
+        hash_bucket = self._hash_bucket("k.split_key", seed)
+        if stratify_by:
+            # Spread each stratum evenly over [0, 1) in hash order, so every
+            # test fraction and fold gets the same share of each stratum
+            bucket = (
+                f"(ROW_NUMBER() OVER (PARTITION BY k.stratum ORDER BY {hash_bucket}) - 0.5) "
+                f"/ COUNT(*) OVER (PARTITION BY k.stratum)"
+            )
+            # A key is a unique column or the whole row, so every key has a single stratum
+            keys = f'SELECT {key} AS split_key, MIN(t."{stratify_by}") AS stratum FROM {table_name} t GROUP BY 1'
+        else:
+            bucket = hash_bucket
+            keys = f"SELECT DISTINCT {key} AS split_key FROM {table_name} t"
+
+        self._drop_relation(membership_table)
+        self.conn.execute(
+            f"""
+            CREATE TABLE {membership_table} AS
+            SELECT k.split_key, {bucket} AS bucket
+            FROM ({keys}) k
+            """
+        )
+        self.conn.execute(
+            f"INSERT OR REPLACE INTO {SPLIT_METADATA_TABLE} VALUES (?, ?, ?, ?)",
+            [table_name, key_column, seed, stratify_by],
+        )
+        rows = self.conn.execute(f"SELECT COUNT(*) FROM {membership_table}").fetchone()[0]
+        housing_logger.info(f"Built split membership for '{table_name}' ({rows} keys).")
+        return rows
+
+    def _create_view(
+        self, view_name: str, table_name: str, key_column: Optional[str], condition: str
+    ) -> None:
+        self._drop_relation(view_name)
+        self.conn.execute(
+            f"""
+            CREATE VIEW {view_name} AS
+            SELECT t.* FROM {table_name} t
+            JOIN {self._membership_table(table_name)} m
+              ON {self._key_expression(key_column, "t")} = m.split_key
+            WHERE {condition}
+            """
+        )
+
+    def create_train_test_views(
+        self,
+        table_name: str,
+        test_size: float = 0.2,
+        key_column: Optional[str] = None,
+        seed: int = 42,
+        stratify_by: Optional[str] = None,
+    ) -> None:
+        if not (0 < test_size < 1):
+            raise ValueError("test_size must be between 0 and 1.")
+        self.assign(table_name, key_column, seed, stratify_by)
+        self._create_view(f"{table_name}_test_data", table_name, key_column, f"m.bucket < {test_size}")
+        self._create_view(f"{table_name}_train_data", table_name, key_column, f"m.bucket >= {test_size}")
+
+    def create_kfold_views(
+        self,
+        table_name: str,
+        n_folds: int = 5,
+        key_column: Optional[str] = None,
+        seed: int = 42,
+        stratify_by: Optional[str] = None,
+    ) -> list[tuple[str, str]]:
+        """
+        Create '<table>_fold<i>_train_data' / '<table>_fold<i>_test_data' views and return their names.
+        """
+        if n_folds < 2:
+            raise ValueError("n_folds must be at least 2.")
+        self.assign(table_name, key_column, seed, stratify_by)
+        views = []
+        for fold in range(n_folds):
+            fold_condition = f"FLOOR(m.bucket * {n_folds}) = {fold}"
+            train_view = f"{table_name}_fold{fold}_train_data"
+            test_view = f"{table_name}_fold{fold}_test_data"
+            self._create_view(test_view, table_name, key_column, fold_condition)
+            self._create_view(train_view, table_name, key_column, f"NOT ({fold_condition})")
+            views.append((train_view, test_view))
+        return views
@@ -0,0 +1,108 @@
+import json
+import os
+import threading
+import time
+from typing import Iterable, Optional
+
+from langchain_community.utilities import SQLDatabase
+from sqlalchemy.engine import make_url
+
+from logger import housing_logger
+from .connection import DUCKDB_URI_PREFIX, DuckDBPool
+
+
+def _file_signature(db_uri: str) -> Optional[tuple[int, int]]:
+    """
+    Size and mtime of a file database, None for a server or in-memory one.
+    """
+    database = make_url(db_uri).database
+    if not database or database == ":memory:" or not os.path.exists(database):
+        return None
+    stat = os.stat(database)
+    return (stat.st_size, stat.st_mtime_ns)
+
+
+class SharedSQLDatabase(SQLDatabase):
+    """
+    SQLDatabase reflected once per database file and table selection, and shared by
+    every agent in the process, whatever its model. The agents only read, so table
+    names and table info (schema and sample rows) are computed once as well.
+    """
+
+    _databases: dict[tuple, "SharedSQLDatabase"] = {}
+    _databases_lock = threading.Lock()
+    reflections = 0
+    reuses = 0
+
+    def __init__(self, *args, **kwargs):
+        self._file_signature: Optional[tuple[int, int]] = None
+        self._table_infos: dict[Optional[tuple[str, ...]], str] = {}
+        self._usable_table_names: Optional[list[str]] = None
+        # Reflects, and already asks for the usable table names
+        super().__init__(*args, **kwargs)
+
+    def get_usable_table_names(self) -> Iterable[str]:
+        if self._usable_table_names is None:
+            self._usable_table_names = list(super().get_usable_table_names())
+        return self._usable_table_names
+
+    def get_table_info(self, table_names: Optional[list[str]] = None) -> str:
+        key = tuple(table_names) if table_names is not None else None
+        table_info = self._table_infos.get(key)
+        if table_info is None:
+            # Concurrent first calls may both render it, which is harmless
+            table_info = self._table_infos[key] = super().get_table_info(table_names)
+        return table_info
+
+    @classmethod
+    def get(
+        cls,
+        db_uri: str,
+        include_tables: Optional[list[str]] = None,
+        sample_rows_in_table_info: int = 3,
+        engine_args: Optional[dict] = None,
+    ) -> "SharedSQLDatabase":
+        """
+        Process-wide database of the URI, reflecting only include_tables if given.
+        A stat of the file on each call tells whether the crawler replaced it, in
+        which case it is reflected again. A DuckDB file is queried through cursors of
+        its DuckDBPool, as DuckDB refuses to open it again with duckdb-engine's
+        configuration.
+        """
+        key = (
+            db_uri,
+            tuple(sorted(include_tables)) if include_tables else None,
+            sample_rows_in_table_info,
+            json.dumps(engine_args or {}, sort_keys=True, default=str),
+        )
+        signature = _file_signature(db_uri)
+        with cls._databases_lock:
+            db = cls._databases.get(key)
+            if db is not None and db._file_signature == signature:
+                cls.reuses += 1
+                return db
+            start_time = time.perf_counter()
+            if db_uri.startswith(DUCKDB_URI_PREFIX):
+                from duckdb_engine import ConnectionWrapper
+
+                pool = DuckDBPool.get_pool(db_uri[len(DUCKDB_URI_PREFIX):])
+                engine_args = {**(engine_args or {}), "creator": lambda: ConnectionWrapper(pool.conn.cursor())}
+            db = cls.from_uri(
+                db_uri,
+                engine_args=engine_args,
+                include_tables=include_tables,
+                sample_rows_in_table_info=sample_rows_in_table_info,
+            )
+            db._file_signature = signature
+            cls._databases[key] = db
+            cls.reflections += 1
+        housing_logger.info(
+            f"Reflected {len(db.get_usable_table_names())} tables of {db_uri} "
+            f"in {time.perf_counter() - start_time:.2f} seconds."
+        )
+        return db
+
+    @classmethod
+    def stats(cls) -> dict:
+        with cls._databases_lock:
+            return {"databases": len(cls._databases), "reflections": cls.reflections, "reuses": cls.reuses}
@@ -1,18 +1,123 @@
 from logger import housing_logger
+import time
 from duckdb import DuckDBPyConnection
+from typing import Iterator, Optional
+import numpy as np
+import pyarrow as pa
+from .query_guard import QueryGuard, QueryOutcome
+from .result_cache import QueryResultCache
+from .splits import SplitEngine
+
+DEFAULT_BATCH_SIZE = 100_000
+# Per-query lines are DEBUG, share one sampling budget and are only formatted if kept
+QUERY_LOG = {"log_type": "query"}
 
 class QueryExecutor:
-    def __init__(self, conn: DuckDBPyConnection):
+    def __init__(self, conn: DuckDBPyConnection, result_cache: Optional[QueryResultCache] = None):
+        """
+        With a result_cache, SELECTs equal up to formatting and aliases are executed once.
+        """
         self.conn = conn
-    
+        self.result_cache = result_cache
+
+    def _fetch_arrow(self, query: str) -> pa.Table:
+        if not self.result_cache:
+            return self.conn.execute(query).fetch_arrow_table()
+        table, hit = self.result_cache.get_or_execute(
+            self.conn, query, lambda: self.conn.execute(query).fetch_arrow_table()
+        )
+        if hit:
+            housing_logger.debug("Query result served from cache.", extra=QUERY_LOG)
+        return table
+
     def execute_query(self, query: str) -> any:
         try:
-            housing_logger.info(f"Executing query: {query}")
+            housing_logger.debug("Executing query: %s", query, extra=QUERY_LOG)
+            if self.result_cache:
+                table = self._fetch_arrow(query)
+                return list(zip(*(column.to_pylist() for column in table.columns)))
             return self.conn.execute(query).fetchall()
         except Exception as e:
             housing_logger.error(f"Error executing query: {e}")
             raise
 
+    def execute_query_arrow(self, query: str) -> pa.Table:
+        """
+        Execute query and return an Arrow table, without building Python row tuples.
+        """
+        try:
+            housing_logger.debug("Executing query (arrow): %s", query, extra=QUERY_LOG)
+            return self._fetch_arrow(query)
+        except Exception as e:
+            housing_logger.error(f"Error executing query: {e}")
+            raise
+
+    def execute_query_numpy(self, query: str) -> dict[str, np.ndarray]:
+        """
+        Execute query and return one NumPy array per column.
+        """
+        try:
+            housing_logger.debug("Executing query (numpy): %s", query, extra=QUERY_LOG)
+            return self.conn.execute(query).fetchnumpy()
+        except Exception as e:
+            housing_logger.error(f"Error executing query: {e}")
+            raise
+
+    def execute_query_batches(self, query: str,
+                              batch_size: int = DEFAULT_BATCH_SIZE) -> Iterator[pa.RecordBatch]:
+        """
+        Execute query and stream Arrow record batches of at most batch_size rows,
+        so peak memory is bounded by the batch size rather than the result size.
+        """
+        try:
+            housing_logger.debug("Executing query (batches of %d): %s", batch_size, query, extra=QUERY_LOG)
+            reader = self.conn.execute(query).fetch_record_batch(batch_size)
+        except Exception as e:
+            housing_logger.error(f"Error executing query: {e}")
+            raise
+        yield from reader
+
+    def execute_guarded_query(self, query: str,
+                              guard: Optional[QueryGuard] = None,
+                              max_rows: Optional[int] = None) -> QueryOutcome:
+        """
+        Execute model-generated SQL through a QueryGuard.
+        Rejections, timeouts and errors are returned as the outcome status instead of raised.
+        Only successful results are cached, keyed on the guard's row cap as well.
+        """
+        guard = guard or QueryGuard()
+        if not self.result_cache:
+            outcome = guard.execute(self.conn, query, max_rows=max_rows)
+        else:
+            outcomes: list[QueryOutcome] = []
+
+            def execute() -> Optional[pa.Table]:
+                outcomes.append(guard.execute(self.conn, query, max_rows=max_rows))
+                return outcomes[0].table if outcomes[0].ok else None
+
+            start_time = time.perf_counter()
+            executed_query = guard.apply_limit(query, max_rows)
+            table, hit = self.result_cache.get_or_execute(
+                self.conn,
+                query,
+                execute,
+                variant=f"guarded:{max_rows or guard.max_rows}",
+                output_query=executed_query,
+            )
+            if hit:
+                outcome = QueryOutcome(
+                    query=query,
+                    executed_query=executed_query,
+                    table=table,
+                    elapsed=time.perf_counter() - start_time,
+                    cached=True,
+                )
+            else:
+                outcome = outcomes[0]
+        if not outcome.ok:
+            housing_logger.warning(f"Guarded query {outcome.status.value}: {outcome.error}")
+        return outcome
+
     def get_schema_from_table(self, table_name: str) -> str:
         """
         get the schema of a table in DuckDB and return as a string for llm prompt
@@ -35,29 +140,22 @@ class QueryExecutor:
         self.conn.execute(f"DROP TABLE IF EXISTS {table_name}")
         housing_logger.info(f"Table already exists, dropped table: {table_name}")
 
-    def create_train_test_split_tables(self, table_name: str, test_size: float = 0.2, random_state: int = 42) -> None:
-        if not (0 < test_size < 1):
-            raise ValueError("test_size must be between 0 and 1.")
-        
-        test_percentage = test_size * 100
-        
-        # Drop existing tables
-        self.drop_table_if_exists(f"{table_name}_train_data")
-        self.drop_table_if_exists(f"{table_name}_test_data")
-        
-        # Create test set with random sample
-        self.conn.execute(f"""
-        CREATE TABLE {table_name}_test_data AS
-        SELECT * FROM {table_name} USING SAMPLE {test_percentage}% (SYSTEM, {random_state})
-        """)
-        
-        # Create train set as the complement (remaining rows)
-        self.conn.execute(f"""
-        CREATE TABLE {table_name}_train_data AS
-        SELECT * FROM {table_name}
-        WHERE rowid NOT IN (SELECT rowid FROM {table_name}_test_data)
-        """)
-        
+    def create_train_test_split_tables(self, table_name: str, test_size: float = 0.2, random_state: int = 42,
+                                       key_column: Optional[str] = None,
+                                       stratify_by: Optional[str] = None) -> None:
+        """
+        Create '<table>_train_data' and '<table>_test_data' views from a deterministic hash split.
+        Pass a stable id as key_column, otherwise rows are keyed on a hash of their content.
+        Requires a read-write connection.
+        """
+        SplitEngine(self.conn).create_train_test_views(
+            table_name,
+            test_size=test_size,
+            key_column=key_column,
+            seed=random_state,
+            stratify_by=stratify_by,
+        )
+
         train_rows = self.get_total_rows_from_table(f"{table_name}_train_data")
         test_rows = self.get_total_rows_from_table(f"{table_name}_test_data")
-        housing_logger.info(f"Data split: Train set ({train_rows} rows), Test set ({test_rows} rows), Test size ~{test_size}.")
\ No newline at end of file
+        housing_logger.info(f"Data split: Train set ({train_rows} rows), Test set ({test_rows} rows), Test size ~{test_size}.")
@@ -0,0 +1,80 @@
+import os
+
+import duckdb
+
+from logger import housing_logger
+
+HK_DISTRICTS = [
+    "Central and Western",
+    "Wan Chai",
+    "Eastern",
+    "Southern",
+    "Yau Tsim Mong",
+    "Sham Shui Po",
+    "Kowloon City",
+    "Wong Tai Sin",
+    "Kwun Tong",
+    "Kwai Tsing",
+    "Tsuen Wan",
+    "Tuen Mun",
+    "Yuen Long",
+    "North",
+    "Tai Po",
+    "Sha Tin",
+    "Sai Kung",
+    "Islands",
+]
+
+
+def create_synthetic_estate_db(
+    db_path: str, rows: int = 10_000, seed: int = 42, overwrite: bool = True
+) -> str:
+    """
+    Write a DuckDB file with a synthetic estate_info table of the given size and a
+    district_info table. Values derive from hashes of the row number and seed, so the
+    same arguments always give the same data, however many threads DuckDB uses.
+    """
+    if rows < 1:
+        housing_logger.error("rows must be at least 1.")
+        raise ValueError("rows must be at least 1.")
+    if os.path.exists(db_path):
+        if not overwrite:
+            return db_path
+        os.remove(db_path)
+    districts = "[" + ", ".join(f"'{district}'" for district in HK_DISTRICTS) + "]"
+    # hash() is 64-bit unsigned, this maps it to [0, 1)
+    unit = "(hash(i, {seed}, {salt}) % 1000000007) / 1000000007.0"
+
+    def uniform(salt: int) -> str:
+        return unit.format(seed=seed, salt=salt)
+
+    conn = duckdb.connect(db_path)
+    try:
+        conn.execute(
+            f"""
+            CREATE TABLE estate_info AS
+            SELECT
+                i AS estate_id,
+                'Estate ' || i AS estate_name,
+                {districts}[1 + CAST(floor({uniform(1)} * {len(HK_DISTRICTS)}) AS INTEGER)] AS district,
+                22.15 + {uniform(2)} * 0.40 AS latitude,
+                113.85 + {uniform(3)} * 0.45 AS longitude,
+                CAST(50 + {uniform(4)} * 2950 AS INTEGER) AS num_units,
+                5000 + {uniform(5)} * 20000 AS avg_price_per_sqft
+            FROM range({rows}) AS t(i)
+            """
+        )
+        conn.execute(
+            f"""
+            CREATE TABLE district_info AS
+            SELECT district, CAST(1 + {uniform(6)} * 9 AS DECIMAL(3, 1)) AS area
+            FROM (
+                SELECT district, row_number() OVER () AS i
+                FROM (SELECT unnest({districts}) AS district)
+            )
+            """
+        )
+    finally:
+        conn.close()
+    housing_logger.info(f"Created synthetic estate DB with {rows} estates at {db_path}")
+    return db_path
@@ -0,0 +1,42 @@
+from utils import lazy_exports
+
+_EXPORTS = {
+    "EvalQuestion": ".runner",
+    "EvalResult": ".runner",
+    "EvalRunner": ".runner",
+    "load_questions": ".runner",
+    "load_results": ".runner",
+    "run_evaluation": ".runner",
+    "ExecutionScorer": ".scoring",
+    "ScoreResult": ".scoring",
+    "compare_result_sets": ".scoring",
+    "compare_result_tables": ".scoring",
+    "extract_sql": ".scoring",
+    "compare_schema_pruning": ".schema_pruning",
+    "compare_schema_preseeding": ".schema_preseeding",
+    "TelemetryCollector": ".telemetry",
+    "TelemetryRecord": ".telemetry",
+    "AgentHarness": ".harness",
+    "AgentRunResult": ".harness",
+    "LeaderboardEntry": ".harness",
+    "render_leaderboard": ".harness",
+    "BenchmarkConfig": ".benchmark",
+    "BenchmarkReport": ".benchmark",
+    "StageLatency": ".benchmark",
+    "compare_to_baseline": ".benchmark",
+    "run_benchmark": ".benchmark",
+    "CompletedTask": ".work_queue",
+    "QueueTask": ".work_queue",
+    "SqliteWorkQueue": ".work_queue",
+    "WorkQueue": ".work_queue",
+    "open_work_queue": ".work_queue",
+    "QueueWorker": ".distributed",
+    "merge_results": ".distributed",
+    "run_workers": ".distributed",
+    "submit_tasks": ".distributed",
+    "StartupTiming": ".startup",
+    "check_startup": ".startup",
+    "measure_startup": ".startup",
+}
+__all__ = list(_EXPORTS)
+__getattr__, __dir__ = lazy_exports(__name__, _EXPORTS)
@@ -0,0 +1,317 @@
+import platform
+import random
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Iterator, Optional
+
+import duckdb
+from pydantic import BaseModel, Field
+
+from config import settings
+from db import DuckDBPool, create_synthetic_estate_db
+from db.synthetic import HK_DISTRICTS
+from llm.stub_server import LatencyDistribution, StubOpenRouterServer, canned_sql_responder
+from logger import housing_logger
+from .harness import _percentile
+from .runner import EvalQuestion, EvalRunner
+from .scoring import ExecutionScorer
+
+STAGES = ("prompt_build", "llm_wait", "sql_execution", "scoring")
+
+# (question, gold SQL, table) templates, each filled in once per district
+QUESTION_TEMPLATES = [
+    (
+        "How many estates are in {district}?",
+        "SELECT COUNT(*) FROM estate_info WHERE district = '{district}'",
+        "estate_info",
+    ),
+    (
+        "What is the average price per square foot of estates in {district}?",
+        "SELECT AVG(avg_price_per_sqft) FROM estate_info WHERE district = '{district}'",
+        "estate_info",
+    ),
+    (
+        "How many units are there in total in {district}?",
+        "SELECT SUM(num_units) FROM estate_info WHERE district = '{district}'",
+        "estate_info",
+    ),
+    (
+        "Which 5 estates in {district} have the most units?",
+        "SELECT estate_name, num_units FROM estate_info WHERE district = '{district}' "
+        "ORDER BY num_units DESC, estate_id LIMIT 5",
+        "estate_info",
+    ),
+    (
+        "What is the area of {district}?",
+        "SELECT area FROM district_info WHERE district = '{district}'",
+        "district_info",
+    ),
+]
+
+
+class BenchmarkConfig(BaseModel):
+    rows: int = Field(10_000, description="Estates in the synthetic database")
+    questions: int = Field(50, description="Questions asked of every model")
+    models: list[str] = Field(
+        default_factory=lambda: ["llama_free", "deepseek_free"],
+        description="Models in model_info.json, all answered by the stub",
+    )
+    concurrency: int = Field(8, description="Concurrent stub calls per model")
+    latency: LatencyDistribution = Field(
+        default_factory=lambda: LatencyDistribution(kind="lognormal", mean=0.05, sigma=0.5),
+        description="Stub response latency",
+    )
+    error_rate: float = Field(0.0, description="Share of stub calls answered with a server error")
+    wrong_answer_rate: float = Field(0.1, description="Share of questions the stub answers with wrong SQL")
+    streaming: bool = Field(False, description="Stream stub responses")
+    prompt_cache: bool = Field(True, description="Stub reports repeated system messages as cached tokens")
+    score_workers: int = Field(8, description="Scoring threads")
+    seed: int = Field(42, description="Seed of the database, questions, answers and stub")
+
+
+class StageLatency(BaseModel):
+    count: int = Field(0, description="Timed samples")
+    mean: float = Field(0.0, description="Mean seconds")
+    p50: float = Field(0.0, description="Median seconds")
+    p95: float = Field(0.0, description="95th percentile seconds")
+    max: float = Field(0.0, description="Slowest sample in seconds")
+
+    @classmethod
+    def from_samples(cls, samples: list[float]) -> "StageLatency":
+        if not samples:
+            return cls()
+        return cls(
+            count=len(samples),
+            mean=sum(samples) / len(samples),
+            p50=_percentile(samples, 0.5),
+            p95=_percentile(samples, 0.95),
+            max=max(samples),
+        )
+
+
+class BenchmarkReport(BaseModel):
+    config: BenchmarkConfig = Field(..., description="Configuration the benchmark ran with")
+    created_at: str = Field(..., description="UTC time the benchmark finished")
+    python_version: str = Field("", description="Interpreter version")
+    duckdb_version: str = Field("", description="DuckDB version")
+    calls: int = Field(0, description="(question, model) pairs evaluated")
+    failed_calls: int = Field(0, description="Calls that ended in an error")
+    correct: int = Field(0, description="Execution-accurate answers")
+    prompt_tokens: int = Field(0, description="Prompt tokens over every call")
+    cached_prompt_tokens: int = Field(0, description="Prompt tokens the stub served from its prompt cache")
+    setup_seconds: float = Field(0.0, description="Seconds generating the synthetic database")
+    eval_seconds: float = Field(0.0, description="Seconds answering every pair")
+    score_seconds: float = Field(0.0, description="Seconds scoring every answer")
+    throughput: float = Field(0.0, description="Pairs answered and scored per second")
+    stages: dict[str, StageLatency] = Field(default_factory=dict, description="Latency per stage")
+    peak_rss_mb: Optional[float] = Field(None, description="Peak resident memory of the process")
+
+    def save(self, path: str) -> None:
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        Path(path).write_text(self.model_dump_json(indent=2), encoding="utf-8")
+
+    @classmethod
+    def load(cls, path: str) -> "BenchmarkReport":
+        return cls.model_validate_json(Path(path).read_text(encoding="utf-8"))
+
+    def render(self) -> str:
+        lines = [
+            f"{self.calls} calls ({self.failed_calls} failed, {self.correct} correct) "
+            f"at {self.throughput:.1f} calls/s, peak RSS {self.peak_rss_mb or 0:.0f} MB, "
+            f"{self.cached_prompt_tokens}/{self.prompt_tokens} prompt tokens cached",
+            "| stage | count | mean ms | p50 ms | p95 ms | max ms |",
+            "|---|---|---|---|---|---|",
+        ]
+        for stage, latency in self.stages.items():
+            lines.append(
+                f"| {stage} | {latency.count} | {latency.mean * 1000:.2f} | {latency.p50 * 1000:.2f} "
+                f"| {latency.p95 * 1000:.2f} | {latency.max * 1000:.2f} |"
+            )
+        return "\n".join(lines)
+
+
+def build_benchmark_questions(
+    count: int, seed: int = 42, wrong_answer_rate: float = 0.0
+) -> tuple[list[EvalQuestion], dict[str, str]]:
+    """
+    Questions over the synthetic database, and the SQL the stub answers each with.
+    A wrong_answer_rate share of answers query another district, so scoring sees misses.
+    """
+    rng = random.Random(seed)
+    questions = []
+    answers = {}
+    for i in range(count):
+        question_template, sql_template, table_name = QUESTION_TEMPLATES[
+            i % len(QUESTION_TEMPLATES)
+        ]
+        district = HK_DISTRICTS[(i // len(QUESTION_TEMPLATES)) % len(HK_DISTRICTS)]
+        question = EvalQuestion(
+            question_id=f"bench-{i:04d}",
+            question=question_template.format(district=district),
+            gold_sql=sql_template.format(district=district),
+            table_name=table_name,
+        )
+        questions.append(question)
+        if question.question in answers:
+            continue
+        answer_district = district
+        if rng.random() < wrong_answer_rate:
+            answer_district = rng.choice([d for d in HK_DISTRICTS if d != district])
+        answers[question.question] = f"```sql\n{sql_template.format(district=answer_district)};\n```"
+    return questions, answers
+
+
+def peak_rss_mb() -> Optional[float]:
+    try:
+        import resource
+    except ImportError:
+        # Not available on Windows
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, kilobytes elsewhere
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+@contextmanager
+def _override_settings(**overrides) -> Iterator[None]:
+    previous = {key: getattr(settings, key) for key in overrides}
+    for key, value in overrides.items():
+        setattr(settings, key, value)
+    try:
+        yield
+    finally:
+        for key, value in previous.items():
+            setattr(settings, key, value)
+
+
+def run_benchmark(config: Optional[BenchmarkConfig] = None, work_dir: Optional[str] = None) -> BenchmarkReport:
+    """
+    Run the eval and scoring pipeline end to end against a local stub server and a
+    synthetic database, so only this project's own overhead is measured. Nothing
+    touches the network, the configured database or the shared caches.
+    """
+    config = config or BenchmarkConfig()
+    if work_dir is None:
+        with tempfile.TemporaryDirectory(prefix="housing-bench-") as temp_dir:
+            return run_benchmark(config, temp_dir)
+
+    work_path = Path(work_dir)
+    work_path.mkdir(parents=True, exist_ok=True)
+    start_time = time.perf_counter()
+    db_path = create_synthetic_estate_db(str(work_path / "benchmark.duckdb"), config.rows, config.seed)
+    setup_seconds = time.perf_counter() - start_time
+
+    questions, answers = build_benchmark_questions(
+        config.questions, config.seed, config.wrong_answer_rate
+    )
+    stub = StubOpenRouterServer(
+        response_content=canned_sql_responder(answers),
+        latency=config.latency,
+        error_rate=config.error_rate,
+        prompt_cache=config.prompt_cache,
+        seed=config.seed,
+    )
+    with stub, _override_settings(
+        openrouter_api_url=stub.base_url,
+        openrouter_api_key=settings.openrouter_api_key or "benchmark",
+        duckdb_path=db_path,
+        eval_cache_dir=str(work_path / "cache"),
+    ):
+        pool = DuckDBPool.get_pool(db_path)
+        try:
+            start_time = time.perf_counter()
+            runner = EvalRunner(
+                model_names=config.models,
+                output_path=str(work_path / "results.jsonl"),
+                max_concurrency=config.concurrency,
+                streaming=config.streaming,
+            )
+            results = runner.run(questions)
+            eval_seconds = time.perf_counter() - start_time
+
+            start_time = time.perf_counter()
+            scorer = ExecutionScorer(pool=pool, max_workers=config.score_workers)
+            try:
+                scores = scorer.score(questions, results)
+            finally:
+                scorer.close()
+            score_seconds = time.perf_counter() - start_time
+        finally:
+            pool.close()
+
+    report = BenchmarkReport(
+        config=config,
+        created_at=datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        python_version=platform.python_version(),
+        duckdb_version=duckdb.__version__,
+        calls=len(results),
+        failed_calls=sum(1 for result in results if result.error),
+        correct=sum(1 for score in scores if score.is_correct),
+        prompt_tokens=sum(result.prompt_tokens or 0 for result in results),
+        cached_prompt_tokens=sum(result.cached_prompt_tokens or 0 for result in results),
+        setup_seconds=setup_seconds,
+        eval_seconds=eval_seconds,
+        score_seconds=score_seconds,
+        throughput=len(results) / max(eval_seconds + score_seconds, 1e-9),
+        stages={
+            "prompt_build": StageLatency.from_samples([result.prompt_latency for result in results]),
+            "llm_wait": StageLatency.from_samples(
+                [result.latency for result in results if not result.error]
+            ),
+            "sql_execution": StageLatency.from_samples(
+                [score.db_latency for score in scores if score.db_latency is not None]
+            ),
+            "scoring": StageLatency.from_samples([score.latency for score in scores]),
+        },
+        peak_rss_mb=peak_rss_mb(),
+    )
+    housing_logger.info(f"Benchmark finished.\n{report.render()}")
+    return report
+
+
+def compare_to_baseline(
+    report: BenchmarkReport,
+    baseline: BenchmarkReport,
+    tolerance: float = 0.2,
+    min_delta: float = 0.002,
+) -> list[str]:
+    """
+    Regressions of report against baseline, empty if there are none. Throughput, stage
+    p50/p95 and peak memory may be worse by at most tolerance, and stage latencies that
+    grow by under min_delta seconds are treated as noise. Correct answers must match,
+    since the stub and the data are deterministic.
+    """
+    if report.config != baseline.config:
+        housing_logger.warning("Benchmark config differs from the baseline, comparisons may not hold.")
+    regressions = []
+    if report.throughput < baseline.throughput * (1 - tolerance):
+        regressions.append(
+            f"throughput {report.throughput:.1f} calls/s < baseline {baseline.throughput:.1f}"
+        )
+    for stage in STAGES:
+        current = report.stages.get(stage)
+        previous = baseline.stages.get(stage)
+        if current is None or previous is None:
+            continue
+        for statistic in ("p50", "p95"):
+            value = getattr(current, statistic)
+            baseline_value = getattr(previous, statistic)
+            if value > baseline_value * (1 + tolerance) and value - baseline_value > min_delta:
+                regressions.append(
+                    f"{stage} {statistic} {value * 1000:.2f} ms > baseline {baseline_value * 1000:.2f} ms"
+                )
+    if (
+        report.peak_rss_mb is not None
+        and baseline.peak_rss_mb is not None
+        and report.peak_rss_mb > baseline.peak_rss_mb * (1 + tolerance)
+    ):
+        regressions.append(
+            f"peak RSS {report.peak_rss_mb:.0f} MB > baseline {baseline.peak_rss_mb:.0f} MB"
+        )
+    if report.config == baseline.config and report.correct != baseline.correct:
+        regressions.append(f"correct answers {report.correct} != baseline {baseline.correct}")
+    return regressions
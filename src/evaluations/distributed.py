@@ -0,0 +1,272 @@
+import json
+import multiprocessing
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional
+
+from agents.base import BaseAgent
+from agents.registry import get_agent_path, get_agent_class
+from llm import LLMExtraConfig
+from logger import housing_logger
+from .harness import (
+    AgentRunResult,
+    LeaderboardEntry,
+    _answer_question,
+    build_leaderboard,
+    write_leaderboard,
+)
+from .runner import EvalQuestion, EvalResult
+from .scoring import ExecutionScorer
+from .work_queue import QueueTask, WorkQueue, open_work_queue
+
+
+def submit_tasks(
+    queue: WorkQueue,
+    questions: list[EvalQuestion],
+    agent_names: list[str],
+    model_names: list[str],
+) -> int:
+    """
+    Coordinator step: queue every agent/model/question combination, returning how
+    many were new. Re-submitting the same questions adds nothing.
+    """
+    if not agent_names or not model_names:
+        housing_logger.error("At least one agent and one model must be provided.")
+        raise ValueError("At least one agent and one model must be provided.")
+    # Resolve names up front so a typo fails here rather than on every worker
+    for agent_name in agent_names:
+        get_agent_path(agent_name)
+    return queue.enqueue([
+        QueueTask.create(agent_name, model_name, question)
+        for agent_name in agent_names
+        for model_name in model_names
+        for question in questions
+    ])
+
+
+class QueueWorker:
+    """
+    Claim tasks from a WorkQueue, answer and score them, and write the results back,
+    until no task is left. Leases are renewed from a background thread while a
+    task runs, so only a worker that died or hung loses its tasks to another.
+    Agents are set up once per agent/model pair and reused.
+    """
+
+    def __init__(
+        self,
+        queue: WorkQueue,
+        worker_id: Optional[str] = None,
+        agent_names: Optional[list[str]] = None,
+        lease_seconds: float = 60.0,
+        batch_size: int = 1,
+        poll_interval: float = 1.0,
+        model_params: Optional[LLMExtraConfig] = None,
+        scorer: Optional[ExecutionScorer] = None,
+    ):
+        self.queue = queue
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.agent_names = agent_names
+        self.lease_seconds = lease_seconds
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.model_params = model_params
+        self.scorer = scorer
+        self._owns_scorer = scorer is None
+        self._agents: dict[tuple[str, str], BaseAgent] = {}
+        self._held: set[str] = set()
+        self._held_lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def _agent(self, agent_name: str, model_name: str) -> BaseAgent:
+        agent = self._agents.get((agent_name, model_name))
+        if agent is None:
+            agent = get_agent_class(agent_name)()
+            agent.set_model(model_name=model_name)
+            agent.setup_agent(model_params=self.model_params)
+            self._agents[(agent_name, model_name)] = agent
+        return agent
+
+    def _score(self, question: EvalQuestion, result: AgentRunResult) -> Optional[bool]:
+        if not question.gold_sql:
+            return None
+        if self.scorer is None:
+            self.scorer = ExecutionScorer()
+        score = self.scorer.score(
+            [question],
+            [EvalResult(question_id=result.question_id, model_name=result.contestant, response=result.sql)],
+        )[0]
+        return score.is_correct
+
+    def _heartbeat(self) -> None:
+        interval = self.lease_seconds / 3
+        while not self._stop.wait(interval):
+            with self._held_lock:
+                task_ids = list(self._held)
+            try:
+                self.queue.heartbeat(self.worker_id, task_ids, self.lease_seconds)
+            except Exception as e:
+                # The next beat may get through before the lease runs out
+                housing_logger.warning(f"Heartbeat of {self.worker_id} failed: {e}")
+
+    def process(self, task: QueueTask) -> None:
+        result = AgentRunResult(
+            agent_name=task.agent_name, model_name=task.model_name, question_id=task.question.question_id
+        )
+        try:
+            agent = self._agent(task.agent_name, task.model_name)
+        except Exception as e:
+            housing_logger.error(f"Failed to set up {result.contestant}: {e}")
+            result.error = f"Agent setup failed: {e}"
+            self.queue.fail(self.worker_id, task.task_id, result)
+            return
+        _answer_question(agent, task.question, result)
+        if result.error:
+            if not self.queue.fail(self.worker_id, task.task_id, result):
+                housing_logger.warning(f"{self.worker_id} lost the lease on {task.task_id}.")
+            return
+        try:
+            is_correct = self._score(task.question, result)
+        except Exception as e:
+            housing_logger.error(f"Scoring {task.task_id} failed: {e}")
+            is_correct = None
+        self.queue.complete(self.worker_id, task.task_id, result, is_correct)
+
+    def run(self, max_tasks: Optional[int] = None) -> int:
+        """
+        Work until the queue is drained or max_tasks were processed, returning the count.
+        Leased tasks of other workers are waited on, in case their leases expire.
+        """
+        processed = 0
+        self._stop.clear()
+        heartbeat = threading.Thread(target=self._heartbeat, name=f"heartbeat-{self.worker_id}", daemon=True)
+        heartbeat.start()
+        start_time = time.perf_counter()
+        try:
+            while max_tasks is None or processed < max_tasks:
+                count = self.batch_size if max_tasks is None else min(self.batch_size, max_tasks - processed)
+                tasks = self.queue.claim(self.worker_id, count, self.lease_seconds, self.agent_names)
+                if not tasks:
+                    if self.queue.is_finished(self.agent_names):
+                        break
+                    time.sleep(self.poll_interval)
+                    continue
+                with self._held_lock:
+                    self._held.update(task.task_id for task in tasks)
+                for task in tasks:
+                    self.process(task)
+                    with self._held_lock:
+                        self._held.discard(task.task_id)
+                    processed += 1
+        finally:
+            self._stop.set()
+            heartbeat.join()
+            if self._owns_scorer and self.scorer:
+                self.scorer.close()
+                self.scorer = None
+        housing_logger.info(
+            f"Worker {self.worker_id} processed {processed} tasks in "
+            f"{time.perf_counter() - start_time:.2f} seconds."
+        )
+        return processed
+
+
+def _run_worker(queue_location: str, worker_id: str, max_attempts: int, threads: int, options: dict) -> int:
+    """
+    Worker process entry point, running one QueueWorker per thread. Answers mostly
+    wait on the model API, so threads add throughput without paying for another
+    process's imports. Each worker sets up its scorer on first use, after its agent,
+    and both query the file through the process-wide DuckDBPool.
+    """
+    queue = open_work_queue(queue_location, max_attempts=max_attempts)
+    try:
+        if threads == 1:
+            return QueueWorker(queue, worker_id=worker_id, **options).run()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            futures = [
+                pool.submit(QueueWorker(queue, worker_id=f"{worker_id}-t{index}", **options).run)
+                for index in range(threads)
+            ]
+            return sum(future.result() for future in futures)
+    finally:
+        queue.close()
+
+
+def run_workers(
+    queue_location: str,
+    workers: int,
+    threads: int = 1,
+    agent_names: Optional[list[str]] = None,
+    max_attempts: int = 3,
+    **options,
+) -> int:
+    """
+    Run workers local processes of threads QueueWorkers each until the queue is
+    drained, returning the tasks processed. Each process serves one agent, split as
+    evenly as workers allows,
+    since agents open the database file with DuckDB configurations a single process
+    refuses to mix. With a multi-node backend, other nodes run the same loop with queue-work.
+    """
+    if not agent_names:
+        queue = open_work_queue(queue_location, max_attempts=max_attempts)
+        try:
+            agent_names = queue.queued_agents()
+        finally:
+            queue.close()
+    if not agent_names:
+        housing_logger.info(f"No tasks queued in {queue_location}.")
+        return 0
+    assignments = [[agent_names[index % len(agent_names)]] for index in range(max(workers, len(agent_names)))]
+    host = socket.gethostname()
+    # Spawned workers start clean instead of inheriting open DuckDB handles and threads
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=len(assignments), mp_context=context) as pool:
+        futures = [
+            pool.submit(
+                _run_worker,
+                queue_location,
+                f"{host}-{os.getpid()}-{index}",
+                max_attempts,
+                threads,
+                {**options, "agent_names": assigned},
+            )
+            for index, assigned in enumerate(assignments)
+        ]
+        return sum(future.result() for future in futures)
+
+
+def merge_results(
+    queue: WorkQueue,
+    output_dir: str,
+    agent_names: Optional[list[str]] = None,
+    model_names: Optional[list[str]] = None,
+) -> list[LeaderboardEntry]:
+    """
+    Merge step: write the queue's results to results.jsonl and rank them into
+    leaderboard.json and leaderboard.md, from the scores the workers stored.
+    Merging a queue still in progress ranks what is done so far.
+    """
+    counts = queue.counts()
+    if not queue.is_finished():
+        housing_logger.warning(f"Merging an unfinished queue: {counts}")
+    completed = queue.completed()
+    results = [task.result for task in completed]
+    # Registration order of the queue, unless the caller asks for a subset
+    agent_names = agent_names or list(dict.fromkeys(result.agent_name for result in results))
+    model_names = model_names or list(dict.fromkeys(result.model_name for result in results))
+
+    output_path = Path(output_dir)
+    output_path.mkdir(parents=True, exist_ok=True)
+    with open(output_path / "results.jsonl", "w", encoding="utf-8") as f:
+        for result in results:
+            f.write(result.model_dump_json() + "\n")
+    with open(output_path / "queue_status.json", "w", encoding="utf-8") as f:
+        json.dump(counts, f, indent=2)
+    correct = {(task.result.contestant, task.result.question_id) for task in completed if task.is_correct}
+    entries = build_leaderboard(agent_names, model_names, results, correct)
+    table = write_leaderboard(output_path, entries)
+    housing_logger.info(f"Merged {len(results)} results, queue {counts}.\n{table}")
+    return entries
@@ -0,0 +1,329 @@
+import json
+import math
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Optional
+
+from pydantic import BaseModel, Field
+
+from agents.base import BaseAgent
+from agents.registry import get_agent_path, load_agent_class
+from llm import LLMExtraConfig
+from logger import housing_logger
+from .runner import EvalQuestion, EvalResult
+from .scoring import ExecutionScorer
+
+
+class AgentRunResult(BaseModel):
+    agent_name: str = Field(..., description="Registered name of the agent")
+    model_name: str = Field(..., description="Name of the model in model_info.json")
+    question_id: str = Field(..., description="ID of the evaluated question")
+    sql: Optional[str] = Field(None, description="SQL the agent answered with")
+    answer: Optional[str] = Field(None, description="Final text output of the agent")
+    error: Optional[str] = Field(None, description="Error message if the agent failed")
+    latency: float = Field(0.0, description="Wall-clock seconds to answer")
+    prompt_tokens: Optional[int] = Field(None, description="Prompt tokens over all model calls")
+    completion_tokens: Optional[int] = Field(None, description="Completion tokens over all model calls")
+    iterations: int = Field(0, description="Model calls or agent steps taken")
+
+    @property
+    def key(self) -> tuple[str, str, str]:
+        return (self.agent_name, self.model_name, self.question_id)
+
+    @property
+    def contestant(self) -> str:
+        return f"{self.agent_name}/{self.model_name}"
+
+
+class LeaderboardEntry(BaseModel):
+    agent_name: str = Field(..., description="Registered name of the agent")
+    model_name: str = Field(..., description="Name of the model in model_info.json")
+    questions: int = Field(0, description="Questions attempted")
+    errors: int = Field(0, description="Questions where the agent failed")
+    correct: int = Field(0, description="Execution-accurate answers")
+    accuracy: float = Field(0.0, description="correct / questions")
+    avg_prompt_tokens: float = Field(0.0, description="Mean prompt tokens per question")
+    avg_completion_tokens: float = Field(0.0, description="Mean completion tokens per question")
+    latency_p50: float = Field(0.0, description="Median seconds per question")
+    latency_p95: float = Field(0.0, description="95th percentile seconds per question")
+    avg_iterations: float = Field(0.0, description="Mean model calls or agent steps per question")
+
+
+def _percentile(values: list[float], q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, max(0, math.ceil(q * len(values)) - 1))]
+
+
+def _mean(values: list[Optional[float]]) -> float:
+    values = [value for value in values if value is not None]
+    return sum(values) / len(values) if values else 0.0
+
+
+def _run_agent_task(
+    agent_path: str,
+    agent_name: str,
+    model_name: str,
+    questions: list[EvalQuestion],
+    model_params: Optional[LLMExtraConfig],
+) -> list[AgentRunResult]:
+    """
+    Worker process entry point: set up one agent/model pair and answer a shard of questions.
+    """
+    results = [
+        AgentRunResult(agent_name=agent_name, model_name=model_name, question_id=question.question_id)
+        for question in questions
+    ]
+    try:
+        agent = load_agent_class(agent_path)()
+        agent.set_model(model_name=model_name)
+        agent.setup_agent(model_params=model_params)
+    except Exception as e:
+        housing_logger.error(f"Failed to set up {agent_name} with {model_name}: {e}")
+        for result in results:
+            result.error = f"Agent setup failed: {e}"
+        return results
+
+    for question, result in zip(questions, results):
+        _answer_question(agent, question, result)
+    return results
+
+
+def _answer_question(agent: BaseAgent, question: EvalQuestion, result: AgentRunResult) -> AgentRunResult:
+    """
+    Answer one question with a set up agent, filling in result.
+    """
+    start_time = time.perf_counter()
+    try:
+        answer = agent.evaluate(question.question, table_name=question.table_name)
+        result.sql = answer.sql
+        result.answer = answer.answer
+        result.prompt_tokens = answer.prompt_tokens
+        result.completion_tokens = answer.completion_tokens
+        result.iterations = answer.iterations
+    except Exception as e:
+        housing_logger.error(
+            f"Question '{question.question_id}' failed on {result.contestant}: {e}"
+        )
+        result.error = str(e)
+    result.latency = time.perf_counter() - start_time
+    return result
+
+
+def render_leaderboard(entries: list[LeaderboardEntry]) -> str:
+    """
+    Markdown table of the leaderboard, best accuracy first.
+    """
+    lines = [
+        "| agent | model | accuracy | correct | errors | prompt tok | completion tok "
+        "| p50 s | p95 s | iterations |",
+        "|---|---|---|---|---|---|---|---|---|---|",
+    ]
+    for entry in entries:
+        lines.append(
+            f"| {entry.agent_name} | {entry.model_name} | {entry.accuracy:.1%} "
+            f"| {entry.correct}/{entry.questions} | {entry.errors} "
+            f"| {entry.avg_prompt_tokens:.0f} | {entry.avg_completion_tokens:.0f} "
+            f"| {entry.latency_p50:.2f} | {entry.latency_p95:.2f} | {entry.avg_iterations:.1f} |"
+        )
+    return "\n".join(lines)
+
+
+def build_leaderboard(
+    agent_names: list[str],
+    model_names: list[str],
+    results: list[AgentRunResult],
+    correct: set[tuple[str, str]],
+) -> list[LeaderboardEntry]:
+    """
+    Rank agent/model pairs by their results, correct holding the
+    (contestant, question_id) pairs answered correctly.
+    """
+    entries = []
+    for agent_name in agent_names:
+        for model_name in model_names:
+            group = [
+                result
+                for result in results
+                if result.agent_name == agent_name and result.model_name == model_name
+            ]
+            if not group:
+                continue
+            latencies = [result.latency for result in group if result.error is None]
+            group_correct = sum(
+                1 for result in group if (result.contestant, result.question_id) in correct
+            )
+            entries.append(
+                LeaderboardEntry(
+                    agent_name=agent_name,
+                    model_name=model_name,
+                    questions=len(group),
+                    errors=sum(1 for result in group if result.error),
+                    correct=group_correct,
+                    accuracy=group_correct / len(group),
+                    avg_prompt_tokens=_mean([result.prompt_tokens for result in group]),
+                    avg_completion_tokens=_mean([result.completion_tokens for result in group]),
+                    latency_p50=_percentile(latencies, 0.5),
+                    latency_p95=_percentile(latencies, 0.95),
+                    avg_iterations=_mean([result.iterations for result in group]),
+                )
+            )
+    entries.sort(key=lambda entry: (-entry.accuracy, entry.latency_p50))
+    return entries
+
+
+def write_leaderboard(output_dir: Path, entries: list[LeaderboardEntry]) -> str:
+    """
+    Write leaderboard.json and leaderboard.md to output_dir, returning the markdown table.
+    """
+    output_dir.mkdir(parents=True, exist_ok=True)
+    with open(output_dir / "leaderboard.json", "w", encoding="utf-8") as f:
+        json.dump([entry.model_dump() for entry in entries], f, indent=2)
+    table = render_leaderboard(entries)
+    with open(output_dir / "leaderboard.md", "w", encoding="utf-8") as f:
+        f.write(table + "\n")
+    return table
+
+
+class AgentHarness:
+    """
+    Run every registered agent/model combination over the same questions and rank them.
+    Each combination is split into shards answered in per-agent process pools, so
+    CPU-heavy agent parsing never blocks the parent. Answers are appended to
+    results.jsonl as shards finish, completed answers are skipped on re-run, and all
+    SQL is scored by execution.
+    """
+
+    def __init__(
+        self,
+        agent_names: list[str],
+        model_names: list[str],
+        output_dir: str,
+        max_workers: Optional[int] = None,
+        model_params: Optional[LLMExtraConfig] = None,
+        shard_size: int = 25,
+        scorer: Optional[ExecutionScorer] = None,
+    ):
+        if not agent_names or not model_names:
+            housing_logger.error("At least one agent and one model must be provided.")
+            raise ValueError("At least one agent and one model must be provided.")
+        # Resolve names up front so a typo fails before any worker starts
+        self.agent_paths = {name: get_agent_path(name) for name in agent_names}
+        self.agent_names = agent_names
+        self.model_names = model_names
+        self.output_dir = Path(output_dir)
+        self.results_path = self.output_dir / "results.jsonl"
+        self.max_workers = max_workers
+        self.model_params = model_params
+        self.shard_size = shard_size
+        self.scorer = scorer
+
+    def load_results(self) -> list[AgentRunResult]:
+        """
+        Results of this harness's agents and models, the last entry per question winning.
+        """
+        if not self.results_path.exists():
+            return []
+        results: dict[tuple[str, str, str], AgentRunResult] = {}
+        with open(self.results_path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    result = AgentRunResult.model_validate_json(line)
+                    if result.agent_name in self.agent_names and result.model_name in self.model_names:
+                        results[result.key] = result
+        return list(results.values())
+
+    def _pending_tasks(self, questions: list[EvalQuestion]) -> list[tuple[str, str, list[EvalQuestion]]]:
+        completed = {result.key for result in self.load_results() if result.error is None}
+        tasks = []
+        for agent_name in self.agent_names:
+            for model_name in self.model_names:
+                pending = [
+                    question
+                    for question in questions
+                    if (agent_name, model_name, question.question_id) not in completed
+                ]
+                for start in range(0, len(pending), self.shard_size):
+                    tasks.append((agent_name, model_name, pending[start : start + self.shard_size]))
+        return tasks
+
+    def _answer(self, questions: list[EvalQuestion]) -> None:
+        tasks = self._pending_tasks(questions)
+        if not tasks:
+            housing_logger.info("All agent/model/question combinations already answered.")
+            return
+        housing_logger.info(
+            f"Running {sum(len(shard) for _, _, shard in tasks)} answers in {len(tasks)} shards."
+        )
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        # Spawned workers start clean instead of inheriting open DuckDB handles and threads.
+        # One pool per agent, since agents open the database file with different
+        # DuckDB configurations, which a single process refuses to mix.
+        context = multiprocessing.get_context("spawn")
+        workers = max(1, (self.max_workers or os.cpu_count() or 1) // len(self.agent_names))
+        pools = {
+            agent_name: ProcessPoolExecutor(max_workers=workers, mp_context=context)
+            for agent_name in self.agent_names
+        }
+        try:
+            with open(self.results_path, "a", encoding="utf-8") as output_file:
+                futures = {
+                    pools[agent_name].submit(
+                        _run_agent_task,
+                        self.agent_paths[agent_name],
+                        agent_name,
+                        model_name,
+                        shard,
+                        self.model_params,
+                    ): (agent_name, model_name)
+                    for agent_name, model_name, shard in tasks
+                }
+                for future in as_completed(futures):
+                    agent_name, model_name = futures[future]
+                    try:
+                        results = future.result()
+                    except Exception as e:
+                        housing_logger.error(f"Worker for {agent_name}/{model_name} crashed: {e}")
+                        continue
+                    for result in results:
+                        output_file.write(result.model_dump_json() + "\n")
+                    output_file.flush()
+        finally:
+            for pool in pools.values():
+                pool.shutdown(wait=True)
+
+    def leaderboard(self, questions: list[EvalQuestion]) -> list[LeaderboardEntry]:
+        results = self.load_results()
+        scorer = self.scorer or ExecutionScorer()
+        try:
+            scores = scorer.score(
+                questions,
+                [
+                    EvalResult(
+                        question_id=result.question_id,
+                        model_name=result.contestant,
+                        response=result.sql,
+                        error=result.error,
+                    )
+                    for result in results
+                ],
+            )
+        finally:
+            if not self.scorer:
+                scorer.close()
+        correct = {(score.model_name, score.question_id) for score in scores if score.is_correct}
+        return build_leaderboard(self.agent_names, self.model_names, results, correct)
+
+    def run(self, questions: list[EvalQuestion]) -> list[LeaderboardEntry]:
+        start_time = time.perf_counter()
+        self._answer(questions)
+        entries = self.leaderboard(questions)
+        table = write_leaderboard(self.output_dir, entries)
+        housing_logger.info(
+            f"Harness finished in {time.perf_counter() - start_time:.2f} seconds.\n{table}"
+        )
+        return entries
@@ -0,0 +1,375 @@
+import asyncio
+import json
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING, Optional, Union
+
+from pydantic import BaseModel, Field
+
+from llm import LLMExtraConfig, LLMResponseCache, get_openrouter_llm_info
+from logger import housing_logger
+from db import SchemaCatalog
+from prompts import create_sql_prompt_from_catalog
+from rag.schema_linking import SchemaLinker
+from utils import estimate_tokens
+from .telemetry import TelemetryCollector, TelemetryRecord
+
+# The agent stack is only imported once a model is actually run, so loading
+# and scoring results stays fast
+if TYPE_CHECKING:
+    from agents.sql_query_agent import SqlQueryAgent
+    from rag.few_shot import FewShotExample, FewShotIndex
+
+
+class EvalQuestion(BaseModel):
+    question_id: str = Field(..., description="Unique ID of the question")
+    question: str = Field(..., description="Natural language question")
+    gold_sql: Optional[str] = Field(None, description="Reference SQL answer")
+    table_name: str = Field("estate_info", description="Table the question targets")
+
+
+class EvalResult(BaseModel):
+    question_id: str = Field(..., description="ID of the evaluated question")
+    model_name: str = Field(..., description="Name of the model in model_info.json")
+    model_id: Optional[str] = Field(None, description="OpenRouter ID of the model")
+    question: str = Field("", description="Natural language question")
+    response: Optional[str] = Field(None, description="Raw model output")
+    error: Optional[str] = Field(None, description="Error message if the call failed")
+    latency: float = Field(0.0, description="Wall-clock seconds of the model call")
+    prompt_latency: float = Field(0.0, description="Seconds spent linking the schema and building the prompt")
+    ttft: Optional[float] = Field(None, description="Seconds to first token, streaming calls only")
+    prompt_tokens: Optional[int] = Field(None, description="Prompt tokens reported by the provider")
+    cached_prompt_tokens: Optional[int] = Field(None, description="Prompt tokens the provider served from its prompt cache")
+    completion_tokens: Optional[int] = Field(None, description="Completion tokens reported by the provider")
+    cost: Optional[float] = Field(None, description="USD cost of the call")
+    cached: bool = Field(False, description="Served from the local response cache")
+    schema_tokens: int = Field(0, description="Estimated tokens of the schema in the prompt")
+    schema_tokens_saved: int = Field(0, description="Estimated schema tokens removed by pruning")
+    few_shot_ids: list[str] = Field(default_factory=list, description="IDs of retrieved few-shot examples")
+
+    @property
+    def key(self) -> tuple[str, str]:
+        return (self.question_id, self.model_name)
+
+
+def load_questions(path: str) -> list[EvalQuestion]:
+    """
+    Load questions from a JSON list or a JSONL file.
+    Missing question_id falls back to the line/list index.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        if path.endswith(".jsonl"):
+            records = [json.loads(line) for line in f if line.strip()]
+        else:
+            records = json.load(f)
+
+    questions = []
+    for index, record in enumerate(records):
+        record.setdefault("question_id", str(index))
+        record["question_id"] = str(record["question_id"])
+        questions.append(EvalQuestion(**record))
+    housing_logger.info(f"Loaded {len(questions)} questions from {path}.")
+    return questions
+
+
+def load_results(path: str) -> list[EvalResult]:
+    """
+    Load results streamed by EvalRunner, keeping the latest entry per (question, model).
+    """
+    if not Path(path).exists():
+        return []
+    results: dict[tuple[str, str], EvalResult] = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            try:
+                result = EvalResult(**json.loads(line))
+            except Exception as e:
+                # A run killed mid-write can leave a truncated last line
+                housing_logger.warning(f"Skipping malformed result line: {e}")
+                continue
+            results[result.key] = result
+    return list(results.values())
+
+
+class EvalRunner:
+    """
+    Run a (question, model) grid through SqlQueryAgent concurrently.
+    Results are appended to a JSONL file as each call completes, and
+    successful pairs already in the file are skipped on re-run.
+    """
+
+    def __init__(
+        self,
+        model_names: list[str],
+        output_path: str,
+        max_concurrency: Union[int, dict[str, int]] = 4,
+        model_params: Optional[LLMExtraConfig] = None,
+        response_cache: Optional[LLMResponseCache] = None,
+        prune_schema: bool = False,
+        top_k_columns: int = 8,
+        telemetry: Optional[TelemetryCollector] = None,
+        streaming: bool = False,
+        few_shot_index: Optional["FewShotIndex"] = None,
+        few_shot_k: int = 3,
+        example_token_budget: int = 400,
+    ):
+        if not model_names:
+            housing_logger.error("At least one model name must be provided.")
+            raise ValueError("At least one model name must be provided.")
+        self.model_names = model_names
+        self.output_path = output_path
+        self.max_concurrency = max_concurrency
+        self.model_params = model_params
+        self.response_cache = response_cache
+        self.agents: dict[str, "SqlQueryAgent"] = {}
+        self.schema_catalog: Optional[SchemaCatalog] = None
+        self.prune_schema = prune_schema
+        self.top_k_columns = top_k_columns
+        self.schema_linker: Optional[SchemaLinker] = None
+        self.telemetry = telemetry
+        self.streaming = streaming
+        self.few_shot_index = few_shot_index
+        self.few_shot_k = few_shot_k
+        self.example_token_budget = example_token_budget
+        self.few_shot_examples: dict[str, list["FewShotExample"]] = {}
+
+    def _get_concurrency(self, model_name: str) -> int:
+        if isinstance(self.max_concurrency, dict):
+            return self.max_concurrency.get(model_name, 1)
+        return self.max_concurrency
+
+    def _get_agent(self, model_name: str) -> "SqlQueryAgent":
+        if model_name not in self.agents:
+            from agents.sql_query_agent import SqlQueryAgent
+
+            agent = SqlQueryAgent()
+            agent.set_model(model_name=model_name)
+            agent.setup_agent(
+                model_params=self.model_params,
+                response_cache=self.response_cache,
+                streaming=self.streaming,
+            )
+            self.agents[model_name] = agent
+        return self.agents[model_name]
+
+    def _get_schema_catalog(self) -> SchemaCatalog:
+        if self.schema_catalog is None:
+            agent = self._get_agent(self.model_names[0])
+            self.schema_catalog = SchemaCatalog(agent.db.conn, agent.db.db_path).load()
+            if self.prune_schema:
+                self.schema_linker = SchemaLinker(
+                    self.schema_catalog, top_k_columns=self.top_k_columns
+                )
+        return self.schema_catalog
+
+    def load_all_results(self) -> list[EvalResult]:
+        """
+        Results of this run's models, including pairs completed by earlier runs.
+        """
+        return [
+            result
+            for result in load_results(self.output_path)
+            if result.model_name in self.model_names
+        ]
+
+    def _load_completed(self) -> set[tuple[str, str]]:
+        return {
+            result.key
+            for result in load_results(self.output_path)
+            if result.error is None
+        }
+
+    @staticmethod
+    def _record_usage(result: EvalResult, usage: Optional[dict]) -> None:
+        if not usage:
+            return
+        result.prompt_tokens = usage.get("input_tokens")
+        result.completion_tokens = usage.get("output_tokens")
+        result.cached_prompt_tokens = (usage.get("input_token_details") or {}).get("cache_read")
+        model_info = get_openrouter_llm_info().get_model_info_by_name(result.model_name)
+        if model_info and result.prompt_tokens is not None:
+            # Cache hits replay stored usage but cost nothing
+            result.cost = 0.0 if result.cached else model_info.get_cost(
+                result.prompt_tokens, result.completion_tokens or 0, result.cached_prompt_tokens or 0
+            )
+
+    async def _evaluate_one(
+        self,
+        question: EvalQuestion,
+        model_name: str,
+        semaphore: asyncio.Semaphore,
+        output_file,
+    ) -> EvalResult:
+        agent = self._get_agent(model_name)
+        prompt_start_time = time.perf_counter()
+        schema_catalog = self._get_schema_catalog()
+        table_names = [question.table_name]
+        column_names = None
+        schema_tokens = estimate_tokens(schema_catalog.get_schema_str(question.table_name))
+        schema_tokens_saved = 0
+        if self.schema_linker:
+            schema_link = self.schema_linker.link(
+                question.question, default_table=question.table_name
+            )
+            table_names = schema_link.table_names
+            column_names = schema_link.column_names
+            schema_tokens = schema_link.pruned_schema_tokens
+            schema_tokens_saved = schema_link.tokens_saved
+        examples = self.few_shot_examples.get(question.question_id, [])
+        prompt = create_sql_prompt_from_catalog(
+            user_question=question.question,
+            schema_catalog=schema_catalog,
+            table_names=table_names,
+            column_names=column_names,
+            examples=[(example.question, example.sql) for example in examples],
+            example_token_budget=self.example_token_budget,
+        )
+        result = EvalResult(
+            question_id=question.question_id,
+            model_name=model_name,
+            model_id=agent.model_id,
+            question=question.question,
+            schema_tokens=schema_tokens,
+            schema_tokens_saved=schema_tokens_saved,
+            few_shot_ids=[example.example_id for example in examples],
+            prompt_latency=time.perf_counter() - prompt_start_time,
+        )
+        async with semaphore:
+            start_time = time.perf_counter()
+            try:
+                response = await agent.aact(prompt)
+                result.response = response.content
+                result.cached = bool(response.response_metadata.get("cached"))
+                result.ttft = response.response_metadata.get("ttft")
+                self._record_usage(result, response.usage_metadata)
+            except Exception as e:
+                housing_logger.error(
+                    f"Question '{question.question_id}' failed on {model_name}: {e}"
+                )
+                result.error = str(e)
+            result.latency = time.perf_counter() - start_time
+
+        if self.telemetry:
+            self.telemetry.record(
+                TelemetryRecord(
+                    run_id=self.telemetry.run_id,
+                    stage="llm",
+                    question_id=result.question_id,
+                    model_name=model_name,
+                    model_id=result.model_id,
+                    prompt_tokens=result.prompt_tokens,
+                    cached_prompt_tokens=result.cached_prompt_tokens,
+                    completion_tokens=result.completion_tokens,
+                    cached=result.cached,
+                    cost=result.cost,
+                    ttft=result.ttft,
+                    latency=result.latency,
+                    status="error" if result.error else "ok",
+                )
+            )
+
+        # Single event loop thread, so whole-line writes never interleave
+        output_file.write(result.model_dump_json() + "\n")
+        output_file.flush()
+        return result
+
+    def _retrieve_examples(self, questions: list[EvalQuestion]) -> None:
+        """
+        Look up few-shot examples for the whole question set in one batched search.
+        """
+        missing = [
+            question
+            for question in {question.question_id: question for question in questions}.values()
+            if question.question_id not in self.few_shot_examples
+        ]
+        if not self.few_shot_index or not missing:
+            return
+        matches = self.few_shot_index.search_batch(
+            [question.question for question in missing],
+            k=self.few_shot_k,
+            exclude_ids=[question.question_id for question in missing],
+        )
+        for question, examples in zip(missing, matches):
+            self.few_shot_examples[question.question_id] = [example for example, _ in examples]
+
+    async def arun(self, questions: list[EvalQuestion]) -> list[EvalResult]:
+        # Set up agents up front so a bad model name fails before any request is sent
+        for model_name in self.model_names:
+            self._get_agent(model_name)
+        self._get_schema_catalog()
+        completed = self._load_completed()
+        semaphores = {
+            model_name: asyncio.Semaphore(self._get_concurrency(model_name))
+            for model_name in self.model_names
+        }
+        pending = [
+            (question, model_name)
+            for model_name in self.model_names
+            for question in questions
+            if (question.question_id, model_name) not in completed
+        ]
+        self._retrieve_examples([question for question, _ in pending])
+        housing_logger.info(
+            f"Evaluating {len(pending)} (question, model) pairs, "
+            f"{len(questions) * len(self.model_names) - len(pending)} already completed."
+        )
+
+        Path(self.output_path).parent.mkdir(parents=True, exist_ok=True)
+        start_time = time.perf_counter()
+        with open(self.output_path, "a", encoding="utf-8") as output_file:
+            results = await asyncio.gather(
+                *(
+                    self._evaluate_one(
+                        question, model_name, semaphores[model_name], output_file
+                    )
+                    for question, model_name in pending
+                )
+            )
+        elapsed_time = time.perf_counter() - start_time
+        failed = sum(1 for result in results if result.error)
+        housing_logger.info(
+            f"Evaluation finished: {len(results)} calls ({failed} failed) "
+            f"in {elapsed_time:.2f} seconds."
+        )
+        if self.response_cache:
+            housing_logger.info(f"LLM response cache: {self.response_cache.stats()}")
+        if self.telemetry:
+            self.telemetry.flush()
+        return results
+
+    def run(self, questions: list[EvalQuestion]) -> list[EvalResult]:
+        return asyncio.run(self.arun(questions))
+
+
+def run_evaluation(
+    question_file: str,
+    model_names: list[str],
+    output_path: str,
+    max_concurrency: Union[int, dict[str, int]] = 4,
+    model_params: Optional[LLMExtraConfig] = None,
+    use_cache: bool = True,
+    prune_schema: bool = False,
+    streaming: bool = False,
+    few_shot_index_dir: Optional[str] = None,
+    telemetry: Optional[TelemetryCollector] = None,
+) -> list[EvalResult]:
+    questions = load_questions(question_file)
+    few_shot_index = None
+    if few_shot_index_dir:
+        from rag.few_shot import FewShotIndex
+
+        few_shot_index = FewShotIndex.load(few_shot_index_dir)
+    runner = EvalRunner(
+        model_names=model_names,
+        output_path=output_path,
+        max_concurrency=max_concurrency,
+        model_params=model_params,
+        response_cache=LLMResponseCache() if use_cache else None,
+        prune_schema=prune_schema,
+        streaming=streaming,
+        few_shot_index=few_shot_index,
+        telemetry=telemetry,
+    )
+    return runner.run(questions)
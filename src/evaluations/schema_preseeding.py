@@ -0,0 +1,108 @@
+import time
+from pathlib import Path
+from typing import Optional
+
+from agents.registry import get_agent_class
+from db import DuckDBPool
+from llm import LLMExtraConfig
+from logger import housing_logger
+from .harness import AgentRunResult, _answer_question, _mean
+from .runner import EvalQuestion, EvalResult, load_questions
+from .scoring import ExecutionScorer
+
+
+def _run_variant(
+    questions: list[EvalQuestion],
+    model_name: str,
+    preseed_schema: bool,
+    db_path: Optional[str],
+    model_params: Optional[LLMExtraConfig],
+) -> tuple[float, list[AgentRunResult]]:
+    agent = get_agent_class("langchain_sql")()
+    agent.set_model(model_name=model_name)
+    start_time = time.perf_counter()
+    agent.setup_agent(db_path=db_path, model_params=model_params, preseed_schema=preseed_schema)
+    setup_seconds = time.perf_counter() - start_time
+    results = [
+        _answer_question(
+            agent,
+            question,
+            AgentRunResult(agent_name="langchain_sql", model_name=model_name, question_id=question.question_id),
+        )
+        for question in questions
+    ]
+    return setup_seconds, results
+
+
+def compare_schema_preseeding(
+    question_file: str,
+    model_names: list[str],
+    output_dir: str,
+    db_path: Optional[str] = None,
+    model_params: Optional[LLMExtraConfig] = None,
+) -> dict:
+    """
+    Run the LangChain SQL agent on the same questions of a DuckDB database, once
+    discovering the schema with its tools and once with the schema in its prompt, then
+    score both runs to compare accuracy against agent turns, prompt tokens and setup
+    time. The first setup on a database reflects it, every later one reuses the
+    shared SQLDatabase.
+    """
+    questions = load_questions(question_file)
+    comparison = {}
+    for variant, preseed_schema in (("discovery", False), ("preseeded", True)):
+        output_path = Path(output_dir) / f"{variant}.jsonl"
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        variant_results = []
+        comparison[variant] = {}
+        for model_name in model_names:
+            setup_seconds, results = _run_variant(
+                questions, model_name, preseed_schema, db_path, model_params
+            )
+            variant_results.extend(results)
+            comparison[variant][model_name] = {
+                "setup_seconds": setup_seconds,
+                "avg_turns": _mean([result.iterations for result in results]),
+                "avg_prompt_tokens": _mean([result.prompt_tokens for result in results]),
+                "errors": sum(1 for result in results if result.error),
+            }
+        with open(output_path, "w", encoding="utf-8") as f:
+            for result in variant_results:
+                f.write(result.model_dump_json() + "\n")
+
+        scorer = ExecutionScorer(DuckDBPool.get_pool(db_path))
+        try:
+            scores = scorer.score(
+                questions,
+                [
+                    EvalResult(
+                        question_id=result.question_id,
+                        model_name=result.model_name,
+                        response=result.sql,
+                        error=result.error,
+                    )
+                    for result in variant_results
+                ],
+            )
+        finally:
+            scorer.close()
+        for model_name, summary in comparison[variant].items():
+            model_scores = [score for score in scores if score.model_name == model_name]
+            summary["accuracy"] = (
+                sum(1 for score in model_scores if score.is_correct) / len(model_scores)
+                if model_scores
+                else 0.0
+            )
+
+    for model_name in model_names:
+        discovery = comparison["discovery"][model_name]
+        preseeded = comparison["preseeded"][model_name]
+        preseeded["turns_saved"] = discovery["avg_turns"] - preseeded["avg_turns"]
+        housing_logger.info(
+            f"{model_name}: {preseeded['turns_saved']:.1f} turns saved per question "
+            f"({discovery['avg_turns']:.1f} -> {preseeded['avg_turns']:.1f}), "
+            f"accuracy {discovery['accuracy']:.1%} -> {preseeded['accuracy']:.1%}, "
+            f"prompt tokens {discovery['avg_prompt_tokens']:.0f} -> {preseeded['avg_prompt_tokens']:.0f}, "
+            f"setup {discovery['setup_seconds']:.2f}s -> {preseeded['setup_seconds']:.2f}s."
+        )
+    return comparison
@@ -0,0 +1,77 @@
+from pathlib import Path
+from typing import Optional, Union
+
+from llm import LLMExtraConfig, LLMResponseCache
+from logger import housing_logger
+from .runner import EvalResult, EvalRunner, load_questions
+from .scoring import ExecutionScorer, ScoreResult
+
+
+def _summarize(results: list[EvalResult], scores: list[ScoreResult]) -> dict:
+    summary = {}
+    for model_name in sorted({result.model_name for result in results}):
+        model_results = [r for r in results if r.model_name == model_name]
+        model_scores = [s for s in scores if s.model_name == model_name]
+        summary[model_name] = {
+            "accuracy": (
+                sum(1 for s in model_scores if s.is_correct) / len(model_scores)
+                if model_scores
+                else 0.0
+            ),
+            "avg_schema_tokens": (
+                sum(r.schema_tokens for r in model_results) / len(model_results)
+                if model_results
+                else 0.0
+            ),
+            "avg_schema_tokens_saved": (
+                sum(r.schema_tokens_saved for r in model_results) / len(model_results)
+                if model_results
+                else 0.0
+            ),
+        }
+    return summary
+
+
+def compare_schema_pruning(
+    question_file: str,
+    model_names: list[str],
+    output_dir: str,
+    top_k_columns: int = 8,
+    max_concurrency: Union[int, dict[str, int]] = 4,
+    model_params: Optional[LLMExtraConfig] = None,
+) -> dict:
+    """
+    Evaluate the same questions with the full schema and with BM25-pruned schema,
+    then score both runs to compare accuracy against prompt tokens.
+    """
+    questions = load_questions(question_file)
+    response_cache = LLMResponseCache()
+    comparison = {}
+    for variant, prune_schema in (("full", False), ("pruned", True)):
+        runner = EvalRunner(
+            model_names=model_names,
+            output_path=str(Path(output_dir) / f"{variant}.jsonl"),
+            max_concurrency=max_concurrency,
+            model_params=model_params,
+            response_cache=response_cache,
+            prune_schema=prune_schema,
+            top_k_columns=top_k_columns,
+        )
+        runner.run(questions)
+        results = runner.load_all_results()
+        scorer = ExecutionScorer(runner.agents[model_names[0]].db.pool)
+        try:
+            scores = scorer.score(questions, results)
+        finally:
+            scorer.close()
+        comparison[variant] = _summarize(results, scores)
+
+    for model_name in model_names:
+        full = comparison["full"].get(model_name, {})
+        pruned = comparison["pruned"].get(model_name, {})
+        housing_logger.info(
+            f"{model_name}: accuracy {full.get('accuracy', 0):.1%} full vs "
+            f"{pruned.get('accuracy', 0):.1%} pruned, "
+            f"~{pruned.get('avg_schema_tokens_saved', 0):.0f} schema tokens saved per question."
+        )
+    return comparison
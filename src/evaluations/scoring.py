@@ -0,0 +1,433 @@
+import hashlib
+import math
+import pickle
+import re
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, time as dt_time
+from decimal import Decimal
+from pathlib import Path
+from typing import Optional
+
+import pyarrow as pa
+import pyarrow.compute as pc
+from pydantic import BaseModel, Field
+
+from agents.sql_stream import SqlStatementDetector
+from config import settings
+from db import DuckDBPool, QueryExecutor, QueryGuard, QueryResultCache, QueryStatus, get_db_fingerprint
+from logger import housing_logger
+from .runner import EvalQuestion, EvalResult
+from .telemetry import TelemetryCollector, TelemetryRecord
+
+MAX_COLUMN_PERMUTATIONS = 1000
+
+
+class ScoreResult(BaseModel):
+    question_id: str = Field(..., description="ID of the evaluated question")
+    model_name: str = Field(..., description="Name of the model in model_info.json")
+    predicted_sql: Optional[str] = Field(None, description="SQL extracted from the response")
+    gold_sql: Optional[str] = Field(None, description="Reference SQL answer")
+    is_correct: bool = Field(False, description="Predicted and gold result sets match")
+    predicted_rows: int = Field(0, description="Rows returned by the predicted SQL")
+    gold_rows: int = Field(0, description="Rows returned by the gold SQL")
+    db_latency: Optional[float] = Field(None, description="Seconds spent executing the predicted SQL")
+    latency: float = Field(0.0, description="Seconds spent scoring the result")
+    query_status: Optional[QueryStatus] = Field(None, description="Outcome of the guarded predicted query")
+    error: Optional[str] = Field(None, description="Error while scoring, if any")
+
+
+def extract_sql(response: Optional[str]) -> Optional[str]:
+    """
+    Pull the SQL statement out of a model response.
+    Models are told to answer in plain text, but markdown fences still show up.
+    """
+    if not response:
+        return None
+    text = response.strip()
+    fenced = re.search(r"```(?:sql)?\s*(.*?)```", text, re.DOTALL | re.IGNORECASE)
+    if fenced:
+        text = fenced.group(1).strip()
+    # Keep the first statement only, the agent is meant to emit a single query.
+    # The detector ignores semicolons inside string literals and comments.
+    detector = SqlStatementDetector()
+    detector.feed(text, final=True)
+    statement = (detector.statement or "").rstrip(";").strip()
+    return statement or None
+
+
+def _normalize_value(value: any, decimals: int) -> any:
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, (float, Decimal)):
+        value = float(value)
+        if math.isnan(value):
+            return None
+        # Snap to the tolerance grid, and fold whole floats into ints so 3 == 3.0
+        value = round(value, decimals)
+        return int(value) if value.is_integer() else value
+    if isinstance(value, (datetime, date, dt_time)):
+        return value.isoformat()
+    if isinstance(value, (list, tuple)):
+        return tuple(_normalize_value(item, decimals) for item in value)
+    if isinstance(value, dict):
+        return tuple(
+            sorted((key, _normalize_value(item, decimals)) for key, item in value.items())
+        )
+    return value
+
+
+def _find_column_mapping(
+    gold_rows: list[tuple], predicted_rows: list[tuple]
+) -> Optional[list[int]]:
+    """
+    Find a permutation of predicted columns whose rows match gold as a multiset.
+    Candidate columns are narrowed by per-column value multisets before trying rows.
+    """
+    column_count = len(gold_rows[0])
+    gold_columns = [Counter(row[i] for row in gold_rows) for i in range(column_count)]
+    predicted_columns = [
+        Counter(row[i] for row in predicted_rows) for i in range(column_count)
+    ]
+    candidates = [
+        [j for j in range(column_count) if predicted_columns[j] == gold_columns[i]]
+        for i in range(column_count)
+    ]
+    if any(not options for options in candidates):
+        return None
+
+    gold_counter = Counter(gold_rows)
+    attempts = 0
+
+    def search(mapping: list[int], used: set[int]) -> Optional[list[int]]:
+        nonlocal attempts
+        if len(mapping) == column_count:
+            attempts += 1
+            permuted = Counter(
+                tuple(row[j] for j in mapping) for row in predicted_rows
+            )
+            return list(mapping) if permuted == gold_counter else None
+        for j in candidates[len(mapping)]:
+            if j in used or attempts >= MAX_COLUMN_PERMUTATIONS:
+                continue
+            found = search(mapping + [j], used | {j})
+            if found:
+                return found
+        return None
+
+    return search([], set())
+
+
+def compare_result_sets(
+    gold_rows: list[tuple],
+    predicted_rows: list[tuple],
+    float_tolerance: float = 1e-4,
+) -> bool:
+    """
+    Compare two result sets ignoring row order and column order, with float tolerance.
+    """
+    if len(gold_rows) != len(predicted_rows):
+        return False
+    if not gold_rows:
+        return True
+    if len(gold_rows[0]) != len(predicted_rows[0]):
+        return False
+
+    decimals = max(0, round(-math.log10(float_tolerance)))
+    gold = [tuple(_normalize_value(v, decimals) for v in row) for row in gold_rows]
+    predicted = [
+        tuple(_normalize_value(v, decimals) for v in row) for row in predicted_rows
+    ]
+    if Counter(gold) == Counter(predicted):
+        return True
+    return _find_column_mapping(gold, predicted) is not None
+
+
+def _normalize_column(column: pa.ChunkedArray, decimals: int) -> pa.ChunkedArray:
+    column_type = column.type
+    if (
+        pa.types.is_floating(column_type)
+        or pa.types.is_decimal(column_type)
+        or pa.types.is_integer(column_type)
+    ):
+        # Same float grid as _normalize_value, and ints become floats so 3 == 3.0
+        column = pc.round(pc.cast(column, pa.float64()), decimals)
+        return pc.if_else(pc.is_nan(column), pa.scalar(None, pa.float64()), column)
+    if pa.types.is_temporal(column_type) or pa.types.is_large_string(column_type):
+        return pc.cast(column, pa.string())
+    return column
+
+
+def _sort_table(table: pa.Table) -> pa.Table:
+    sort_keys = [(name, "ascending") for name in table.column_names]
+    return table.take(pc.sort_indices(table, sort_keys=sort_keys))
+
+
+def _sorted_column(column: pa.ChunkedArray) -> pa.ChunkedArray:
+    return column.take(pc.sort_indices(column))
+
+
+def compare_result_tables(
+    gold_table: pa.Table,
+    predicted_table: pa.Table,
+    float_tolerance: float = 1e-4,
+) -> bool:
+    """
+    Columnar version of compare_result_sets working on Arrow tables.
+    Rows are compared by sorting both tables on every column instead of hashing Python tuples.
+    """
+    if gold_table.num_rows != predicted_table.num_rows:
+        return False
+    if gold_table.num_columns != predicted_table.num_columns:
+        return False
+    if gold_table.num_rows == 0:
+        return True
+    if any(
+        pa.types.is_nested(field.type)
+        for field in list(gold_table.schema) + list(predicted_table.schema)
+    ):
+        # Arrow cannot sort list/struct columns, fall back to Python rows
+        return compare_result_sets(
+            [tuple(row.values()) for row in gold_table.to_pylist()],
+            [tuple(row.values()) for row in predicted_table.to_pylist()],
+            float_tolerance,
+        )
+
+    decimals = max(0, round(-math.log10(float_tolerance)))
+    column_count = gold_table.num_columns
+    names = [f"c{i}" for i in range(column_count)]
+    gold_columns = [_normalize_column(column, decimals) for column in gold_table.columns]
+    predicted_columns = [
+        _normalize_column(column, decimals) for column in predicted_table.columns
+    ]
+
+    # Per-column value multisets narrow down which predicted column can map to which gold one
+    gold_sorted = [_sorted_column(column) for column in gold_columns]
+    predicted_sorted = [_sorted_column(column) for column in predicted_columns]
+    candidates = [
+        [
+            j
+            for j in range(column_count)
+            if predicted_sorted[j].type == gold_sorted[i].type
+            and predicted_sorted[j].equals(gold_sorted[i])
+        ]
+        for i in range(column_count)
+    ]
+    if any(not options for options in candidates):
+        return False
+
+    gold = _sort_table(pa.Table.from_arrays(gold_columns, names=names))
+    attempts = 0
+
+    def search(mapping: list[int], used: set[int]) -> bool:
+        nonlocal attempts
+        if len(mapping) == column_count:
+            attempts += 1
+            predicted = _sort_table(
+                pa.Table.from_arrays([predicted_columns[j] for j in mapping], names=names)
+            )
+            return predicted.equals(gold)
+        for j in candidates[len(mapping)]:
+            if j in used or attempts >= MAX_COLUMN_PERMUTATIONS:
+                continue
+            if search(mapping + [j], used | {j}):
+                return True
+        return False
+
+    return search([], set())
+
+
+class ExecutionScorer:
+    """
+    Score model outputs by execution accuracy against gold SQL.
+    Queries run on a pool of DuckDB cursors, one per worker thread, and gold
+    results are cached on disk per database fingerprint. Predicted SQL goes through
+    a QueryResultCache, so models emitting the same query only differing in formatting
+    or aliases share one execution, within and across runs.
+    """
+
+    def __init__(
+        self,
+        pool: Optional[DuckDBPool] = None,
+        max_workers: int = 8,
+        float_tolerance: float = 1e-4,
+        cache_dir: Optional[str] = None,
+        query_guard: Optional[QueryGuard] = None,
+        telemetry: Optional[TelemetryCollector] = None,
+        result_cache: Optional[QueryResultCache] = None,
+        cache_results: bool = True,
+    ):
+        self.db_pool = pool or DuckDBPool.get_pool()
+        self.query_guard = query_guard or QueryGuard()
+        self.telemetry = telemetry
+        self.max_workers = max_workers
+        self.float_tolerance = float_tolerance
+        self.db_fingerprint = get_db_fingerprint(self.db_pool.db_path)
+        self.cache_path = (
+            Path(cache_dir or settings.eval_cache_dir)
+            / f"gold_tables_{self.db_fingerprint}.pkl"
+        )
+        self.gold_cache: dict[str, pa.Table] = self._load_gold_cache()
+        # Scorer threads, e.g. queue workers sharing one scorer, add and save together
+        self._gold_cache_lock = threading.Lock()
+        self.result_cache = result_cache
+        if self.result_cache is None and cache_results:
+            self.result_cache = QueryResultCache(self.db_pool.db_path, cache_dir)
+        # Long-lived workers so each thread keeps reusing its own pool cursor
+        self.pool = ThreadPoolExecutor(max_workers=max_workers)
+
+    def _load_gold_cache(self) -> dict[str, pa.Table]:
+        if not self.cache_path.exists():
+            return {}
+        try:
+            with open(self.cache_path, "rb") as f:
+                cache = pickle.load(f)
+        except Exception as e:
+            housing_logger.warning(f"Ignoring unreadable gold cache {self.cache_path}: {e}")
+            return {}
+        housing_logger.info(f"Loaded {len(cache)} cached gold results from {self.cache_path}.")
+        return cache
+
+    def _save_gold_cache(self) -> None:
+        # Called with _gold_cache_lock held. A temporary file of its own keeps scorers
+        # in other processes from writing over it before the rename.
+        self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile(
+            dir=self.cache_path.parent, prefix=f"{self.cache_path.stem}-", suffix=".tmp", delete=False
+        ) as f:
+            pickle.dump(self.gold_cache, f)
+        Path(f.name).replace(self.cache_path)
+
+    @staticmethod
+    def _hash_sql(query: str) -> str:
+        return hashlib.sha256(query.strip().encode()).hexdigest()
+
+    def _execute(self, query: str) -> pa.Table:
+        return self.db_pool.thread_cursor().execute(query).fetch_arrow_table()
+
+    def _run_gold(self, query: str) -> tuple[str, Optional[pa.Table], Optional[str]]:
+        try:
+            return query, self._execute(query), None
+        except Exception as e:
+            return query, None, str(e)
+
+    def compute_gold_results(self, questions: list[EvalQuestion]) -> None:
+        """
+        Execute gold SQL not yet cached for this database snapshot.
+        """
+        missing = {
+            question.gold_sql
+            for question in questions
+            if question.gold_sql and self._hash_sql(question.gold_sql) not in self.gold_cache
+        }
+        if not missing:
+            return
+        housing_logger.info(f"Computing {len(missing)} gold results.")
+        computed = {}
+        for query, table, error in self.pool.map(self._run_gold, missing):
+            if error:
+                housing_logger.error(f"Gold SQL failed: {error}")
+                continue
+            computed[self._hash_sql(query)] = table
+        with self._gold_cache_lock:
+            # Another thread may have computed the same queries meanwhile
+            computed = {key: table for key, table in computed.items() if key not in self.gold_cache}
+            if not computed:
+                return
+            self.gold_cache.update(computed)
+            self._save_gold_cache()
+
+    def _score_one(
+        self, question: Optional[EvalQuestion], result: EvalResult
+    ) -> ScoreResult:
+        start_time = time.perf_counter()
+        score = self._compare(question, result)
+        score.latency = time.perf_counter() - start_time
+        return score
+
+    def _compare(
+        self, question: Optional[EvalQuestion], result: EvalResult
+    ) -> ScoreResult:
+        score = ScoreResult(
+            question_id=result.question_id,
+            model_name=result.model_name,
+            predicted_sql=extract_sql(result.response),
+            gold_sql=question.gold_sql if question else None,
+        )
+        if result.error:
+            score.error = f"Model call failed: {result.error}"
+            return score
+        if not score.gold_sql:
+            score.error = "No gold SQL for question."
+            return score
+        gold_table = self.gold_cache.get(self._hash_sql(score.gold_sql))
+        if gold_table is None:
+            score.error = "Gold SQL failed to execute."
+            return score
+        if not score.predicted_sql:
+            score.error = "No SQL found in response."
+            return score
+
+        score.gold_rows = gold_table.num_rows
+        # One row more than gold is enough to tell a too-large answer apart
+        executor = QueryExecutor(self.db_pool.thread_cursor(), self.result_cache)
+        outcome = executor.execute_guarded_query(
+            score.predicted_sql,
+            self.query_guard,
+            max_rows=gold_table.num_rows + 1,
+        )
+        score.query_status = outcome.status
+        score.db_latency = outcome.elapsed
+        if not outcome.ok:
+            score.error = f"Predicted SQL {outcome.status.value}: {outcome.error}"
+            return score
+        predicted_table = outcome.table
+        score.predicted_rows = predicted_table.num_rows
+        score.is_correct = compare_result_tables(
+            gold_table, predicted_table, self.float_tolerance
+        )
+        return score
+
+    def score(
+        self, questions: list[EvalQuestion], results: list[EvalResult]
+    ) -> list[ScoreResult]:
+        self.compute_gold_results(questions)
+        questions_by_id = {question.question_id: question for question in questions}
+        scores = list(
+            self.pool.map(
+                lambda result: self._score_one(
+                    questions_by_id.get(result.question_id), result
+                ),
+                results,
+            )
+        )
+        correct = sum(1 for score in scores if score.is_correct)
+        housing_logger.info(
+            f"Scored {len(scores)} results: {correct} correct "
+            f"({correct / max(len(scores), 1):.1%})."
+        )
+        if self.result_cache:
+            housing_logger.info(f"Predicted SQL result cache: {self.result_cache.stats()}")
+        if self.telemetry:
+            for score in scores:
+                self.telemetry.record(
+                    TelemetryRecord(
+                        run_id=self.telemetry.run_id,
+                        stage="score",
+                        question_id=score.question_id,
+                        model_name=score.model_name,
+                        db_latency=score.db_latency,
+                        is_correct=score.is_correct,
+                        status=score.query_status.value if score.query_status else "error",
+                    )
+                )
+            self.telemetry.flush()
+        return scores
+
+    def close(self) -> None:
+        self.pool.shutdown(wait=True)
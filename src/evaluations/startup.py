@@ -0,0 +1,112 @@
+import re
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Optional
+
+from pydantic import BaseModel, Field
+
+from logger import housing_logger
+
+MAIN_PATH = Path(__file__).resolve().parents[1] / "main.py"
+
+# Modules that only the commands actually talking to a model or the agent toolkits need
+HEAVY_MODULES = (
+    "langchain",
+    "langchain_community",
+    "langchain_openai",
+    "openai",
+    "sqlalchemy",
+    "duckdb_engine",
+    "pandas",
+)
+
+IMPORT_TIME_PATTERN = re.compile(r"^import time:\s+\d+ \|\s+(\d+) \|( *)(\S+)$")
+
+
+class StartupTiming(BaseModel):
+    command: list[str] = Field(..., description="CLI arguments after main.py")
+    runs: int = Field(0, description="Timed runs")
+    median: float = Field(0.0, description="Median wall-clock seconds of a run")
+    max: float = Field(0.0, description="Slowest run in seconds")
+    heavy_modules: list[str] = Field(default_factory=list, description="HEAVY_MODULES the command imported")
+    slowest_imports: list[tuple[str, float]] = Field(
+        default_factory=list, description="Top-level imports by cumulative seconds"
+    )
+
+
+def _run(args: list[str], python_flags: Optional[list[str]] = None) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        [sys.executable, *(python_flags or []), str(MAIN_PATH), *args],
+        capture_output=True,
+        text=True,
+    )
+
+
+def _parse_import_times(stderr: str) -> tuple[set[str], list[tuple[str, float]]]:
+    """
+    Imported top-level packages, and the top-level imports with their cumulative seconds.
+    """
+    packages = set()
+    top_level = []
+    for line in stderr.splitlines():
+        match = IMPORT_TIME_PATTERN.match(line)
+        if not match:
+            continue
+        cumulative, indent, module = match.groups()
+        packages.add(module.split(".")[0])
+        # One space of indent marks an import made directly by main.py or the stdlib startup
+        if len(indent) == 1:
+            top_level.append((module, int(cumulative) / 1_000_000))
+    top_level.sort(key=lambda item: -item[1])
+    return packages, top_level
+
+
+def measure_startup(args: list[str], runs: int = 5, top_n: int = 5) -> StartupTiming:
+    """
+    Time `python src/main.py *args` in fresh interpreters, plus one -X importtime run
+    to see which heavy modules the command pulls in.
+    """
+    durations = []
+    for _ in range(runs):
+        start_time = time.perf_counter()
+        completed = _run(args)
+        durations.append(time.perf_counter() - start_time)
+        if completed.returncode != 0:
+            housing_logger.error(f"'main.py {' '.join(args)}' failed: {completed.stderr[-500:]}")
+            raise ValueError(f"'main.py {' '.join(args)}' exited with {completed.returncode}.")
+    packages, top_level = _parse_import_times(_run(args, ["-X", "importtime"]).stderr)
+    return StartupTiming(
+        command=args,
+        runs=runs,
+        median=statistics.median(durations),
+        max=max(durations),
+        heavy_modules=sorted(packages.intersection(HEAVY_MODULES)),
+        slowest_imports=top_level[:top_n],
+    )
+
+
+def check_startup(
+    commands: list[list[str]], budget: float = 1.0, runs: int = 5
+) -> tuple[bool, list[StartupTiming]]:
+    """
+    Guard CLI startup: every command must stay under budget seconds at the median and
+    must not import any of HEAVY_MODULES.
+    """
+    passed = True
+    timings = []
+    for args in commands:
+        timing = measure_startup(args, runs=runs)
+        timings.append(timing)
+        label = " ".join(args) or "(no arguments)"
+        if timing.median > budget:
+            housing_logger.error(
+                f"'{label}' starts in {timing.median:.2f}s, over the {budget:.2f}s budget."
+            )
+            passed = False
+        if timing.heavy_modules:
+            housing_logger.error(f"'{label}' imports {', '.join(timing.heavy_modules)} at startup.")
+            passed = False
+    return passed, timings
@@ -0,0 +1,155 @@
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Optional
+
+import duckdb
+import pyarrow as pa
+import pyarrow.parquet as pq
+from pydantic import BaseModel, Field
+
+from config import settings
+from logger import housing_logger
+
+TELEMETRY_SCHEMA = pa.schema(
+    [
+        ("run_id", pa.string()),
+        ("stage", pa.string()),
+        ("question_id", pa.string()),
+        ("model_name", pa.string()),
+        ("model_id", pa.string()),
+        ("prompt_tokens", pa.int64()),
+        ("cached_prompt_tokens", pa.int64()),
+        ("completion_tokens", pa.int64()),
+        ("cached", pa.bool_()),
+        ("cost", pa.float64()),
+        ("ttft", pa.float64()),
+        ("latency", pa.float64()),
+        ("db_latency", pa.float64()),
+        ("is_correct", pa.bool_()),
+        ("status", pa.string()),
+        ("timestamp", pa.float64()),
+    ]
+)
+
+
+class TelemetryRecord(BaseModel):
+    run_id: str = Field(..., description="Evaluation run the record belongs to")
+    stage: str = Field(..., description="'llm' for model calls, 'score' for scored executions")
+    question_id: str = Field(..., description="ID of the evaluated question")
+    model_name: str = Field(..., description="Name of the model in model_info.json")
+    model_id: Optional[str] = Field(None, description="OpenRouter ID of the model")
+    prompt_tokens: Optional[int] = Field(None, description="Prompt tokens reported by the provider")
+    cached_prompt_tokens: Optional[int] = Field(None, description="Prompt tokens served from the provider prompt cache")
+    completion_tokens: Optional[int] = Field(None, description="Completion tokens reported by the provider")
+    cached: Optional[bool] = Field(None, description="Served from the local response cache")
+    cost: Optional[float] = Field(None, description="USD cost from LLMInfo input/output cost")
+    ttft: Optional[float] = Field(None, description="Seconds to first token, streaming calls only")
+    latency: Optional[float] = Field(None, description="Monotonic seconds of the model call")
+    db_latency: Optional[float] = Field(None, description="Monotonic seconds of SQL execution")
+    is_correct: Optional[bool] = Field(None, description="Execution accuracy outcome")
+    status: Optional[str] = Field(None, description="ok, error, or the guarded query status")
+    timestamp: float = Field(default_factory=time.time, description="Unix time the record was created")
+
+
+class TelemetryCollector:
+    """
+    Buffer per-call telemetry and flush it as Parquet files, one set per run.
+    Rollups query every file of the telemetry directory with an in-memory DuckDB.
+    """
+
+    def __init__(
+        self,
+        run_id: Optional[str] = None,
+        output_dir: Optional[str] = None,
+        flush_every: int = 500,
+    ):
+        self.run_id = run_id or uuid.uuid4().hex[:12]
+        self.output_dir = Path(output_dir or Path(settings.eval_cache_dir) / "telemetry")
+        self.flush_every = flush_every
+        self._buffer: list[dict] = []
+        self._part = 0
+        # Separate file names per collector, so a later process recording into the
+        # same run (e.g. scoring after the model calls) adds files instead of replacing them
+        self._writer_id = uuid.uuid4().hex[:8]
+        self._lock = threading.Lock()
+
+    def record(self, record: TelemetryRecord) -> None:
+        with self._lock:
+            self._buffer.append(record.model_dump())
+            should_flush = len(self._buffer) >= self.flush_every
+        if should_flush:
+            self.flush()
+
+    def flush(self) -> None:
+        with self._lock:
+            if not self._buffer:
+                return
+            records, self._buffer = self._buffer, []
+            part = self._part
+            self._part += 1
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        path = self.output_dir / f"{self.run_id}-{self._writer_id}-{part:05d}.parquet"
+        pq.write_table(pa.Table.from_pylist(records, schema=TELEMETRY_SCHEMA), path)
+        housing_logger.info(f"Flushed {len(records)} telemetry records to {path}.")
+
+    def rollup(self, run_id: Optional[str] = None) -> list[dict]:
+        """
+        Per-model latency percentiles, token and cost totals, and cost per correct answer.
+        Defaults to this collector's run, pass run_id='*' for every stored run.
+        """
+        self.flush()
+        run_id = run_id or self.run_id
+        files = str(self.output_dir / f"{run_id}-*.parquet")
+        if not list(self.output_dir.glob(f"{run_id}-*.parquet")):
+            return []
+        conn = duckdb.connect()
+        # Files from before a column was added read it as NULL
+        conn.register("empty_records", TELEMETRY_SCHEMA.empty_table())
+        try:
+            cursor = conn.execute(
+                f"""
+                WITH records AS (
+                    SELECT * FROM empty_records
+                    UNION ALL BY NAME
+                    SELECT * FROM read_parquet('{files}', union_by_name = true)
+                ),
+                llm AS (SELECT * FROM records WHERE stage = 'llm'),
+                -- Re-scoring a run records the same answers again, only the latest score counts
+                score AS (
+                    SELECT * FROM records
+                    WHERE stage = 'score'
+                    QUALIFY ROW_NUMBER() OVER (
+                        PARTITION BY run_id, question_id, model_name ORDER BY timestamp DESC NULLS LAST
+                    ) = 1
+                )
+                SELECT
+                    llm.model_name,
+                    COUNT(*) AS calls,
+                    COUNT(*) FILTER (WHERE llm.status = 'error') AS errors,
+                    COUNT(*) FILTER (WHERE llm.cached) AS cached_calls,
+                    QUANTILE_CONT(llm.latency, 0.5) AS latency_p50,
+                    QUANTILE_CONT(llm.latency, 0.95) AS latency_p95,
+                    QUANTILE_CONT(llm.latency, 0.99) AS latency_p99,
+                    QUANTILE_CONT(llm.ttft, 0.5) AS ttft_p50,
+                    QUANTILE_CONT(score.db_latency, 0.95) AS db_latency_p95,
+                    SUM(llm.prompt_tokens) AS prompt_tokens,
+                    SUM(llm.cached_prompt_tokens) AS cached_prompt_tokens,
+                    SUM(llm.cached_prompt_tokens) / NULLIF(SUM(llm.prompt_tokens), 0) AS cached_prompt_share,
+                    SUM(llm.completion_tokens) AS completion_tokens,
+                    SUM(llm.cost) AS total_cost,
+                    COUNT(*) FILTER (WHERE score.is_correct) AS correct,
+                    COUNT(*) FILTER (WHERE score.is_correct) / COUNT(*) AS accuracy,
+                    SUM(llm.cost) / NULLIF(COUNT(*) FILTER (WHERE score.is_correct), 0)
+                        AS cost_per_correct
+                FROM llm
+                LEFT JOIN score USING (run_id, question_id, model_name)
+                GROUP BY llm.model_name
+                ORDER BY llm.model_name
+                """
+            )
+            columns = [column[0] for column in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+        finally:
+            conn.close()
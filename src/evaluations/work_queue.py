@@ -0,0 +1,371 @@
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Callable, Optional
+
+from pydantic import BaseModel, Field
+
+from logger import housing_logger
+from .harness import AgentRunResult
+from .runner import EvalQuestion
+
+PENDING = "pending"
+LEASED = "leased"
+DONE = "done"
+FAILED = "failed"
+
+
+class QueueTask(BaseModel):
+    task_id: str = Field(..., description="agent/model/question_id, unique per queue")
+    agent_name: str = Field(..., description="Registered name of the agent")
+    model_name: str = Field(..., description="Name of the model in model_info.json")
+    question: EvalQuestion = Field(..., description="Question to answer")
+    attempts: int = Field(0, description="Times the task was claimed, this claim included")
+
+    @classmethod
+    def create(cls, agent_name: str, model_name: str, question: EvalQuestion) -> "QueueTask":
+        return cls(
+            task_id=f"{agent_name}/{model_name}/{question.question_id}",
+            agent_name=agent_name,
+            model_name=model_name,
+            question=question,
+        )
+
+
+class CompletedTask(BaseModel):
+    result: AgentRunResult = Field(..., description="Final answer, or the last failed attempt")
+    is_correct: Optional[bool] = Field(None, description="Execution accuracy, None if not scored")
+    status: str = Field(..., description="done, or failed once out of attempts")
+    worker_id: Optional[str] = Field(None, description="Worker that wrote the result")
+    attempts: int = Field(0, description="Times the task was claimed")
+
+
+def _expired_result(agent_name: str, model_name: str, question: str, attempts: int) -> AgentRunResult:
+    return AgentRunResult(
+        agent_name=agent_name,
+        model_name=model_name,
+        question_id=EvalQuestion.model_validate_json(question).question_id,
+        error=f"Lease expired on all {attempts} attempts.",
+    )
+
+
+class WorkQueue(ABC):
+    """
+    Shared queue of evaluation tasks. Workers claim tasks under a time-limited lease,
+    renew it with heartbeats while answering, and hand back a result or a failure.
+    A task whose lease runs out is claimable again, so a crashed worker only delays
+    its tasks, and completing a task twice keeps the first result.
+    """
+
+    def __init__(self, max_attempts: int = 3):
+        self.max_attempts = max_attempts
+
+    @abstractmethod
+    def enqueue(self, tasks: list[QueueTask]) -> int:
+        """
+        Add tasks not already queued, returning how many were new.
+        """
+
+    @abstractmethod
+    def claim(
+        self,
+        worker_id: str,
+        count: int = 1,
+        lease_seconds: float = 60.0,
+        agent_names: Optional[list[str]] = None,
+    ) -> list[QueueTask]:
+        """
+        Lease up to count pending or expired tasks to worker_id, of agent_names only if given.
+        """
+
+    @abstractmethod
+    def heartbeat(self, worker_id: str, task_ids: list[str], lease_seconds: float = 60.0) -> int:
+        """
+        Extend the worker's leases on task_ids, returning how many it still holds.
+        """
+
+    @abstractmethod
+    def complete(
+        self, worker_id: str, task_id: str, result: AgentRunResult, is_correct: Optional[bool] = None
+    ) -> bool:
+        """
+        Store the result of a task, returning False if it was already completed.
+        """
+
+    @abstractmethod
+    def fail(self, worker_id: str, task_id: str, result: AgentRunResult) -> bool:
+        """
+        Release a task after a failed attempt, for a retry or, out of attempts, as
+        failed with result. Returns False if the worker no longer held the lease.
+        """
+
+    @abstractmethod
+    def counts(self, agent_names: Optional[list[str]] = None) -> dict[str, int]:
+        """
+        Number of tasks per status, of agent_names only if given.
+        """
+
+    @abstractmethod
+    def queued_agents(self) -> list[str]:
+        """
+        Agents with tasks in the queue, in the order they were first queued.
+        """
+
+    @abstractmethod
+    def completed(self) -> list[CompletedTask]:
+        """
+        Done and failed tasks with their results.
+        """
+
+    def is_finished(self, agent_names: Optional[list[str]] = None) -> bool:
+        counts = self.counts(agent_names)
+        return not counts.get(PENDING) and not counts.get(LEASED)
+
+    def close(self) -> None:
+        pass
+
+
+class SqliteWorkQueue(WorkQueue):
+    """
+    WorkQueue in a SQLite file, shared by the worker processes of one host. SQLite
+    over DuckDB, since DuckDB lets only one process write to a file. Claims run in a
+    write transaction, so two workers never lease the same task. WAL mode needs shared
+    memory, so the file must not sit on a network filesystem used by several nodes;
+    those need another backend in WORK_QUEUE_BACKENDS.
+    """
+
+    def __init__(self, path: str, max_attempts: int = 3, busy_timeout: float = 30.0):
+        super().__init__(max_attempts)
+        self.path = str(path)
+        self.busy_timeout = busy_timeout
+        Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        # One connection per thread, so a heartbeat thread never shares the worker's
+        self._local = threading.local()
+        self._connections: list[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS eval_tasks (
+                task_id TEXT PRIMARY KEY,
+                agent_name TEXT NOT NULL,
+                model_name TEXT NOT NULL,
+                question TEXT NOT NULL,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                lease_owner TEXT,
+                lease_expires REAL,
+                result TEXT,
+                is_correct INTEGER,
+                worker_id TEXT,
+                updated_at REAL NOT NULL
+            )
+            """
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_eval_tasks_status ON eval_tasks (status, lease_expires)")
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # Autocommit, with explicit transactions where several statements must agree
+            conn = sqlite3.connect(
+                self.path, timeout=self.busy_timeout, isolation_level=None, check_same_thread=False
+            )
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    def _transaction(self, work: Callable[[sqlite3.Connection], any]) -> any:
+        conn = self._conn()
+        # IMMEDIATE takes the write lock up front, so concurrent claims queue on the
+        # busy timeout instead of failing when they upgrade from a read
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            value = work(conn)
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return value
+
+    def enqueue(self, tasks: list[QueueTask]) -> int:
+        now = time.time()
+        rows = [
+            (task.task_id, task.agent_name, task.model_name, task.question.model_dump_json(), PENDING, now)
+            for task in tasks
+        ]
+
+        def work(conn: sqlite3.Connection) -> int:
+            before = conn.total_changes
+            conn.executemany(
+                "INSERT OR IGNORE INTO eval_tasks "
+                "(task_id, agent_name, model_name, question, status, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            return conn.total_changes - before
+
+        added = self._transaction(work)
+        housing_logger.info(f"Queued {added} new tasks in {self.path}, {len(tasks) - added} already present.")
+        return added
+
+    def claim(
+        self,
+        worker_id: str,
+        count: int = 1,
+        lease_seconds: float = 60.0,
+        agent_names: Optional[list[str]] = None,
+    ) -> list[QueueTask]:
+        agent_filter = ""
+        if agent_names:
+            agent_filter = f"AND agent_name IN ({', '.join('?' * len(agent_names))}) "
+
+        def work(conn: sqlite3.Connection) -> list[QueueTask]:
+            now = time.time()
+            expired = conn.execute(
+                "SELECT task_id, agent_name, model_name, question, attempts FROM eval_tasks "
+                "WHERE status = ? AND lease_expires < ? AND attempts >= ?",
+                (LEASED, now, self.max_attempts),
+            ).fetchall()
+            # Failed with an error result, so the merge still counts them as wrong answers
+            conn.executemany(
+                "UPDATE eval_tasks SET status = ?, result = ?, is_correct = 0, lease_owner = NULL, "
+                "updated_at = ? WHERE task_id = ?",
+                [
+                    (
+                        FAILED,
+                        _expired_result(agent_name, model_name, question, attempts).model_dump_json(),
+                        now,
+                        task_id,
+                    )
+                    for task_id, agent_name, model_name, question, attempts in expired
+                ],
+            )
+            if expired:
+                housing_logger.warning(f"{len(expired)} tasks failed after their last lease expired.")
+            rows = conn.execute(
+                "SELECT task_id, agent_name, model_name, question, attempts FROM eval_tasks "
+                "WHERE (status = ? OR (status = ? AND lease_expires < ?)) "
+                f"{agent_filter}ORDER BY rowid LIMIT ?",
+                (PENDING, LEASED, now, *(agent_names or []), count),
+            ).fetchall()
+            conn.executemany(
+                "UPDATE eval_tasks SET status = ?, lease_owner = ?, lease_expires = ?, "
+                "attempts = attempts + 1, updated_at = ? WHERE task_id = ?",
+                [(LEASED, worker_id, now + lease_seconds, now, row[0]) for row in rows],
+            )
+            return [
+                QueueTask(
+                    task_id=task_id,
+                    agent_name=agent_name,
+                    model_name=model_name,
+                    question=EvalQuestion.model_validate_json(question),
+                    attempts=attempts + 1,
+                )
+                for task_id, agent_name, model_name, question, attempts in rows
+            ]
+
+        return self._transaction(work)
+
+    def heartbeat(self, worker_id: str, task_ids: list[str], lease_seconds: float = 60.0) -> int:
+        if not task_ids:
+            return 0
+        now = time.time()
+        cursor = self._conn().executemany(
+            "UPDATE eval_tasks SET lease_expires = ?, updated_at = ? "
+            "WHERE task_id = ? AND status = ? AND lease_owner = ?",
+            [(now + lease_seconds, now, task_id, LEASED, worker_id) for task_id in task_ids],
+        )
+        return cursor.rowcount
+
+    def complete(
+        self, worker_id: str, task_id: str, result: AgentRunResult, is_correct: Optional[bool] = None
+    ) -> bool:
+        # Any worker's result is accepted until one lands, even past its lease, since
+        # a slow worker's answer is as good as the retry's
+        cursor = self._conn().execute(
+            "UPDATE eval_tasks SET status = ?, result = ?, is_correct = ?, worker_id = ?, "
+            "lease_owner = NULL, updated_at = ? WHERE task_id = ? AND status != ?",
+            (DONE, result.model_dump_json(), is_correct, worker_id, time.time(), task_id, DONE),
+        )
+        if not cursor.rowcount:
+            housing_logger.info(f"Task {task_id} was already completed, dropping {worker_id}'s result.")
+        return bool(cursor.rowcount)
+
+    def fail(self, worker_id: str, task_id: str, result: AgentRunResult) -> bool:
+        cursor = self._conn().execute(
+            "UPDATE eval_tasks SET "
+            "status = CASE WHEN attempts >= ? THEN ? ELSE ? END, "
+            "is_correct = CASE WHEN attempts >= ? THEN 0 END, "
+            "result = ?, worker_id = ?, lease_owner = NULL, lease_expires = NULL, updated_at = ? "
+            "WHERE task_id = ? AND status = ? AND lease_owner = ?",
+            (
+                self.max_attempts, FAILED, PENDING, self.max_attempts,
+                result.model_dump_json(), worker_id, time.time(),
+                task_id, LEASED, worker_id,
+            ),
+        )
+        return bool(cursor.rowcount)
+
+    def counts(self, agent_names: Optional[list[str]] = None) -> dict[str, int]:
+        agent_filter = f"WHERE agent_name IN ({', '.join('?' * len(agent_names))}) " if agent_names else ""
+        rows = self._conn().execute(
+            f"SELECT status, COUNT(*) FROM eval_tasks {agent_filter}GROUP BY status", agent_names or []
+        ).fetchall()
+        return {status: count for status, count in rows}
+
+    def queued_agents(self) -> list[str]:
+        rows = self._conn().execute(
+            "SELECT agent_name FROM eval_tasks GROUP BY agent_name ORDER BY MIN(rowid)"
+        ).fetchall()
+        return [agent_name for (agent_name,) in rows]
+
+    def completed(self) -> list[CompletedTask]:
+        rows = self._conn().execute(
+            "SELECT result, is_correct, status, worker_id, attempts, agent_name, model_name, question "
+            "FROM eval_tasks WHERE status IN (?, ?) ORDER BY rowid",
+            (DONE, FAILED),
+        ).fetchall()
+        return [
+            CompletedTask(
+                # Queues written before expiry stored a result have failed tasks without one
+                result=(
+                    AgentRunResult.model_validate_json(result)
+                    if result is not None
+                    else _expired_result(agent_name, model_name, question, attempts)
+                ),
+                is_correct=False if status == FAILED else None if is_correct is None else bool(is_correct),
+                status=status,
+                worker_id=worker_id,
+                attempts=attempts,
+            )
+            for result, is_correct, status, worker_id, attempts, agent_name, model_name, question in rows
+        ]
+
+    def close(self) -> None:
+        with self._connections_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
+
+
+# URL scheme -> queue class. Multi-node runs need a backend other than the single-host SQLite file
+WORK_QUEUE_BACKENDS: dict[str, type[WorkQueue]] = {"sqlite": SqliteWorkQueue}
+
+
+def open_work_queue(location: str, max_attempts: int = 3) -> WorkQueue:
+    """
+    Open a queue from 'scheme://location', a plain path being a SQLite file.
+    """
+    scheme, separator, target = location.partition("://")
+    if not separator:
+        scheme, target = "sqlite", location
+    if scheme not in WORK_QUEUE_BACKENDS:
+        housing_logger.error(f"Unknown work queue backend '{scheme}'.")
+        raise ValueError(f"Unknown work queue backend '{scheme}'.")
+    return WORK_QUEUE_BACKENDS[scheme](target, max_attempts=max_attempts)
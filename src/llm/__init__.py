@@ -1,2 +1,17 @@
 from .base import *
-from .openrouter import *
\ No newline at end of file
+from utils import lazy_exports
+
+# Client modules pull in openai and httpx, so they load on first use
+_EXPORTS = {
+    "OpenRouterLLM": ".openrouter",
+    "OpenRouterLLMInfo": ".openrouter",
+    "get_openrouter_llm_info": ".openrouter",
+    "reload_openrouter_llm_info": ".openrouter",
+    "LLMResponseCache": ".cache",
+    "AsyncOpenRouterClient": ".async_client",
+    "TokenBucket": ".async_client",
+    "ModelRateLimiter": ".async_client",
+    "get_shared_http_clients": ".async_client",
+}
+__all__ = ["BaseLLM", "LLMInfo", "LLMExtraConfig", *_EXPORTS]
+__getattr__, __dir__ = lazy_exports(__name__, _EXPORTS)
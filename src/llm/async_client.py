@@ -0,0 +1,505 @@
+import asyncio
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+import weakref
+from typing import Optional, Union
+
+import httpx
+from openai import AsyncOpenAI
+from openai.types.chat.chat_completion import ChatCompletion
+
+from config import settings
+from logger import housing_logger
+from prompts import LLMPromptTemplate
+from utils import estimate_tokens
+from .base import LLMInfo
+from .openrouter import get_openrouter_llm_info
+
+# OpenRouter's documented limit for ':free' model variants
+FREE_MODEL_REQUESTS_PER_MINUTE = 20
+# Statuses the OpenAI SDK retries as well
+RETRYABLE_STATUSES = {408, 409, 429}
+# Streamed usage arrives in the last event, within this many bytes of the end
+STREAM_TAIL_BYTES = 8192
+TOTAL_TOKENS_PATTERN = re.compile(rb'"total_tokens"\s*:\s*(\d+)')
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket refilled continuously at capacity per minute, usable from
+    sync code and from any event loop. acquire() reserves its amount up front and waits
+    out the deficit, consume() settles usage known only afterwards, negative to refund.
+    """
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.tokens = float(per_minute)
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def _reserve(self, amount: float) -> float:
+        # Requests larger than the whole budget would otherwise wait forever
+        amount = min(amount, self.capacity)
+        with self._lock:
+            self._refill()
+            self.tokens -= amount
+            return max(0.0, -self.tokens / self.rate)
+
+    async def acquire(self, amount: float = 1.0) -> None:
+        delay = self._reserve(amount)
+        if delay:
+            await asyncio.sleep(delay)
+
+    def acquire_sync(self, amount: float = 1.0) -> None:
+        delay = self._reserve(amount)
+        if delay:
+            time.sleep(delay)
+
+    def consume(self, amount: float) -> None:
+        with self._lock:
+            self._refill()
+            self.tokens -= amount
+
+
+class ModelRateLimiter:
+    """
+    Per-model requests and tokens per minute budgets, from model_info.json unless
+    overridden. shared() is the instance every client of the process draws from by
+    default, so agents, runners and workers in one process stay within one budget.
+    """
+
+    _shared: Optional["ModelRateLimiter"] = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, rate_limits: Optional[dict[str, tuple[Optional[int], Optional[int]]]] = None):
+        # model_id -> (requests_per_minute, tokens_per_minute)
+        self.rate_limits = rate_limits or {}
+        self._buckets: dict[str, tuple[Optional[TokenBucket], Optional[TokenBucket]]] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def shared(cls) -> "ModelRateLimiter":
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls()
+            return cls._shared
+
+    def _get_limits(self, model_id: str) -> tuple[Optional[int], Optional[int]]:
+        if model_id in self.rate_limits:
+            return self.rate_limits[model_id]
+        model_info: Optional[LLMInfo] = get_openrouter_llm_info().get_model_info_by_id(model_id)
+        if not model_info:
+            return (None, None)
+        requests_per_minute = model_info.requests_per_minute
+        if requests_per_minute is None and model_info.is_free:
+            requests_per_minute = FREE_MODEL_REQUESTS_PER_MINUTE
+        return (requests_per_minute, model_info.tokens_per_minute)
+
+    def get_buckets(self, model_id: str) -> tuple[Optional[TokenBucket], Optional[TokenBucket]]:
+        with self._lock:
+            if model_id not in self._buckets:
+                requests_per_minute, tokens_per_minute = self._get_limits(model_id)
+                self._buckets[model_id] = (
+                    TokenBucket(requests_per_minute) if requests_per_minute else None,
+                    TokenBucket(tokens_per_minute) if tokens_per_minute else None,
+                )
+            return self._buckets[model_id]
+
+
+def _estimate_request_tokens(body: dict) -> int:
+    messages = body.get("messages") or []
+    return sum(estimate_tokens(str(message.get("content", ""))) for message in messages) + (
+        body.get("max_tokens") or body.get("max_completion_tokens") or 0
+    )
+
+
+class _UsageTracker:
+    """
+    Decoded response body passed through to the client, settling the token bucket with
+    the usage the body reports once it is closed. A stream closed before its usage
+    event keeps the estimate.
+    """
+
+    def __init__(
+        self, response: httpx.Response, token_bucket: TokenBucket, estimated_tokens: int, streamed: bool
+    ):
+        self.response = response
+        self.token_bucket = token_bucket
+        self.estimated_tokens = estimated_tokens
+        self.streamed = streamed
+        self.body = bytearray()
+        self.settled = False
+
+    def observe(self, chunk: bytes) -> None:
+        self.body += chunk
+        if self.streamed and len(self.body) > 2 * STREAM_TAIL_BYTES:
+            del self.body[:-STREAM_TAIL_BYTES]
+
+    def settle(self) -> None:
+        if self.settled:
+            return
+        self.settled = True
+        matches = TOTAL_TOKENS_PATTERN.findall(bytes(self.body))
+        if matches:
+            self.token_bucket.consume(int(matches[-1]) - self.estimated_tokens)
+
+
+class _SyncUsageStream(httpx.SyncByteStream):
+    def __init__(self, tracker: _UsageTracker):
+        self.tracker = tracker
+
+    def __iter__(self):
+        for chunk in self.tracker.response.iter_bytes():
+            self.tracker.observe(chunk)
+            yield chunk
+
+    def close(self) -> None:
+        self.tracker.response.close()
+        self.tracker.settle()
+
+
+class _AsyncUsageStream(httpx.AsyncByteStream):
+    def __init__(self, tracker: _UsageTracker):
+        self.tracker = tracker
+
+    async def __aiter__(self):
+        async for chunk in self.tracker.response.aiter_bytes():
+            self.tracker.observe(chunk)
+            yield chunk
+
+    async def aclose(self) -> None:
+        await self.tracker.response.aclose()
+        self.tracker.settle()
+
+
+class _RateLimitedTransportBase:
+    """
+    Applies a ModelRateLimiter to chat completion requests and retries retryable
+    statuses and network errors, backing off exponentially with jitter and honoring
+    Retry-After. Each attempt takes a request from the model's budget, its token
+    estimate is reserved once per request and refunded if the request fails.
+    """
+
+    def __init__(
+        self,
+        limiter: Optional[ModelRateLimiter] = None,
+        max_retries: int = 5,
+        base_delay: float = 1.0,
+        max_delay: float = 60.0,
+    ):
+        self.limiter = limiter or ModelRateLimiter.shared()
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.requests = 0
+        self.retries = 0
+
+    @staticmethod
+    def _chat_request(request: httpx.Request) -> Optional[dict]:
+        if request.method != "POST" or not request.url.path.endswith("/chat/completions"):
+            return None
+        try:
+            return json.loads(request.content)
+        except ValueError:
+            return None
+
+    @staticmethod
+    def _is_retryable(response: httpx.Response) -> bool:
+        return response.status_code in RETRYABLE_STATUSES or response.status_code >= 500
+
+    def _retry_delay(self, attempt: int, response: Optional[httpx.Response]) -> float:
+        retry_after = response.headers.get("retry-after") if response is not None else None
+        if retry_after:
+            try:
+                return float(retry_after) + random.uniform(0, self.base_delay)
+            except ValueError:
+                pass
+        # Full jitter keeps many workers from retrying in lockstep
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+
+    def _log_retry(self, model_id: str, reason: str, delay: float) -> None:
+        self.retries += 1
+        housing_logger.warning(f"{reason} from {model_id}, retrying in {delay:.1f} seconds.")
+
+    def _log_give_up(self, model_id: str, reason: str) -> None:
+        housing_logger.error(f"Giving up on {model_id} after {self.max_retries + 1} attempts: {reason}")
+
+    @staticmethod
+    def _tracked_response(
+        response: httpx.Response, stream: Union[httpx.SyncByteStream, httpx.AsyncByteStream]
+    ) -> httpx.Response:
+        # The body is passed on decoded, so the encoding headers no longer apply
+        headers = [
+            (name, value)
+            for name, value in response.headers.multi_items()
+            if name.lower() not in ("content-encoding", "content-length")
+        ]
+        return httpx.Response(
+            response.status_code,
+            headers=headers,
+            stream=stream,
+            extensions=response.extensions,
+        )
+
+
+class RateLimitedTransport(_RateLimitedTransportBase, httpx.BaseTransport):
+    """
+    Sync httpx transport sharing a ModelRateLimiter, see _RateLimitedTransportBase.
+    """
+
+    def __init__(self, limiter: Optional[ModelRateLimiter] = None, limits: Optional[httpx.Limits] = None, **options):
+        super().__init__(limiter, **options)
+        self.transport = httpx.HTTPTransport(limits=limits or httpx.Limits())
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        body = self._chat_request(request)
+        if body is None:
+            return self.transport.handle_request(request)
+        model_id = body.get("model", "")
+        request_bucket, token_bucket = self.limiter.get_buckets(model_id)
+        estimated_tokens = _estimate_request_tokens(body)
+        if token_bucket:
+            token_bucket.acquire_sync(estimated_tokens)
+
+        for attempt in range(self.max_retries + 1):
+            if request_bucket:
+                request_bucket.acquire_sync()
+            self.requests += 1
+            try:
+                response = self.transport.handle_request(request)
+            except httpx.TransportError as e:
+                if attempt == self.max_retries:
+                    self._log_give_up(model_id, type(e).__name__)
+                    if token_bucket:
+                        token_bucket.consume(-estimated_tokens)
+                    raise
+                delay = self._retry_delay(attempt, None)
+                self._log_retry(model_id, type(e).__name__, delay)
+                time.sleep(delay)
+                continue
+            if self._is_retryable(response):
+                if attempt == self.max_retries:
+                    self._log_give_up(model_id, f"HTTP {response.status_code}")
+                    break
+                response.close()
+                delay = self._retry_delay(attempt, response)
+                self._log_retry(model_id, f"HTTP {response.status_code}", delay)
+                time.sleep(delay)
+                continue
+            break
+
+        if not token_bucket:
+            return response
+        if response.status_code >= 400:
+            token_bucket.consume(-estimated_tokens)
+            return response
+        tracker = _UsageTracker(response, token_bucket, estimated_tokens, bool(body.get("stream")))
+        return self._tracked_response(response, _SyncUsageStream(tracker))
+
+    def close(self) -> None:
+        self.transport.close()
+
+
+class AsyncRateLimitedTransport(_RateLimitedTransportBase, httpx.AsyncBaseTransport):
+    """
+    Async httpx transport sharing a ModelRateLimiter, see _RateLimitedTransportBase.
+    Connections belong to the event loop that opened them, so each loop gets its own
+    pool and one client can serve every asyncio.run() of the process.
+    """
+
+    def __init__(self, limiter: Optional[ModelRateLimiter] = None, limits: Optional[httpx.Limits] = None, **options):
+        super().__init__(limiter, **options)
+        self.limits = limits or httpx.Limits()
+        self._transports: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncHTTPTransport]" = (
+            weakref.WeakKeyDictionary()
+        )
+
+    def _transport(self) -> httpx.AsyncHTTPTransport:
+        loop = asyncio.get_running_loop()
+        transport = self._transports.get(loop)
+        if transport is None:
+            transport = self._transports[loop] = httpx.AsyncHTTPTransport(limits=self.limits)
+        return transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        transport = self._transport()
+        body = self._chat_request(request)
+        if body is None:
+            return await transport.handle_async_request(request)
+        model_id = body.get("model", "")
+        request_bucket, token_bucket = self.limiter.get_buckets(model_id)
+        estimated_tokens = _estimate_request_tokens(body)
+        if token_bucket:
+            await token_bucket.acquire(estimated_tokens)
+
+        for attempt in range(self.max_retries + 1):
+            if request_bucket:
+                await request_bucket.acquire()
+            self.requests += 1
+            try:
+                response = await transport.handle_async_request(request)
+            except httpx.TransportError as e:
+                if attempt == self.max_retries:
+                    self._log_give_up(model_id, type(e).__name__)
+                    if token_bucket:
+                        token_bucket.consume(-estimated_tokens)
+                    raise
+                delay = self._retry_delay(attempt, None)
+                self._log_retry(model_id, type(e).__name__, delay)
+                await asyncio.sleep(delay)
+                continue
+            if self._is_retryable(response):
+                if attempt == self.max_retries:
+                    self._log_give_up(model_id, f"HTTP {response.status_code}")
+                    break
+                await response.aclose()
+                delay = self._retry_delay(attempt, response)
+                self._log_retry(model_id, f"HTTP {response.status_code}", delay)
+                await asyncio.sleep(delay)
+                continue
+            break
+
+        if not token_bucket:
+            return response
+        if response.status_code >= 400:
+            token_bucket.consume(-estimated_tokens)
+            return response
+        tracker = _UsageTracker(response, token_bucket, estimated_tokens, bool(body.get("stream")))
+        return self._tracked_response(response, _AsyncUsageStream(tracker))
+
+    async def aclose(self) -> None:
+        transport = self._transports.pop(asyncio.get_running_loop(), None)
+        if transport is not None:
+            await transport.aclose()
+
+
+_shared_clients: dict[str, Union[httpx.Client, httpx.AsyncClient]] = {}
+_shared_clients_lock = threading.Lock()
+
+
+def get_shared_http_clients(
+    max_connections: int = 100, timeout: float = 120.0
+) -> tuple[httpx.Client, httpx.AsyncClient]:
+    """
+    Process-wide sync and async httpx clients for OpenRouter, pooling connections and
+    drawing on the shared ModelRateLimiter. Pass them to ChatOpenAI or OpenAI with
+    max_retries=0, as the transport retries. The first call's arguments win.
+    """
+    with _shared_clients_lock:
+        if not _shared_clients:
+            limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+            _shared_clients["sync"] = httpx.Client(transport=RateLimitedTransport(limits=limits), timeout=timeout)
+            _shared_clients["async"] = httpx.AsyncClient(
+                transport=AsyncRateLimitedTransport(limits=limits), timeout=timeout
+            )
+        return _shared_clients["sync"], _shared_clients["async"]
+
+
+class AsyncOpenRouterClient:
+    """
+    Async OpenRouter chat client shared across models.
+    One httpx connection pool serves every model, per-model requests/tokens per minute
+    budgets are enforced client side, shared with every other client of the process
+    unless rate_limits are given, retryable errors back off exponentially with jitter
+    (honoring Retry-After), and identical in-flight requests at temperature 0 are
+    coalesced. Sampled requests are never coalesced, each caller gets its own sample.
+    """
+
+    def __init__(
+        self,
+        api_key: Optional[str] = None,
+        base_url: Optional[str] = None,
+        rate_limits: Optional[dict[str, tuple[Optional[int], Optional[int]]]] = None,
+        max_retries: int = 5,
+        base_delay: float = 1.0,
+        max_delay: float = 60.0,
+        max_connections: int = 100,
+        timeout: float = 120.0,
+    ):
+        # rate_limits maps model_id -> (requests_per_minute, tokens_per_minute), overriding model_info.json
+        self.transport = AsyncRateLimitedTransport(
+            ModelRateLimiter(rate_limits) if rate_limits else None,
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+            ),
+            max_retries=max_retries,
+            base_delay=base_delay,
+            max_delay=max_delay,
+        )
+        self.http_client = httpx.AsyncClient(transport=self.transport, timeout=timeout)
+        # Retries are handled by the transport so Retry-After and budgets are respected
+        self.client = AsyncOpenAI(
+            api_key=api_key or settings.openrouter_api_key,
+            base_url=base_url or settings.openrouter_api_url,
+            http_client=self.http_client,
+            max_retries=0,
+        )
+        self._in_flight: dict[str, asyncio.Future] = {}
+        self.coalesced = 0
+
+    @staticmethod
+    def _request_key(model_id: str, messages: list[dict], params: dict) -> str:
+        payload = json.dumps(
+            {"model_id": model_id, "messages": messages, "params": params},
+            sort_keys=True,
+            ensure_ascii=False,
+        )
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    async def _send(self, model_id: str, messages: list[dict], params: dict) -> ChatCompletion:
+        return await self.client.chat.completions.create(model=model_id, messages=messages, **params)
+
+    async def chat(
+        self,
+        model_id: str,
+        prompt: Union[LLMPromptTemplate, list[dict]],
+        **params,
+    ) -> ChatCompletion:
+        messages = prompt.to_list() if isinstance(prompt, LLMPromptTemplate) else prompt
+        # Without a temperature the provider samples, usually at 1.0
+        if params.get("temperature") != 0:
+            return await self._send(model_id, messages, params)
+
+        key = self._request_key(model_id, messages, params)
+        if key in self._in_flight:
+            self.coalesced += 1
+            return await asyncio.shield(self._in_flight[key])
+
+        future = asyncio.ensure_future(self._send(model_id, messages, params))
+        self._in_flight[key] = future
+        try:
+            return await asyncio.shield(future)
+        finally:
+            if future.done():
+                self._in_flight.pop(key, None)
+            else:
+                # Caller was cancelled, keep the request alive for coalesced waiters
+                future.add_done_callback(lambda _: self._in_flight.pop(key, None))
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.transport.requests,
+            "retries": self.transport.retries,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._in_flight),
+        }
+
+    async def close(self) -> None:
+        await self.http_client.aclose()
+
+    async def __aenter__(self) -> "AsyncOpenRouterClient":
+        return self
+
+    async def __aexit__(self, *args) -> None:
+        await self.close()
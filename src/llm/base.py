@@ -11,7 +11,20 @@ class LLMInfo(BaseModel):
     description: str = Field("", description="Description of the model")
     input_cost: float = Field(0.0, description="Input cost per 1M tokens")
     output_cost: float = Field(0.0, description="Output cost per 1M tokens")
+    cache_read_cost: Optional[float] = Field(None, description="Cost per 1M prompt tokens read from the provider cache, input_cost if unset")
     is_free: bool = Field(True, description="Is the model free to use")
+    requests_per_minute: Optional[int] = Field(None, description="Request budget per minute")
+    tokens_per_minute: Optional[int] = Field(None, description="Token budget per minute")
+
+    def get_cost(self, prompt_tokens: int, completion_tokens: int, cached_prompt_tokens: int = 0) -> float:
+        """USD cost of a call, input/output costs are per 1M tokens.
+        cached_prompt_tokens are the part of prompt_tokens served from the provider cache."""
+        cache_read_cost = self.input_cost if self.cache_read_cost is None else self.cache_read_cost
+        return (
+            (prompt_tokens - cached_prompt_tokens) * self.input_cost
+            + cached_prompt_tokens * cache_read_cost
+            + completion_tokens * self.output_cost
+        ) / 1_000_000
 
 
 class LLMExtraConfig(BaseModel):
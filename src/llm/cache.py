@@ -0,0 +1,167 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+from config import settings
+from logger import housing_logger
+from prompts import LLMPromptTemplate
+
+EVICTION_BATCH_SIZE = 100
+
+
+class LLMResponseCache:
+    """
+    On-disk LLM response cache backed by SQLite, evicting least recently used entries
+    once the stored responses exceed max_size_mb.
+    Responses are stored as serialized JSON so any client type can round-trip them.
+    """
+
+    def __init__(
+        self,
+        cache_path: Optional[str] = None,
+        max_size_mb: Optional[float] = None,
+        bypass: Optional[bool] = None,
+    ):
+        self.cache_path = cache_path or settings.llm_cache_path
+        self.max_bytes = int(
+            (max_size_mb if max_size_mb is not None else settings.llm_cache_max_mb)
+            * 1024
+            * 1024
+        )
+        # Bypass skips lookups but still stores fresh responses, for deliberate re-sampling
+        self.bypass = bypass if bypass is not None else settings.llm_cache_bypass
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        Path(self.cache_path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(self.cache_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS llm_responses (
+                cache_key TEXT PRIMARY KEY,
+                model_id TEXT NOT NULL,
+                response TEXT NOT NULL,
+                size_bytes INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_accessed REAL NOT NULL
+            )
+            """
+        )
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_llm_responses_last_accessed "
+            "ON llm_responses (last_accessed)"
+        )
+        self.conn.commit()
+        self.total_bytes = self.conn.execute(
+            "SELECT COALESCE(SUM(size_bytes), 0) FROM llm_responses"
+        ).fetchone()[0]
+        housing_logger.info(
+            f"Opened LLM response cache at {self.cache_path} "
+            f"({self.total_bytes / 1024 / 1024:.1f} MB, bypass={self.bypass})."
+        )
+
+    @staticmethod
+    def make_key(
+        model_id: str,
+        model_params: Optional[dict],
+        prompt: LLMPromptTemplate,
+        response_mode: Optional[str] = None,
+    ) -> str:
+        """
+        response_mode tags responses that are not the plain completion, e.g. "stream"
+        for streams cut at the first SQL statement, so the modes never share entries.
+        """
+        payload = {
+            "model_id": model_id,
+            "params": model_params or {},
+            "messages": prompt.to_list(),
+        }
+        # Left out when unset, so complete responses keep the keys they were cached under
+        if response_mode:
+            payload["response_mode"] = response_mode
+        encoded = json.dumps(payload, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(encoded.encode()).hexdigest()
+
+    def get(self, cache_key: str) -> Optional[str]:
+        if self.bypass:
+            self.misses += 1
+            return None
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT response FROM llm_responses WHERE cache_key = ?", (cache_key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.conn.execute(
+                "UPDATE llm_responses SET last_accessed = ? WHERE cache_key = ?",
+                (time.time(), cache_key),
+            )
+            self.conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def set(self, cache_key: str, model_id: str, response: str) -> None:
+        size_bytes = len(response.encode())
+        now = time.time()
+        with self._lock:
+            previous = self.conn.execute(
+                "SELECT size_bytes FROM llm_responses WHERE cache_key = ?", (cache_key,)
+            ).fetchone()
+            self.conn.execute(
+                "INSERT OR REPLACE INTO llm_responses "
+                "(cache_key, model_id, response, size_bytes, created_at, last_accessed) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (cache_key, model_id, response, size_bytes, now, now),
+            )
+            self.total_bytes += size_bytes - (previous[0] if previous else 0)
+            self._evict()
+            self.conn.commit()
+
+    def _evict(self) -> None:
+        while self.total_bytes > self.max_bytes:
+            rows = self.conn.execute(
+                "SELECT cache_key, size_bytes FROM llm_responses "
+                "ORDER BY last_accessed ASC LIMIT ?",
+                (EVICTION_BATCH_SIZE,),
+            ).fetchall()
+            if not rows:
+                self.total_bytes = 0
+                return
+            for cache_key, size_bytes in rows:
+                if self.total_bytes <= self.max_bytes:
+                    break
+                self.conn.execute(
+                    "DELETE FROM llm_responses WHERE cache_key = ?", (cache_key,)
+                )
+                self.total_bytes -= size_bytes
+                self.evictions += 1
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "size_mb": self.total_bytes / 1024 / 1024,
+        }
+
+    def clear(self) -> None:
+        with self._lock:
+            self.conn.execute("DELETE FROM llm_responses")
+            self.conn.commit()
+            self.total_bytes = 0
+        housing_logger.info(f"Cleared LLM response cache at {self.cache_path}.")
+
+    def close(self) -> None:
+        if self.conn:
+            self.conn.close()
+            self.conn = None
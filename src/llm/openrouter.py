@@ -1,56 +1,128 @@
 import json
-from pydantic import BaseModel, Field
+import os
+import threading
+import time
+from pydantic import BaseModel, Field, PrivateAttr
 from .base import (
     BaseLLM,
     LLMInfo,
     LLMExtraConfig,
     LLMPromptTemplate,
 )
+from .cache import LLMResponseCache
 from config import settings
 from logger import housing_logger
-from openai import OpenAI
-from openai.types.chat.chat_completion import ChatCompletion
-from typing import Optional
+from typing import TYPE_CHECKING, Optional
 from utils import timer
 
+if TYPE_CHECKING:
+    from openai.types.chat.chat_completion import ChatCompletion
+    from .async_client import AsyncOpenRouterClient
+
 MODEL_INFO_FILE_PATH = settings.llm_info_json_path
+TOKENS_PER_PRICE_UNIT = 1_000_000
+
+
+def _load_catalogue(path: str) -> list[LLMInfo]:
+    """
+    Models from a saved copy of OpenRouter's GET /api/v1/models response.
+    Catalogue prices are USD per token strings, converted to per 1M tokens.
+    """
+    with open(path, "r") as f:
+        data = json.load(f)
+    models = []
+    for entry in data.get("data", []):
+        pricing = entry.get("pricing") or {}
+        input_cost = float(pricing.get("prompt") or 0) * TOKENS_PER_PRICE_UNIT
+        output_cost = float(pricing.get("completion") or 0) * TOKENS_PER_PRICE_UNIT
+        cache_read = pricing.get("input_cache_read")
+        models.append(
+            LLMInfo(
+                # Catalogue models have no short name, so they are named by their ID
+                name=entry["id"],
+                id=entry["id"],
+                description=entry.get("name", ""),
+                input_cost=input_cost,
+                output_cost=output_cost,
+                cache_read_cost=float(cache_read) * TOKENS_PER_PRICE_UNIT if cache_read else None,
+                is_free=entry["id"].endswith(":free") or input_cost == output_cost == 0,
+            )
+        )
+    return models
 
 
 class OpenRouterLLMInfo(BaseModel):
     """
     Load Json info for OpenRouter models, available for choices in eval.
+    Models are indexed by name and ID, so lookups are constant-time.
     """
 
     models: list[LLMInfo] = Field(default_factory=list)
     free_models: list[LLMInfo] = Field(default_factory=list)
     paid_models: list[LLMInfo] = Field(default_factory=list)
 
+    _by_name: dict[str, LLMInfo] = PrivateAttr(default_factory=dict)
+    _by_id: dict[str, LLMInfo] = PrivateAttr(default_factory=dict)
+
+    def model_post_init(self, __context: any) -> None:
+        # First entry wins, matching the linear scan this replaced
+        for model in reversed(self.models):
+            self._by_name[model.name] = model
+            self._by_id[model.id] = model
+
+    @classmethod
+    def from_models(cls, models: list[LLMInfo]) -> "OpenRouterLLMInfo":
+        return cls(
+            models=models,
+            free_models=[model for model in models if model.is_free],
+            paid_models=[model for model in models if not model.is_free],
+        )
+
     # Load from JSON file
     @classmethod
-    def load_from_json(cls) -> "OpenRouterLLMInfo":
+    def load_from_json(
+        cls, path: Optional[str] = None, catalogue_path: Optional[str] = None
+    ) -> "OpenRouterLLMInfo":
+        """
+        Models from model_info.json, optionally merged with a local OpenRouter catalogue.
+        Catalogue prices fill in costs the JSON leaves unset, and catalogue models
+        missing from the JSON are added under their ID.
+        """
         try:
-            with open(MODEL_INFO_FILE_PATH, "r") as f:
+            with open(path or MODEL_INFO_FILE_PATH, "r") as f:
                 data = json.load(f)
         except Exception as e:
             housing_logger.error(f"Error loading JSON: {e}")
             return cls()
         models = [LLMInfo(**model) for model in data.get("openrouter", [])]
-        free_models = [model for model in models if model.is_free]
-        paid_models = [model for model in models if not model.is_free]
+
+        if catalogue_path:
+            try:
+                catalogue = {model.id: model for model in _load_catalogue(catalogue_path)}
+            except Exception as e:
+                housing_logger.error(f"Error loading OpenRouter catalogue: {e}")
+                catalogue = {}
+            known_ids = set()
+            for i, model in enumerate(models):
+                known_ids.add(model.id)
+                listed = catalogue.get(model.id)
+                if listed:
+                    missing = {
+                        field: getattr(listed, field)
+                        for field in ("input_cost", "output_cost", "cache_read_cost", "is_free", "description")
+                        if field not in model.model_fields_set
+                    }
+                    models[i] = model.model_copy(update=missing)
+            models.extend(model for model_id, model in catalogue.items() if model_id not in known_ids)
+
         housing_logger.info(f"{len(models)} models included in OpenRouter LLM info.")
-        return cls(models=models, free_models=free_models, paid_models=paid_models)
+        return cls.from_models(models)
 
     def get_model_info_by_name(self, model_name: str) -> Optional[LLMInfo]:
-        for model in self.models:
-            if model.name == model_name:
-                return model
-        return None
+        return self._by_name.get(model_name)
 
     def get_model_info_by_id(self, model_id: str) -> Optional[LLMInfo]:
-        for model in self.models:
-            if model.id == model_id:
-                return model
-        return None
+        return self._by_id.get(model_id)
 
     def get_model_id_by_name(self, model_name: str) -> Optional[str]:
         model = self.get_model_info_by_name(model_name)
@@ -59,8 +131,101 @@ class OpenRouterLLMInfo(BaseModel):
     def get_all_models(self) -> list[LLMInfo]:
         return self.models
 
+    def filter_models(
+        self,
+        is_free: Optional[bool] = None,
+        max_input_cost: Optional[float] = None,
+        max_output_cost: Optional[float] = None,
+    ) -> list[LLMInfo]:
+        """
+        Models of one tier and/or within per 1M token cost ceilings.
+        """
+        if is_free is None:
+            models = self.models
+        else:
+            models = self.free_models if is_free else self.paid_models
+        return [
+            model
+            for model in models
+            if (max_input_cost is None or model.input_cost <= max_input_cost)
+            and (max_output_cost is None or model.output_cost <= max_output_cost)
+        ]
+
 
-openrouter_llm_info = OpenRouterLLMInfo.load_from_json()
+class _ModelRegistry:
+    """
+    Process-wide OpenRouterLLMInfo, rebuilt when model_info.json or the catalogue changes.
+    The files are stat'ed at most once per reload interval, so long-running eval
+    workers pick up model list edits without a restart.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._info: Optional[OpenRouterLLMInfo] = None
+        self._signature: Optional[tuple] = None
+        self._checked_at = 0.0
+
+    @staticmethod
+    def _paths() -> tuple[str, Optional[str]]:
+        return MODEL_INFO_FILE_PATH, settings.openrouter_catalogue_path
+
+    @staticmethod
+    def _file_signature(path: Optional[str]) -> Optional[tuple[int, int]]:
+        if not path:
+            return None
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def _current_signature(self) -> tuple:
+        return tuple(self._file_signature(path) for path in self._paths())
+
+    def get(self) -> OpenRouterLLMInfo:
+        now = time.monotonic()
+        info = self._info
+        if info is not None and now - self._checked_at < settings.llm_info_reload_interval:
+            return info
+        with self._lock:
+            if self._info is not None and now - self._checked_at < settings.llm_info_reload_interval:
+                return self._info
+            signature = self._current_signature()
+            if self._info is None or signature != self._signature:
+                if self._info is not None:
+                    housing_logger.info("Model info changed on disk, reloading.")
+                path, catalogue_path = self._paths()
+                self._info = OpenRouterLLMInfo.load_from_json(path, catalogue_path)
+                self._signature = signature
+            self._checked_at = now
+            return self._info
+
+    def reload(self) -> OpenRouterLLMInfo:
+        with self._lock:
+            self._info = None
+            self._checked_at = 0.0
+        return self.get()
+
+
+_model_registry = _ModelRegistry()
+
+
+def get_openrouter_llm_info() -> OpenRouterLLMInfo:
+    """
+    Model info, parsed from model_info.json on first use and reloaded when it changes.
+    """
+    return _model_registry.get()
+
+
+def reload_openrouter_llm_info() -> OpenRouterLLMInfo:
+    return _model_registry.reload()
+
+
+def __getattr__(name: str) -> any:
+    # Keeps `from llm.openrouter import openrouter_llm_info` working without eager parsing
+    if name == "openrouter_llm_info":
+        return get_openrouter_llm_info()
+    raise AttributeError(f"module '{__name__}' has no attribute '{name}'")
 
 
 class OpenRouterLLM(BaseLLM):
@@ -68,6 +233,7 @@ class OpenRouterLLM(BaseLLM):
         self,
         model_name: Optional[str] = None,
         model_id: Optional[str] = None,
+        response_cache: Optional[LLMResponseCache] = None,
         **kwargs,
     ):
         """
@@ -81,7 +247,7 @@ class OpenRouterLLM(BaseLLM):
             raise ValueError("Either model_name or model_id must be provided.")
         # Get id by name if only name provided
         if not model_id:
-            self.model_id = openrouter_llm_info.get_model_id_by_name(model_name)
+            self.model_id = get_openrouter_llm_info().get_model_id_by_name(model_name)
             # Verify model name available
             if not self.model_id:
                 housing_logger.error(f"Model name '{model_name}' not found.")
@@ -94,23 +260,39 @@ class OpenRouterLLM(BaseLLM):
             raise ValueError("OpenRouter API key is required.")
 
         self.kwargs = kwargs if kwargs else {}
+        self.response_cache = response_cache
         # Initialize OpenAI client
+        from openai import OpenAI
+        from .async_client import get_shared_http_clients
+
         self.client = OpenAI(
             api_key=self.api_key,
             base_url=self.api_url,
+            # Rate limited and retried by the shared transport
+            http_client=get_shared_http_clients()[0],
+            max_retries=0,
         )
 
     def get_model_info(self) -> Optional[LLMInfo]:
         if self.model_name:
-            return openrouter_llm_info.get_model_info_by_name(self.model_name)
+            return get_openrouter_llm_info().get_model_info_by_name(self.model_name)
         elif self.model_id:
-            return openrouter_llm_info.get_model_info_by_id(self.model_id)
+            return get_openrouter_llm_info().get_model_info_by_id(self.model_id)
         return None
 
     @timer
-    def prompt_model(self, prompt: LLMPromptTemplate) -> Optional[ChatCompletion]:
+    def prompt_model(self, prompt: LLMPromptTemplate) -> Optional["ChatCompletion"]:
         prompt_messages = prompt.to_list()
 
+        cache_key = None
+        if self.response_cache:
+            cache_key = LLMResponseCache.make_key(self.model_id, self.kwargs, prompt)
+            cached = self.response_cache.get(cache_key)
+            if cached:
+                from openai.types.chat.chat_completion import ChatCompletion
+
+                return ChatCompletion.model_validate_json(cached)
+
         housing_logger.info(f"Sending prompt to OpenRouter model {self.model_id}.")
         response = self.client.chat.completions.create(
             model=self.model_id,
@@ -125,9 +307,36 @@ class OpenRouterLLM(BaseLLM):
         housing_logger.info(
             f"Received response from OpenRouter model {self.model_id}."
         )
+        if cache_key:
+            self.response_cache.set(cache_key, self.model_id, response.model_dump_json())
+        return response
+
+    async def aprompt_model(
+        self, prompt: LLMPromptTemplate, async_client: "AsyncOpenRouterClient"
+    ) -> Optional["ChatCompletion"]:
+        """
+        Async counterpart of prompt_model(), sharing the rate limited client across models.
+        """
+        cache_key = None
+        if self.response_cache:
+            cache_key = LLMResponseCache.make_key(self.model_id, self.kwargs, prompt)
+            cached = self.response_cache.get(cache_key)
+            if cached:
+                from openai.types.chat.chat_completion import ChatCompletion
+
+                return ChatCompletion.model_validate_json(cached)
+
+        response = await async_client.chat(self.model_id, prompt, **self.kwargs)
+        if not response or not response.choices:
+            housing_logger.error(
+                f"No response from OpenRouter model {self.model_id}."
+            )
+            return None
+        if cache_key:
+            self.response_cache.set(cache_key, self.model_id, response.model_dump_json())
         return response
 
-    def parse_response(self, response: ChatCompletion) -> str:
+    def parse_response(self, response: "ChatCompletion") -> str:
         try:
             return response.choices[0].message.content
         except (KeyError, IndexError) as e:
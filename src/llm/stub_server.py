@@ -0,0 +1,321 @@
+import json
+import math
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Literal, Optional, Union
+
+from pydantic import BaseModel, Field
+
+from logger import housing_logger
+from utils import CHARS_PER_TOKEN, estimate_tokens
+
+USER_QUESTION_PATTERN = re.compile(r"User Question: (.*)")
+
+
+def _message_text(message: dict) -> str:
+    content = message.get("content") or ""
+    if isinstance(content, list):
+        # Content parts, e.g. a system message carrying a cache_control hint
+        return "".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return str(content)
+
+
+class LatencyDistribution(BaseModel):
+    """
+    Response latency of the stub, in seconds, drawn from the seeded stub RNG.
+    """
+
+    kind: Literal["constant", "uniform", "normal", "lognormal", "exponential"] = Field(
+        "constant", description="Shape of the distribution"
+    )
+    mean: float = Field(0.0, description="Mean seconds, or the median for lognormal")
+    sigma: float = Field(0.0, description="Standard deviation, or the log-space sigma for lognormal")
+    low: float = Field(0.0, description="Lower bound for uniform, and the floor for every kind")
+    high: float = Field(0.0, description="Upper bound for uniform")
+
+    def sample(self, rng: random.Random) -> float:
+        if self.kind == "uniform":
+            value = rng.uniform(self.low, self.high)
+        elif self.kind == "normal":
+            value = rng.gauss(self.mean, self.sigma)
+        elif self.kind == "lognormal":
+            value = rng.lognormvariate(math.log(self.mean), self.sigma) if self.mean > 0 else 0.0
+        elif self.kind == "exponential":
+            value = rng.expovariate(1 / self.mean) if self.mean > 0 else 0.0
+        else:
+            value = self.mean
+        return max(value, self.low)
+
+
+def canned_sql_responder(
+    answers: dict[str, str], default: str = "SELECT 1"
+) -> Callable[[list[dict]], str]:
+    """
+    response_content callable answering each prompt with the SQL canned for its user question.
+    """
+
+    def respond(messages: list[dict]) -> str:
+        for message in reversed(messages):
+            match = USER_QUESTION_PATTERN.search(_message_text(message))
+            if match:
+                return answers.get(match.group(1).strip(), default)
+        return default
+
+    return respond
+
+
+class StubOpenRouterServer:
+    """
+    Local OpenAI-compatible /chat/completions server mimicking OpenRouter, for offline runs.
+    Returns canned content, streamed as server-sent events when asked to, and can
+    inject 429 responses with a Retry-After header and server errors.
+    latency is fixed seconds or a LatencyDistribution sampled per request.
+    A response_content callable may return a message dict with tool_calls instead of
+    text, non-streaming only. With prompt_cache, a system message seen before is
+    reported as cached prompt tokens, like a provider prefix cache.
+    """
+
+    def __init__(
+        self,
+        response_content: Union[str, Callable[[list[dict]], Union[str, dict]]] = "SELECT 1",
+        latency: Union[float, LatencyDistribution] = 0.0,
+        rate_limit_rate: float = 0.0,
+        error_rate: float = 0.0,
+        error_status: int = 500,
+        fail_first: int = 0,
+        retry_after: Optional[float] = 1.0,
+        chunk_delay: float = 0.0,
+        prompt_cache: bool = False,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        seed: int = 42,
+    ):
+        self.response_content = response_content
+        self.latency = latency
+        self.rate_limit_rate = rate_limit_rate
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.fail_first = fail_first
+        self.retry_after = retry_after
+        self.chunk_delay = chunk_delay
+        self.prompt_cache = prompt_cache
+        self._cached_prefixes: set[str] = set()
+        self.random = random.Random(seed)
+        self.requests = 0
+        self.rate_limited = 0
+        self.errors_injected = 0
+        self.streams_cancelled = 0
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self._make_handler())
+        self.server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _should_rate_limit(self) -> bool:
+        with self._lock:
+            self.requests += 1
+            limited = self.requests <= self.fail_first or (
+                self.rate_limit_rate > 0 and self.random.random() < self.rate_limit_rate
+            )
+            if limited:
+                self.rate_limited += 1
+            return limited
+
+    def _should_fail(self) -> bool:
+        with self._lock:
+            failed = self.error_rate > 0 and self.random.random() < self.error_rate
+            if failed:
+                self.errors_injected += 1
+            return failed
+
+    def _sample_latency(self) -> float:
+        if isinstance(self.latency, LatencyDistribution):
+            # The RNG is shared by handler threads
+            with self._lock:
+                return self.latency.sample(self.random)
+        return self.latency
+
+    def _message(self, body: dict) -> dict:
+        messages = body.get("messages", [])
+        content = self.response_content
+        if callable(content):
+            content = content(messages)
+        if isinstance(content, dict):
+            return {"role": "assistant", "content": None, **content}
+        return {"role": "assistant", "content": content}
+
+    def _content(self, body: dict) -> str:
+        message = self._message(body)
+        return message["content"] if message["content"] is not None else json.dumps(message)
+
+    def _cached_tokens(self, messages: list[dict]) -> int:
+        if not self.prompt_cache or not messages or messages[0].get("role") != "system":
+            return 0
+        prefix = _message_text(messages[0])
+        with self._lock:
+            if prefix in self._cached_prefixes:
+                return estimate_tokens(prefix)
+            self._cached_prefixes.add(prefix)
+        return 0
+
+    def _usage(self, body: dict, content: str) -> dict:
+        messages = body.get("messages", [])
+        prompt_tokens = sum(estimate_tokens(_message_text(m)) for m in messages)
+        completion_tokens = estimate_tokens(content)
+        return {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "prompt_tokens_details": {"cached_tokens": self._cached_tokens(messages)},
+        }
+
+    def _stream_chunks(self, body: dict) -> list[dict]:
+        content = self._content(body)
+        completion_id = f"gen-{uuid.uuid4().hex}"
+        created = int(time.time())
+        # One chunk per estimated token, roughly what a provider sends
+        pieces = [content[i : i + CHARS_PER_TOKEN] for i in range(0, len(content), CHARS_PER_TOKEN)]
+        chunks = [
+            {"delta": {"role": "assistant", "content": piece}, "finish_reason": None}
+            for piece in pieces
+        ]
+        chunks.append({"delta": {}, "finish_reason": "stop"})
+        events = [
+            {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": body.get("model", "stub"),
+                "provider": "stub",
+                "choices": [{"index": 0, **chunk}],
+            }
+            for chunk in chunks
+        ]
+        if body.get("stream_options", {}).get("include_usage"):
+            events.append(
+                {
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": created,
+                    "model": body.get("model", "stub"),
+                    "provider": "stub",
+                    "choices": [],
+                    "usage": self._usage(body, content),
+                }
+            )
+        return events
+
+    def _completion(self, body: dict) -> dict:
+        message = self._message(body)
+        content = message["content"] if message["content"] is not None else json.dumps(message)
+        return {
+            "id": f"gen-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "stub"),
+            "provider": "stub",
+            "choices": [
+                {
+                    "index": 0,
+                    "finish_reason": "tool_calls" if message.get("tool_calls") else "stop",
+                    "message": message,
+                }
+            ],
+            "usage": self._usage(body, content),
+        }
+
+    def _make_handler(self) -> type:
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format: str, *args) -> None:
+                # Keep stderr quiet, the eval logger reports what matters
+                pass
+
+            def _send_json(self, status: int, payload: dict, headers: Optional[dict] = None) -> None:
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _send_stream(self, events: list[dict]) -> None:
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Cache-Control", "no-cache")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                try:
+                    for event in events:
+                        self.wfile.write(f"data: {json.dumps(event)}\n\n".encode())
+                        self.wfile.flush()
+                        if stub.chunk_delay:
+                            time.sleep(stub.chunk_delay)
+                    self.wfile.write(b"data: [DONE]\n\n")
+                    self.wfile.flush()
+                except (BrokenPipeError, ConnectionResetError):
+                    # Client closed the stream early
+                    with stub._lock:
+                        stub.streams_cancelled += 1
+                self.close_connection = True
+
+            def do_POST(self) -> None:
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length) or b"{}")
+                if not self.path.rstrip("/").endswith("/chat/completions"):
+                    self._send_json(404, {"error": {"message": "Not found", "code": 404}})
+                    return
+                if stub._should_rate_limit():
+                    headers = {}
+                    if stub.retry_after is not None:
+                        headers["Retry-After"] = str(stub.retry_after)
+                    self._send_json(
+                        429,
+                        {"error": {"message": "Rate limit exceeded", "code": 429}},
+                        headers,
+                    )
+                    return
+                latency = stub._sample_latency()
+                if latency:
+                    time.sleep(latency)
+                if stub._should_fail():
+                    self._send_json(
+                        stub.error_status,
+                        {"error": {"message": "Injected upstream error", "code": stub.error_status}},
+                    )
+                    return
+                if body.get("stream"):
+                    self._send_stream(stub._stream_chunks(body))
+                else:
+                    self._send_json(200, stub._completion(body))
+
+        return Handler
+
+    def start(self) -> "StubOpenRouterServer":
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        housing_logger.info(f"Stub OpenRouter server listening on {self.base_url}")
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+        if self._thread:
+            self._thread.join()
+
+    def __enter__(self) -> "StubOpenRouterServer":
+        return self.start()
+
+    def __exit__(self, *args) -> None:
+        self.stop()
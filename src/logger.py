@@ -1,24 +1,199 @@
+import atexit
+import json
 import logging
+import os
+import queue
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional, TextIO
+
 import colorlog
 
-class HousingLogger:
-    def __init__(self, name: str):
-        self.logger = colorlog.getLogger(name)
-        self.logger.setLevel(logging.DEBUG)
-
-        # Colored handler
-        handler = colorlog.StreamHandler()
-        handler.setFormatter(colorlog.ColoredFormatter(
-            '%(log_color)s%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-            log_colors={
-                'DEBUG':    'cyan',
-                'INFO':     'green',
-                'WARNING':  'yellow',
-                'ERROR':    'red',
-                'CRITICAL': 'bold_red',
-            }
+# Read from the environment rather than config.settings, since settings need the
+# API key and database paths, and the logger has to work before those exist.
+LOG_LEVEL = os.getenv("LOG_LEVEL", "DEBUG").upper()
+LOG_JSON = os.getenv("LOG_JSON", "false").lower() in ("1", "true", "yes")
+LOG_ASYNC = os.getenv("LOG_ASYNC", "true").lower() in ("1", "true", "yes")
+# Records per second per message type below WARNING, 0 for no limit
+LOG_RATE_LIMIT = float(os.getenv("LOG_RATE_LIMIT", "20"))
+# JSON object of message type to the share of its records kept, e.g. {"query": 0.01}
+LOG_SAMPLE_RATES = json.loads(os.getenv("LOG_SAMPLE_RATES", "{}"))
+
+LOG_COLORS = {
+    'DEBUG':    'cyan',
+    'INFO':     'green',
+    'WARNING':  'yellow',
+    'ERROR':    'red',
+    'CRITICAL': 'bold_red',
+}
+# Attributes of every LogRecord, anything else came in through extra=
+RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "taskName"}
+
+
+class ColoredFormatter(colorlog.ColoredFormatter):
+    def format(self, record: logging.LogRecord) -> str:
+        text = super().format(record)
+        suppressed = getattr(record, "suppressed", 0)
+        return f"{text} ({suppressed} similar suppressed)" if suppressed else text
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """
+    One JSON object per record, with extra= fields as top-level keys.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "source": f"{record.module}:{record.lineno}",
+            "thread": record.threadName,
+        }
+        for key, value in vars(record).items():
+            if key not in RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Sample and rate limit records below WARNING per message type. The type is the
+    log_type extra if given and the call site otherwise, so every f-string message
+    from one line shares a budget. The next record let through carries the count
+    dropped since, as its suppressed attribute.
+    """
+
+    def __init__(self, rate_limit: float = 0.0, sample_rates: Optional[dict[str, float]] = None):
+        super().__init__()
+        self.rate_limit = rate_limit
+        self.sample_rates = sample_rates or {}
+        self._lock = threading.Lock()
+        # message type -> [tokens, last refill, seen, suppressed]
+        self._state: dict[str, list] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        log_type = getattr(record, "log_type", None) or (record.pathname, record.lineno)
+        sample_rate = self.sample_rates.get(log_type) if isinstance(log_type, str) else None
+        now = time.monotonic()
+        with self._lock:
+            state = self._state.get(log_type)
+            if state is None:
+                state = self._state[log_type] = [max(self.rate_limit, 1.0), now, 0, 0]
+            state[2] += 1
+            keep = True
+            if sample_rate is not None:
+                # Deterministic, keeping the first record and every 1/rate-th after it
+                keep = sample_rate > 0 and (state[2] - 1) % max(1, round(1 / sample_rate)) == 0
+            if keep and self.rate_limit > 0:
+                state[0] = min(max(self.rate_limit, 1.0), state[0] + (now - state[1]) * self.rate_limit)
+                state[1] = now
+                keep = state[0] >= 1
+                if keep:
+                    state[0] -= 1
+            if not keep:
+                state[3] += 1
+                return False
+            suppressed, state[3] = state[3], 0
+        if suppressed:
+            record.suppressed = suppressed
+        return True
+
+
+class _RecordQueueHandler(QueueHandler):
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The listener is in this process, so only the message is merged on the
+        # calling thread and all formatting happens on the writer thread
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+_setup_lock = threading.Lock()
+_listeners: dict[str, QueueListener] = {}
+
+
+def _stop_listeners() -> None:
+    with _setup_lock:
+        for listener in _listeners.values():
+            listener.stop()
+        _listeners.clear()
+
+
+atexit.register(_stop_listeners)
+
+
+def configure_logging(
+    name: str,
+    level: Optional[str] = None,
+    json_format: Optional[bool] = None,
+    use_queue: Optional[bool] = None,
+    rate_limit: Optional[float] = None,
+    sample_rates: Optional[dict[str, float]] = None,
+    stream: Optional[TextIO] = None,
+) -> logging.Logger:
+    """
+    Set up the named logger, replacing whatever an earlier call installed, so calling
+    it again never stacks handlers. With use_queue, callers only enqueue records and a
+    background thread formats and writes them. Unset arguments come from the LOG_*
+    environment variables.
+    """
+    logger = colorlog.getLogger(name)
+    with _setup_lock:
+        listener = _listeners.pop(name, None)
+        if listener:
+            listener.stop()
+        for handler in [h for h in logger.handlers if getattr(h, "_housing_handler", False)]:
+            logger.removeHandler(handler)
+        for log_filter in [f for f in logger.filters if isinstance(f, SamplingFilter)]:
+            logger.removeFilter(log_filter)
+
+        logger.setLevel(level or LOG_LEVEL)
+        handler = colorlog.StreamHandler(stream or sys.stderr)
+        if LOG_JSON if json_format is None else json_format:
+            handler.setFormatter(JsonLinesFormatter())
+        else:
+            handler.setFormatter(ColoredFormatter(
+                '%(log_color)s%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+                log_colors=LOG_COLORS,
+            ))
+        # On the logger rather than the handler, so dropped records are never enqueued
+        logger.addFilter(SamplingFilter(
+            LOG_RATE_LIMIT if rate_limit is None else rate_limit,
+            LOG_SAMPLE_RATES if sample_rates is None else sample_rates,
         ))
-        self.logger.addHandler(handler)
+        if LOG_ASYNC if use_queue is None else use_queue:
+            record_queue = queue.SimpleQueue()
+            listener = QueueListener(record_queue, handler)
+            listener.start()
+            _listeners[name] = listener
+            handler = _RecordQueueHandler(record_queue)
+        handler._housing_handler = True
+        logger.addHandler(handler)
+    return logger
+
+
+def flush_logging() -> None:
+    """
+    Block until queued records are written, restarting the writer threads.
+    """
+    with _setup_lock:
+        for listener in _listeners.values():
+            listener.stop()
+            listener.start()
+
+
+class HousingLogger:
+    def __init__(self, name: str, **options):
+        self.logger = configure_logging(name, **options)
 
     def get_logger(self):
         return self.logger
@@ -1,20 +1,286 @@
-from agents.sql_query_agent import SqlQueryAgent
-from prompts import create_sql_prompt
-from pprint import pprint
+import argparse
+import os
+import sys
+
+# Only argparse is imported up front. Each command imports what it needs, so listing
+# models or printing help never loads langchain, openai or a database connection.
+
+DEFAULT_MODEL = "llama_small_free"
+STARTUP_COMMANDS = [["--help"], ["models"]]
+
+
+def list_models(args: argparse.Namespace) -> int:
+    from llm import get_openrouter_llm_info
+
+    is_free = True if args.free else False if args.paid else None
+    models = get_openrouter_llm_info().filter_models(
+        is_free=is_free,
+        max_input_cost=args.max_input_cost,
+        max_output_cost=args.max_output_cost,
+    )
+    for model in models:
+        cost = "free" if model.is_free else f"${model.input_cost:g}/${model.output_cost:g} per 1M"
+        print(f"{model.name:<24} {model.id:<48} {cost}")
+    return 0
+
+
+def ask(args: argparse.Namespace) -> int:
+    from pprint import pprint
+    from agents.sql_query_agent import SqlQueryAgent
 
-def main():
     agent = SqlQueryAgent()
-    table_schema = agent.query_executor.get_schema_from_table("estate_info")
-    agent.set_model(model_name="llama_small_free")
+    agent.set_model(model_name=args.model)
     agent.setup_agent(model_params=None)
+    answer = agent.evaluate(args.question, table_name=args.table)
+    pprint(answer.answer)
+    return 0
+
+
+def run_eval(args: argparse.Namespace) -> int:
+    from evaluations import TelemetryCollector, run_evaluation
+    from llm import LLMExtraConfig
+
+    model_params = None
+    if args.temperature is not None:
+        model_params = LLMExtraConfig(temperature=args.temperature)
+    telemetry = TelemetryCollector(run_id=args.run_id)
+    results = run_evaluation(
+        question_file=args.questions,
+        model_names=args.models,
+        output_path=args.output,
+        max_concurrency=args.concurrency,
+        model_params=model_params,
+        use_cache=not args.no_cache,
+        prune_schema=args.prune_schema,
+        streaming=args.streaming,
+        few_shot_index_dir=args.few_shot_index,
+        telemetry=telemetry,
+    )
+    errors = sum(1 for result in results if result.error)
+    print(f"run_id={telemetry.run_id} results={len(results)} errors={errors}")
+    return 0
+
+
+def score(args: argparse.Namespace) -> int:
+    from evaluations import ExecutionScorer, TelemetryCollector, load_questions, load_results
+
+    telemetry = TelemetryCollector(run_id=args.run_id) if args.run_id else None
+    scorer = ExecutionScorer(telemetry=telemetry)
+    try:
+        scores = scorer.score(load_questions(args.questions), load_results(args.results))
+    finally:
+        scorer.close()
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            for result in scores:
+                f.write(result.model_dump_json() + "\n")
+    correct = sum(1 for result in scores if result.is_correct)
+    print(f"scored={len(scores)} correct={correct} accuracy={correct / max(len(scores), 1):.1%}")
+    return 0
+
+
+def report(args: argparse.Namespace) -> int:
+    from evaluations import TelemetryCollector
+
+    rows = TelemetryCollector(run_id=args.run_id).rollup(args.run_id)
+    if not rows:
+        print(f"No telemetry for run '{args.run_id}'.")
+        return 1
+    columns = list(rows[0])
+    print("| " + " | ".join(columns) + " |")
+    print("|" + "---|" * len(columns))
+    for row in rows:
+        cells = [f"{value:.4g}" if isinstance(value, float) else str(value) for value in row.values()]
+        print("| " + " | ".join(cells) + " |")
+    return 0
+
+
+def bench_startup(args: argparse.Namespace) -> int:
+    from evaluations.startup import check_startup
+
+    passed, timings = check_startup(STARTUP_COMMANDS, budget=args.budget, runs=args.runs)
+    for timing in timings:
+        label = " ".join(timing.command)
+        slowest = ", ".join(f"{module} {seconds:.2f}s" for module, seconds in timing.slowest_imports)
+        print(f"{label:<12} median {timing.median:.3f}s max {timing.max:.3f}s | {slowest}")
+    print("PASS" if passed else "FAIL")
+    return 0 if passed else 1
+
+
+def run_bench(args: argparse.Namespace) -> int:
+    from evaluations import BenchmarkConfig, BenchmarkReport, compare_to_baseline, run_benchmark
+    from llm.stub_server import LatencyDistribution
+
+    config = BenchmarkConfig(
+        rows=args.rows,
+        questions=args.questions,
+        models=args.models,
+        concurrency=args.concurrency,
+        latency=LatencyDistribution(
+            kind=args.latency_kind, mean=args.latency_mean, sigma=args.latency_sigma
+        ),
+        error_rate=args.error_rate,
+        streaming=args.streaming,
+        seed=args.seed,
+    )
+    result = run_benchmark(config, work_dir=args.work_dir)
+    print(result.render())
+    if args.output:
+        result.save(args.output)
+    if args.update_baseline:
+        result.save(args.baseline)
+        print(f"Baseline written to {args.baseline}")
+        return 0
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}, run with --update-baseline to create one.")
+        return 0
+    regressions = compare_to_baseline(
+        result, BenchmarkReport.load(args.baseline), tolerance=args.tolerance
+    )
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    print("FAIL" if regressions else "PASS")
+    return 1 if regressions else 0
+
+
+def queue_submit(args: argparse.Namespace) -> int:
+    from evaluations import load_questions, open_work_queue, submit_tasks
+
+    queue = open_work_queue(args.queue)
+    try:
+        added = submit_tasks(queue, load_questions(args.questions), args.agents, args.models)
+        print(f"queued={added} status={queue.counts()}")
+    finally:
+        queue.close()
+    return 0
 
-    prompt = create_sql_prompt(
-        user_question="What are the 3 northernmost estates in Hong Kong?",
-        db_schema=table_schema
+
+def queue_work(args: argparse.Namespace) -> int:
+    from evaluations import run_workers
+
+    processed = run_workers(
+        args.queue,
+        workers=args.workers,
+        threads=args.threads,
+        agent_names=args.agents,
+        max_attempts=args.max_attempts,
+        lease_seconds=args.lease,
+        batch_size=args.batch_size,
     )
-    response = agent.act(prompt)
-    pprint(response.content)
-    return response
+    print(f"processed={processed}")
+    return 0
+
+
+def queue_merge(args: argparse.Namespace) -> int:
+    from evaluations import merge_results, open_work_queue, render_leaderboard
+
+    queue = open_work_queue(args.queue)
+    try:
+        entries = merge_results(queue, args.output)
+        finished = queue.is_finished()
+    finally:
+        queue.close()
+    print(render_leaderboard(entries))
+    return 0 if finished else 1
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="HK housing text-to-SQL evaluation.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    models = commands.add_parser("models", help="List the models in model_info.json")
+    tier = models.add_mutually_exclusive_group()
+    tier.add_argument("--free", action="store_true", help="Free models only")
+    tier.add_argument("--paid", action="store_true", help="Paid models only")
+    models.add_argument("--max-input-cost", type=float, default=None, help="USD per 1M input tokens")
+    models.add_argument("--max-output-cost", type=float, default=None, help="USD per 1M output tokens")
+    models.set_defaults(handler=list_models)
+
+    ask_parser = commands.add_parser("ask", help="Answer one question with the simple SQL agent")
+    ask_parser.add_argument("question")
+    ask_parser.add_argument("--model", default=DEFAULT_MODEL)
+    ask_parser.add_argument("--table", default="estate_info")
+    ask_parser.set_defaults(handler=ask)
+
+    eval_parser = commands.add_parser("eval", help="Run a question file through models")
+    eval_parser.add_argument("--questions", required=True, help="Question JSON/JSONL file")
+    eval_parser.add_argument("--models", nargs="+", required=True, help="Model names")
+    eval_parser.add_argument("--output", required=True, help="Results JSONL, appended to")
+    eval_parser.add_argument("--concurrency", type=int, default=4, help="Requests in flight per model")
+    eval_parser.add_argument("--temperature", type=float, default=None)
+    eval_parser.add_argument("--no-cache", action="store_true", help="Skip the response cache")
+    eval_parser.add_argument("--prune-schema", action="store_true", help="Prompt with linked columns only")
+    eval_parser.add_argument("--streaming", action="store_true", help="Stop at the first SQL statement")
+    eval_parser.add_argument("--few-shot-index", default=None, help="Saved FewShotIndex directory")
+    eval_parser.add_argument("--run-id", default=None, help="Telemetry run ID, generated if omitted")
+    eval_parser.set_defaults(handler=run_eval)
+
+    score_parser = commands.add_parser("score", help="Score results by execution accuracy")
+    score_parser.add_argument("--questions", required=True, help="Question JSON/JSONL file")
+    score_parser.add_argument("--results", required=True, help="Results JSONL from eval")
+    score_parser.add_argument("--output", default=None, help="Write scores to this JSONL file")
+    score_parser.add_argument("--run-id", default=None, help="Record score telemetry to this run")
+    score_parser.set_defaults(handler=score)
+
+    report_parser = commands.add_parser("report", help="Per-model telemetry rollup of a run")
+    report_parser.add_argument("--run-id", default="*", help="Run ID, '*' for every run")
+    report_parser.set_defaults(handler=report)
+
+    bench = commands.add_parser("bench-startup", help="Guard CLI startup time and imports")
+    bench.add_argument("--budget", type=float, default=1.0, help="Median seconds allowed per command")
+    bench.add_argument("--runs", type=int, default=5)
+    bench.set_defaults(handler=bench_startup)
+
+    bench_parser = commands.add_parser("bench", help="Benchmark the pipeline against a local stub LLM")
+    bench_parser.add_argument("--rows", type=int, default=10_000, help="Estates in the synthetic database")
+    bench_parser.add_argument("--questions", type=int, default=50)
+    bench_parser.add_argument("--models", nargs="+", default=["llama_free", "deepseek_free"])
+    bench_parser.add_argument("--concurrency", type=int, default=8, help="Requests in flight per model")
+    bench_parser.add_argument(
+        "--latency-kind",
+        choices=["constant", "uniform", "normal", "lognormal", "exponential"],
+        default="lognormal",
+    )
+    bench_parser.add_argument("--latency-mean", type=float, default=0.05, help="Stub latency seconds")
+    bench_parser.add_argument("--latency-sigma", type=float, default=0.5)
+    bench_parser.add_argument("--error-rate", type=float, default=0.0, help="Share of stub calls failing")
+    bench_parser.add_argument("--streaming", action="store_true")
+    bench_parser.add_argument("--seed", type=int, default=42)
+    bench_parser.add_argument("--work-dir", default=None, help="Keep the database and results here")
+    bench_parser.add_argument("--output", default=None, help="Write the report to this JSON file")
+    bench_parser.add_argument("--baseline", default="benchmarks/baseline.json")
+    bench_parser.add_argument("--update-baseline", action="store_true", help="Store this run as the baseline")
+    bench_parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative slowdown")
+    bench_parser.set_defaults(handler=run_bench)
+
+    submit_parser = commands.add_parser("queue-submit", help="Queue agent/model/question tasks for workers")
+    submit_parser.add_argument("--queue", required=True, help="Queue SQLite file (single host), or backend URL")
+    submit_parser.add_argument("--questions", required=True, help="Question JSON/JSONL file")
+    submit_parser.add_argument("--agents", nargs="+", default=["simple_sql"], help="Registered agent names")
+    submit_parser.add_argument("--models", nargs="+", required=True, help="Model names")
+    submit_parser.set_defaults(handler=queue_submit)
+
+    work_parser = commands.add_parser("queue-work", help="Answer queued tasks until the queue is drained")
+    work_parser.add_argument("--queue", required=True, help="Queue SQLite file (single host), or backend URL")
+    work_parser.add_argument("--workers", type=int, default=1, help="Worker processes on this node")
+    work_parser.add_argument("--threads", type=int, default=1, help="Workers per process")
+    work_parser.add_argument("--agents", nargs="+", default=None, help="Only work on these agents' tasks")
+    work_parser.add_argument("--lease", type=float, default=60.0, help="Seconds before an unrenewed task is retried")
+    work_parser.add_argument("--batch-size", type=int, default=1, help="Tasks claimed at a time")
+    work_parser.add_argument("--max-attempts", type=int, default=3, help="Attempts before a task fails")
+    work_parser.set_defaults(handler=queue_work)
+
+    merge_parser = commands.add_parser("queue-merge", help="Build the leaderboard from a queue's results")
+    merge_parser.add_argument("--queue", required=True, help="Queue SQLite file (single host), or backend URL")
+    merge_parser.add_argument("--output", required=True, help="Directory for results and leaderboard")
+    merge_parser.set_defaults(handler=queue_merge)
+    return parser
+
+
+def main(argv: list[str] = None) -> int:
+    args = build_parser().parse_args(argv)
+    return args.handler(args)
+
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
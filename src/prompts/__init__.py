@@ -1,2 +1,4 @@
 from .sql_query_agent import *
-from .base import LLMPromptTemplate
\ No newline at end of file
+from .base import LLMPromptTemplate
+from .assembly import PromptAssembler, needs_cache_control
+from .langchain_sql_agent import SQL_AGENT_PREFIX, SQL_AGENT_SUFFIX
@@ -0,0 +1,125 @@
+import threading
+import weakref
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Optional
+
+from .base import LLMPromptTemplate
+from .sql_query_agent import TABLE_INFO, create_sql_system_message, create_sql_user_message
+
+if TYPE_CHECKING:
+    from db.schema_catalog import SchemaCatalog
+
+# Providers that only cache prompts up to an explicit cache_control breakpoint.
+# OpenAI, DeepSeek, Grok and the like cache a repeated prefix automatically.
+CACHE_CONTROL_MODEL_PREFIXES = ("anthropic/", "google/gemini")
+
+
+def needs_cache_control(model_id: Optional[str]) -> bool:
+    """
+    Whether requests to model_id need a cache_control hint for prompt caching.
+    """
+    return bool(model_id) and model_id.startswith(CACHE_CONTROL_MODEL_PREFIXES)
+
+
+class PromptAssembler:
+    """
+    Assemble SQL prompts static-first: rules and schema in the system message, then
+    few-shot examples and the question in the user message. The system message is
+    rendered once per table and column selection and the same string is returned
+    after that, so every prompt over those tables shares it byte for byte as a prefix.
+    """
+
+    _assemblers: "weakref.WeakKeyDictionary[SchemaCatalog, PromptAssembler]" = weakref.WeakKeyDictionary()
+    _assemblers_lock = threading.Lock()
+
+    def __init__(self, schema_catalog: "SchemaCatalog", max_prefixes: int = 256):
+        self.schema_catalog = schema_catalog
+        self.max_prefixes = max_prefixes
+        self._lock = threading.Lock()
+        self._prefixes: OrderedDict[tuple, str] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def for_catalog(cls, schema_catalog: "SchemaCatalog") -> "PromptAssembler":
+        """
+        Shared assembler of a catalog, living as long as the catalog does.
+        """
+        with cls._assemblers_lock:
+            assembler = cls._assemblers.get(schema_catalog)
+            if assembler is None:
+                assembler = cls(schema_catalog)
+                cls._assemblers[schema_catalog] = assembler
+            return assembler
+
+    def _render_system_message(
+        self, table_names: list[str], column_names: Optional[dict[str, list[str]]]
+    ) -> str:
+        table_infos = []
+        db_schemas = []
+        for table_name in table_names:
+            table = self.schema_catalog.get_table(table_name)
+            table_info = f"{table_name} ({table.row_count} rows)"
+            description = TABLE_INFO.get(table_name, "").strip()
+            if description:
+                table_info += f": {description}"
+            table_infos.append(table_info)
+            db_schemas.append(self.schema_catalog.get_schema_str(
+                table_name,
+                column_names=column_names.get(table_name) if column_names else None,
+            ))
+        if len(table_names) > 1:
+            db_schemas = [f"[{name}]\n{schema}" for name, schema in zip(table_names, db_schemas)]
+        return create_sql_system_message(
+            db_schema="\n\n".join(db_schemas),
+            table_name=", ".join(table_names),
+            table_info="\n".join(table_infos),
+        )
+
+    def system_message(
+        self,
+        table_names: Optional[list[str]] = None,
+        column_names: Optional[dict[str, list[str]]] = None,
+    ) -> str:
+        table_names = table_names or ["estate_info"]
+        key = (
+            # A reloaded catalog of a changed database renders differently
+            self.schema_catalog.fingerprint,
+            tuple(table_names),
+            tuple(
+                (table_name, tuple(column_names[table_name]))
+                for table_name in table_names
+                if column_names and column_names.get(table_name) is not None
+            ),
+        )
+        with self._lock:
+            system_message = self._prefixes.get(key)
+            if system_message is not None:
+                self._prefixes.move_to_end(key)
+                self.hits += 1
+                return system_message
+        system_message = self._render_system_message(table_names, column_names)
+        with self._lock:
+            self.misses += 1
+            # Another thread may have rendered it meanwhile, keep the first copy
+            system_message = self._prefixes.setdefault(key, system_message)
+            while len(self._prefixes) > self.max_prefixes:
+                self._prefixes.popitem(last=False)
+        return system_message
+
+    def build(
+        self,
+        user_question: str,
+        table_names: Optional[list[str]] = None,
+        column_names: Optional[dict[str, list[str]]] = None,
+        examples: Optional[list[tuple[str, str]]] = None,
+        example_token_budget: int = 400,
+    ) -> LLMPromptTemplate:
+        return LLMPromptTemplate(
+            system_messages=self.system_message(table_names, column_names),
+            user_messages=create_sql_user_message(user_question, examples, example_token_budget),
+        )
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"prefixes": len(self._prefixes), "hits": self.hits, "misses": self.misses}
@@ -5,11 +5,17 @@ class LLMPromptTemplate(BaseModel):
     user_messages: str = Field(..., description="User messages")
     system_messages: Optional[str] = Field(None, description="System messages")
     assistant_messages: Optional[str] = Field(None, description="Assistant messages")
+    cache_control: bool = Field(False, description="Mark the system message as a provider prompt cache breakpoint")
 
     def to_list(self) -> list:
         """Convert to list of messages for LLM input."""
         messages = [{"role": "user", "content": self.user_messages}]
-        if self.system_messages:
+        if self.system_messages and self.cache_control:
+            # Content part form, the only one that carries a cache_control hint
+            messages.insert(0, {"role": "system", "content": [
+                {"type": "text", "text": self.system_messages, "cache_control": {"type": "ephemeral"}}
+            ]})
+        elif self.system_messages:
             messages.insert(0, {"role": "system", "content": self.system_messages})
         if self.assistant_messages:
             messages.append({"role": "assistant", "content": self.assistant_messages})
@@ -1,4 +1,9 @@
 from .base import LLMPromptTemplate
+from utils import estimate_tokens
+from typing import TYPE_CHECKING, Optional
+
+if TYPE_CHECKING:
+    from db.schema_catalog import SchemaCatalog
 
 SQL_SYSTEM_MESSAGE = """
 You are an expert SQL assistant for Hong Kong housing data.
@@ -8,30 +13,110 @@ You are an expert SQL assistant for Hong Kong housing data.
 - Return query in plain text, no markdown or code blocks.
 """
 
+GEO_TOOLS_SYSTEM_MESSAGE = """- Estate location tools are available. For questions about where estates are
+  (nearest, within a distance, in an area, northernmost, ...) call them first, then
+  answer with a SQL query selecting the estates they return by estate_id.
+"""
+
+# Static segments come first and the question last, so prompts over the same tables
+# share a long identical prefix that providers can serve from their prompt cache
+SQL_SCHEMA_TEMPLATE = """
+Table name: {table_name}
+Table Info: {table_info}
+Table Schema: {db_schema}
+"""
+
 SQL_USER_MESSAGE_TEMPLATE = """
 Given the following user question, generate a SQL query to answer it.
 Use the table schema information provided.
 User Question: {user_question}
-Table name: {table_name}
-Table Info: {table_info}
-Table Schema: {db_schema}
 """
 
-# TODO: Make this dynamic based on the actual table being queried
-# For now, it's hardcoded for the "estate_info" table
+SQL_EXAMPLES_TEMPLATE = """
+Solved examples of similar questions:
+{examples}
+"""
+
+SQL_EXAMPLE_TEMPLATE = """Question: {question}
+SQL: {sql}
+"""
 
 ESTATE_INFO_TABLE_INFO = """
 This table contains information about various estates in Hong Kong.
 """
 
-def create_sql_prompt(user_question: str, db_schema: str) -> LLMPromptTemplate:
-    user_message = SQL_USER_MESSAGE_TEMPLATE.format(
-        user_question=user_question,
-        table_name="estate_info",
-        table_info=ESTATE_INFO_TABLE_INFO,
-        db_schema=db_schema # TODO: precache db schema
+# Hand-written table descriptions, keyed by table name
+TABLE_INFO = {
+    "estate_info": ESTATE_INFO_TABLE_INFO,
+}
+
+def render_examples(examples: list[tuple[str, str]], token_budget: int = 400) -> str:
+    """
+    Render (question, sql) examples in the given order until the token budget is used up.
+    """
+    rendered = []
+    tokens = 0
+    for question, sql in examples:
+        example = SQL_EXAMPLE_TEMPLATE.format(question=question, sql=sql.strip())
+        example_tokens = estimate_tokens(example)
+        if tokens + example_tokens > token_budget:
+            break
+        rendered.append(example)
+        tokens += example_tokens
+    return "\n".join(rendered)
+
+def create_sql_system_message(db_schema: str,
+                              table_name: str = "estate_info",
+                              table_info: Optional[str] = None) -> str:
+    """
+    Static part of the SQL prompt: the rules, then the schema.
+    """
+    return SQL_SYSTEM_MESSAGE + SQL_SCHEMA_TEMPLATE.format(
+        table_name=table_name,
+        table_info=table_info if table_info is not None else TABLE_INFO.get(table_name, ""),
+        db_schema=db_schema
     )
+
+def create_sql_user_message(user_question: str,
+                            examples: Optional[list[tuple[str, str]]] = None,
+                            example_token_budget: int = 400) -> str:
+    """
+    Varying part of the SQL prompt: the examples, then the question.
+    """
+    rendered_examples = render_examples(examples, example_token_budget) if examples else ""
+    user_message = SQL_EXAMPLES_TEMPLATE.format(examples=rendered_examples) if rendered_examples else ""
+    return user_message + SQL_USER_MESSAGE_TEMPLATE.format(user_question=user_question)
+
+def create_sql_prompt(user_question: str, db_schema: str,
+                      table_name: str = "estate_info",
+                      table_info: Optional[str] = None,
+                      examples: Optional[list[tuple[str, str]]] = None,
+                      example_token_budget: int = 400) -> LLMPromptTemplate:
+    """
+    examples are (question, sql) pairs, most similar first, added while they fit the budget.
+    """
     return LLMPromptTemplate(
-        user_messages=user_message,
-        system_messages=SQL_SYSTEM_MESSAGE
-    )
\ No newline at end of file
+        user_messages=create_sql_user_message(user_question, examples, example_token_budget),
+        system_messages=create_sql_system_message(db_schema, table_name, table_info)
+    )
+
+def create_sql_prompt_from_catalog(user_question: str,
+                                   schema_catalog: "SchemaCatalog",
+                                   table_names: Optional[list[str]] = None,
+                                   column_names: Optional[dict[str, list[str]]] = None,
+                                   examples: Optional[list[tuple[str, str]]] = None,
+                                   example_token_budget: int = 400) -> LLMPromptTemplate:
+    """
+    Build the SQL prompt from pre-rendered catalog schemas, for one or several tables.
+    column_names optionally restricts each table to a subset of its columns.
+    The system message is rendered once per table selection and reused.
+    """
+    from .assembly import PromptAssembler
+
+    return PromptAssembler.for_catalog(schema_catalog).build(
+        user_question=user_question,
+        table_names=table_names,
+        column_names=column_names,
+        examples=examples,
+        example_token_budget=example_token_budget,
+    )
@@ -0,0 +1,10 @@
+from utils import lazy_exports
+
+_EXPORTS = {
+    "SchemaLink": ".schema_linking",
+    "SchemaLinker": ".schema_linking",
+    "FewShotExample": ".few_shot",
+    "FewShotIndex": ".few_shot",
+}
+__all__ = list(_EXPORTS)
+__getattr__, __dir__ = lazy_exports(__name__, _EXPORTS)
@@ -0,0 +1,301 @@
+import json
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+from duckdb import DuckDBPyConnection
+from pydantic import BaseModel, Field
+
+from logger import housing_logger
+
+# Byte table mapping everything but lowercase letters, digits and newlines to spaces
+ALNUM_TABLE = bytes(
+    c if chr(c).isascii() and (chr(c).isalnum() or c == 10) and not chr(c).isupper() else 32
+    for c in range(256)
+)
+DEFAULT_N_FEATURES = 2**18
+DEFAULT_NGRAM_RANGE = (3, 5)
+# Odd 64-bit constants for polynomial rolling hashes and the final mix
+HASH_BASE = np.uint64(0x100000001B3)
+HASH_MIX = np.uint64(0x9E3779B97F4A7C15)
+# Bounds on postings gathered and dense scores held per chunk of a batched lookup
+MAX_GATHER = 20_000_000
+MAX_SCORE_CELLS = 4_000_000
+# Query n-grams kept per question, the highest weighted ones
+DEFAULT_MAX_QUERY_FEATURES = 48
+
+
+class FewShotExample(BaseModel):
+    example_id: str = Field(..., description="ID of the solved question")
+    question: str = Field(..., description="Natural language question")
+    sql: str = Field(..., description="SQL answering the question")
+
+
+def _normalize(texts: list[str]) -> list[bytes]:
+    """
+    Lowercase ASCII alphanumeric words separated and padded by single spaces.
+    """
+    joined = "\n".join(text.replace("\n", " ") for text in texts).lower()
+    translated = joined.encode("ascii", "ignore").translate(ALNUM_TABLE)
+    return [b" " + b" ".join(text.split()) + b" " for text in translated.split(b"\n")]
+
+
+def _hash_ngrams(
+    texts: list[str], ngram_range: tuple[int, int], n_features: int
+) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Hashed char n-grams of every text, as parallel (row, feature) arrays.
+    All texts are hashed at once with vectorised rolling hashes instead of Python loops.
+    """
+    encoded = _normalize(texts)
+    lengths = np.array([len(text) for text in encoded], dtype=np.int64)
+    buffer = np.frombuffer(b"".join(encoded), dtype=np.uint8).astype(np.uint64)
+    row_of = np.repeat(np.arange(len(texts)), lengths)
+    offsets = np.concatenate([[0], np.cumsum(lengths)])
+    position = np.arange(len(buffer)) - np.repeat(offsets[:-1], lengths)
+    text_length = np.repeat(lengths, lengths)
+
+    rows, features = [], []
+    hashes = np.zeros(len(buffer), dtype=np.uint64)
+    for n in range(1, ngram_range[1] + 1):
+        # Extend the (n-1)-gram hashes by one character
+        count = len(buffer) - n + 1
+        if count <= 0:
+            break
+        hashes = hashes[:count] * HASH_BASE + buffer[n - 1 : n - 1 + count]
+        if n < ngram_range[0]:
+            continue
+        # Keep n-grams that lie inside a single text
+        valid = position[:count] + n <= text_length[:count]
+        mixed = hashes[valid] * HASH_MIX
+        rows.append(row_of[:count][valid])
+        features.append(((mixed >> np.uint64(32)) % np.uint64(n_features)).astype(np.int64))
+    if not rows:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    return np.concatenate(rows), np.concatenate(features)
+
+
+def _tf_matrix(
+    texts: list[str], ngram_range: tuple[int, int], n_features: int
+) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Sparse term frequencies as (row, feature, sublinear tf) triplets, unique per cell
+    and ordered by feature then row, i.e. already laid out as postings.
+    """
+    rows, features = _hash_ngrams(texts, ngram_range, n_features)
+    n_rows = max(len(texts), 1)
+    cells, counts = np.unique(features * n_rows + rows, return_counts=True)
+    return cells % n_rows, cells // n_rows, (1.0 + np.log(counts)).astype(np.float32)
+
+
+def _l2_normalize(rows: np.ndarray, values: np.ndarray, n_rows: int) -> np.ndarray:
+    norms = np.sqrt(np.bincount(rows, weights=values.astype(np.float64) ** 2, minlength=n_rows))
+    norms[norms == 0] = 1.0
+    return (values / norms[rows]).astype(np.float32)
+
+
+class FewShotIndex:
+    """
+    TF-IDF index over solved (question, SQL) examples for few-shot prompting.
+    Questions are vectorised as hashed char n-grams, so no vocabulary is stored, and
+    the matrix is kept column-major (postings per feature) as plain NumPy arrays that
+    are memory-mapped on load. A batch of questions is scored against every example in
+    one sparse product over each question's strongest n-grams, then top-k is taken per row.
+    """
+
+    def __init__(
+        self,
+        examples: list[FewShotExample],
+        idf: np.ndarray,
+        feature_ptr: np.ndarray,
+        example_ids: np.ndarray,
+        weights: np.ndarray,
+        ngram_range: tuple[int, int] = DEFAULT_NGRAM_RANGE,
+        max_query_features: int = DEFAULT_MAX_QUERY_FEATURES,
+    ):
+        self.examples = examples
+        self.idf = idf
+        self.feature_ptr = feature_ptr
+        self.example_ids = example_ids
+        self.weights = weights
+        self.ngram_range = tuple(ngram_range)
+        self.n_features = len(idf)
+        self.max_query_features = max_query_features
+
+    @classmethod
+    def build(
+        cls,
+        examples: list[FewShotExample],
+        n_features: int = DEFAULT_N_FEATURES,
+        ngram_range: tuple[int, int] = DEFAULT_NGRAM_RANGE,
+        max_df: float = 0.5,
+    ) -> "FewShotIndex":
+        """
+        max_df drops n-grams found in more than that share of examples, which barely
+        rank anything but dominate the cost of every lookup.
+        """
+        if not examples:
+            housing_logger.error("Cannot build a few-shot index without examples.")
+            raise ValueError("Cannot build a few-shot index without examples.")
+        rows, features, tf = _tf_matrix(
+            [example.question for example in examples], ngram_range, n_features
+        )
+        df = np.bincount(features, minlength=n_features)
+        idf = (np.log((1 + len(examples)) / (1 + df)) + 1).astype(np.float32)
+        idf[df > max(1, max_df * len(examples))] = 0.0
+        keep = idf[features] > 0
+        rows, features = rows[keep], features[keep]
+        weights = _l2_normalize(rows, tf[keep] * idf[features], len(examples))
+        feature_ptr = np.concatenate(
+            [[0], np.cumsum(np.bincount(features, minlength=n_features))]
+        ).astype(np.int64)
+        housing_logger.info(
+            f"Built few-shot index of {len(examples)} examples, {len(weights)} non-zeros."
+        )
+        return cls(
+            examples,
+            idf,
+            feature_ptr,
+            rows.astype(np.int32),
+            weights,
+            ngram_range,
+        )
+
+    @classmethod
+    def from_duckdb(
+        cls,
+        conn: DuckDBPyConnection,
+        table_name: str,
+        id_column: str = "question_id",
+        question_column: str = "question",
+        sql_column: str = "gold_sql",
+        **build_kwargs,
+    ) -> "FewShotIndex":
+        """
+        Build from a table or view of solved questions, e.g. the '<table>_train_data'
+        view from QueryExecutor.create_train_test_split_tables().
+        """
+        rows = conn.execute(
+            f'SELECT CAST("{id_column}" AS VARCHAR), "{question_column}", "{sql_column}" '
+            f'FROM {table_name} WHERE "{sql_column}" IS NOT NULL'
+        ).fetchall()
+        examples = [
+            FewShotExample(example_id=example_id, question=question, sql=sql)
+            for example_id, question, sql in rows
+        ]
+        return cls.build(examples, **build_kwargs)
+
+    def save(self, index_dir: str) -> None:
+        path = Path(index_dir)
+        path.mkdir(parents=True, exist_ok=True)
+        np.save(path / "idf.npy", self.idf)
+        np.save(path / "feature_ptr.npy", self.feature_ptr)
+        np.save(path / "example_ids.npy", self.example_ids)
+        np.save(path / "weights.npy", self.weights)
+        with open(path / "examples.jsonl", "w", encoding="utf-8") as f:
+            for example in self.examples:
+                f.write(example.model_dump_json() + "\n")
+        with open(path / "meta.json", "w", encoding="utf-8") as f:
+            json.dump({"ngram_range": list(self.ngram_range), "examples": len(self.examples)}, f)
+        housing_logger.info(f"Saved few-shot index to {path}.")
+
+    @classmethod
+    def load(cls, index_dir: str) -> "FewShotIndex":
+        """
+        Load an index saved with save(), memory-mapping the matrix arrays.
+        """
+        path = Path(index_dir)
+        with open(path / "meta.json", "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        with open(path / "examples.jsonl", "r", encoding="utf-8") as f:
+            examples = [FewShotExample.model_validate_json(line) for line in f if line.strip()]
+        return cls(
+            examples,
+            np.load(path / "idf.npy", mmap_mode="r"),
+            np.load(path / "feature_ptr.npy", mmap_mode="r"),
+            np.load(path / "example_ids.npy", mmap_mode="r"),
+            np.load(path / "weights.npy", mmap_mode="r"),
+            tuple(meta["ngram_range"]),
+        )
+
+    def _query_vectors(self, questions: list[str]) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        rows, features, tf = _tf_matrix(questions, self.ngram_range, self.n_features)
+        values = tf * self.idf[features]
+        keep = values > 0
+        rows, features, values = rows[keep], features[keep], values[keep]
+        values = _l2_normalize(rows, values, len(questions))
+        # Query term pruning: low weight n-grams have the longest postings and
+        # barely move the ranking, so only the top ones per question are scored
+        order = np.lexsort((-values, rows))
+        rows, features, values = rows[order], features[order], values[order]
+        row_starts = np.searchsorted(rows, rows, side="left")
+        keep = np.arange(len(rows)) - row_starts < self.max_query_features
+        return rows[keep], features[keep], values[keep]
+
+    def _scores(self, rows: np.ndarray, features: np.ndarray, values: np.ndarray, n_rows: int) -> np.ndarray:
+        """
+        Dense (n_rows, examples) cosine similarities from the sparse query rows.
+        """
+        n_examples = len(self.examples)
+        starts = self.feature_ptr[features]
+        lengths = self.feature_ptr[features + 1] - starts
+        total = int(lengths.sum())
+        if total == 0:
+            return np.zeros((n_rows, n_examples), dtype=np.float32)
+        # Flat positions of every posting touched by a query non-zero
+        offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+        positions = offsets + np.arange(total)
+        cells = np.repeat(rows, lengths) * n_examples + self.example_ids[positions]
+        products = np.repeat(values, lengths) * self.weights[positions]
+        # float64 bincount is faster than np.add.at, scores are cast back to float32
+        scores = np.bincount(cells, weights=products, minlength=n_rows * n_examples)
+        return scores.astype(np.float32).reshape(n_rows, n_examples)
+
+    def search_batch(
+        self, questions: list[str], k: int = 3, exclude_ids: Optional[list[str]] = None
+    ) -> list[list[tuple[FewShotExample, float]]]:
+        """
+        Top-k examples with cosine scores for every question.
+        exclude_ids[i] drops that example from question i's results, to avoid leaking
+        an evaluation question into its own prompt.
+        """
+        if not questions:
+            return []
+        k = min(k, len(self.examples))
+        rows, features, values = self._query_vectors(questions)
+        # Split the batch so gathered postings and dense scores stay bounded
+        postings = (self.feature_ptr[features + 1] - self.feature_ptr[features]).astype(np.int64)
+        per_question = np.bincount(rows, weights=postings, minlength=len(questions))
+        max_rows = max(1, MAX_SCORE_CELLS // len(self.examples))
+        results = []
+        start = 0
+        while start < len(questions):
+            end = start + 1
+            budget = per_question[start]
+            while (
+                end < len(questions)
+                and end - start < max_rows
+                and budget + per_question[end] <= MAX_GATHER
+            ):
+                budget += per_question[end]
+                end += 1
+            mask = (rows >= start) & (rows < end)
+            scores = self._scores(rows[mask] - start, features[mask], values[mask], end - start)
+            # One extra candidate, in case the excluded example ranks first
+            top_k = min(k + 1, len(self.examples))
+            top = np.argpartition(-scores, top_k - 1, axis=1)[:, :top_k]
+            for i in range(end - start):
+                ranked = top[i][np.argsort(-scores[i, top[i]])]
+                excluded = exclude_ids[start + i] if exclude_ids else None
+                results.append(
+                    [
+                        (self.examples[j], float(scores[i, j]))
+                        for j in ranked
+                        if scores[i, j] > 0 and self.examples[j].example_id != excluded
+                    ][:k]
+                )
+            start = end
+        return results
+
+    def search(self, question: str, k: int = 3) -> list[tuple[FewShotExample, float]]:
+        return self.search_batch([question], k)[0]
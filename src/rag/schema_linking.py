@@ -0,0 +1,208 @@
+import math
+import re
+from collections import Counter
+from typing import Optional
+
+from pydantic import BaseModel, Field
+
+from db import SchemaCatalog
+from logger import housing_logger
+from utils import estimate_tokens
+
+TOKEN_PATTERN = re.compile(r"[a-z]+|\d+")
+CAMEL_CASE_PATTERN = re.compile(r"(?<=[a-z])(?=[A-Z])")
+
+# Question words that point at columns without sharing a token with them
+COLUMN_HINTS = {
+    "north": ["latitude", "lat"],
+    "northernmost": ["latitude", "lat"],
+    "south": ["latitude", "lat"],
+    "southernmost": ["latitude", "lat"],
+    "east": ["longitude", "lng", "lon"],
+    "easternmost": ["longitude", "lng", "lon"],
+    "west": ["longitude", "lng", "lon"],
+    "westernmost": ["longitude", "lng", "lon"],
+    "where": ["district", "region", "address"],
+    "location": ["latitude", "longitude", "district", "address"],
+    "expensive": ["price"],
+    "cheapest": ["price"],
+    "cost": ["price"],
+    "biggest": ["area", "size", "units"],
+    "largest": ["area", "size", "units"],
+    "old": ["year", "date"],
+    "oldest": ["year", "date"],
+    "newest": ["year", "date"],
+    "recent": ["date", "year"],
+}
+
+
+def tokenize(text: str) -> list[str]:
+    """
+    Lowercase word tokens, splitting snake_case and camelCase and dropping plural 's'.
+    """
+    text = CAMEL_CASE_PATTERN.sub(" ", text).replace("_", " ").lower()
+    tokens = []
+    for token in TOKEN_PATTERN.findall(text):
+        if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+class SchemaLink(BaseModel):
+    question: str = Field(..., description="Question the schema was linked for")
+    column_names: dict[str, list[str]] = Field(
+        default_factory=dict, description="Selected columns per table"
+    )
+    column_scores: dict[str, float] = Field(
+        default_factory=dict, description="BM25 score per 'table.column'"
+    )
+    full_schema_tokens: int = Field(0, description="Estimated tokens of the full schema")
+    pruned_schema_tokens: int = Field(0, description="Estimated tokens after pruning")
+
+    @property
+    def table_names(self) -> list[str]:
+        return list(self.column_names.keys())
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.full_schema_tokens - self.pruned_schema_tokens
+
+
+class SchemaLinker:
+    """
+    Rank tables and columns against a question with BM25 over column names, types
+    and sample values, so prompts only carry the relevant part of the schema.
+    """
+
+    def __init__(
+        self,
+        schema_catalog: SchemaCatalog,
+        top_k_columns: int = 8,
+        top_k_tables: int = 1,
+        always_include: Optional[list[str]] = None,
+        k1: float = 1.2,
+        b: float = 0.75,
+    ):
+        self.schema_catalog = schema_catalog
+        self.top_k_columns = top_k_columns
+        self.top_k_tables = top_k_tables
+        # Columns kept whenever their table is selected, e.g. name/id keys
+        self.always_include = set(always_include or [])
+        self.k1 = k1
+        self.b = b
+        self._build_index()
+
+    def _build_index(self) -> None:
+        self.documents: list[tuple[str, str]] = []
+        self.term_frequencies: list[Counter] = []
+        for table_name in self.schema_catalog.get_table_names():
+            table = self.schema_catalog.get_table(table_name)
+            table_tokens = tokenize(table_name)
+            for column in table.columns:
+                tokens = tokenize(column.name) * 2 + table_tokens + tokenize(column.type)
+                for value in column.sample_values:
+                    tokens += tokenize(value)
+                self.documents.append((table_name, column.name))
+                self.term_frequencies.append(Counter(tokens))
+
+        document_count = len(self.documents)
+        self.average_length = (
+            sum(sum(tf.values()) for tf in self.term_frequencies) / document_count
+            if document_count
+            else 0.0
+        )
+        document_frequency = Counter()
+        for tf in self.term_frequencies:
+            document_frequency.update(tf.keys())
+        self.idf = {
+            term: math.log(1 + (document_count - count + 0.5) / (count + 0.5))
+            for term, count in document_frequency.items()
+        }
+        housing_logger.info(f"Indexed {document_count} columns for schema linking.")
+
+    def _query_tokens(self, question: str) -> list[str]:
+        tokens = tokenize(question)
+        expanded = list(tokens)
+        for token in tokens:
+            expanded += COLUMN_HINTS.get(token, [])
+        return expanded
+
+    def score_columns(self, question: str) -> dict[tuple[str, str], float]:
+        query_tokens = self._query_tokens(question)
+        scores = {}
+        for document, tf in zip(self.documents, self.term_frequencies):
+            length = sum(tf.values())
+            score = 0.0
+            for token in query_tokens:
+                frequency = tf.get(token, 0)
+                if not frequency:
+                    continue
+                score += self.idf[token] * (
+                    frequency * (self.k1 + 1)
+                    / (frequency + self.k1 * (1 - self.b + self.b * length / self.average_length))
+                )
+            scores[document] = score
+        return scores
+
+    def link(self, question: str, default_table: str = "estate_info") -> SchemaLink:
+        scores = self.score_columns(question)
+
+        table_scores = Counter()
+        for (table_name, _), score in scores.items():
+            table_scores[table_name] += score
+        table_names = [
+            table_name
+            for table_name, score in table_scores.most_common(self.top_k_tables)
+            if score > 0
+        ]
+        if not table_names:
+            # Nothing matched, fall back to the full schema of the default table
+            table_names = [default_table]
+            column_names = {
+                default_table: [
+                    column.name
+                    for column in self.schema_catalog.get_table(default_table).columns
+                ]
+            }
+        else:
+            ranked = sorted(
+                (
+                    (score, table_name, column_name)
+                    for (table_name, column_name), score in scores.items()
+                    if table_name in table_names and score > 0
+                ),
+                reverse=True,
+            )[: self.top_k_columns]
+            selected = {(table_name, column_name) for _, table_name, column_name in ranked}
+            column_names = {}
+            for table_name in table_names:
+                # Keep catalog column order so the rendered schema stays stable
+                column_names[table_name] = [
+                    column.name
+                    for column in self.schema_catalog.get_table(table_name).columns
+                    if (table_name, column.name) in selected
+                    or column.name in self.always_include
+                ]
+
+        full_schema_tokens = sum(
+            estimate_tokens(self.schema_catalog.get_schema_str(table_name))
+            for table_name in table_names
+        )
+        pruned_schema_tokens = sum(
+            estimate_tokens(
+                self.schema_catalog.get_schema_str(table_name, column_names=columns)
+            )
+            for table_name, columns in column_names.items()
+        )
+        return SchemaLink(
+            question=question,
+            column_names=column_names,
+            column_scores={
+                f"{table_name}.{column_name}": score
+                for (table_name, column_name), score in scores.items()
+                if score > 0
+            },
+            full_schema_tokens=full_schema_tokens,
+            pruned_schema_tokens=pruned_schema_tokens,
+        )
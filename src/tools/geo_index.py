@@ -0,0 +1,320 @@
+import math
+import os
+import threading
+from typing import Literal, Optional
+
+import numpy as np
+from pydantic import BaseModel, Field
+
+from db import DuckDBPool, get_db_fingerprint, get_duckdb_file_path
+from logger import housing_logger
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+# Average estates per grid cell, small enough that a query scans few non-matches
+POINTS_PER_CELL = 8
+INDEX_VERSION = 1
+
+Direction = Literal["north", "south", "east", "west"]
+
+
+class EstateLocation(BaseModel):
+    estate_id: str = Field(..., description="ID of the estate, as text")
+    estate_name: str = Field(..., description="Name of the estate")
+    district: Optional[str] = Field(None, description="District of the estate")
+    latitude: float = Field(..., description="Latitude in degrees")
+    longitude: float = Field(..., description="Longitude in degrees")
+    distance_km: Optional[float] = Field(None, description="Distance from the query point")
+
+
+def haversine_km(lat: float, lon: float, lats: np.ndarray, lons: np.ndarray) -> np.ndarray:
+    """
+    Great-circle distances in km from one point to arrays of points.
+    """
+    lat1, lon1 = math.radians(lat), math.radians(lon)
+    lat2, lon2 = np.radians(lats), np.radians(lons)
+    a = (
+        np.sin((lat2 - lat1) / 2) ** 2
+        + math.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+class EstateGeoIndex:
+    """
+    In-memory uniform grid over estate coordinates, for nearest, radius, bounding box
+    and extreme-direction queries without scanning the table. Estates are sorted by
+    grid cell, so each grid row of a query window is one contiguous slice.
+    Saved next to the DuckDB file with the database fingerprint, and rebuilt only
+    when the fingerprint changes.
+    """
+
+    _indexes: dict[tuple[str, str], "EstateGeoIndex"] = {}
+    _indexes_lock = threading.Lock()
+
+    def __init__(
+        self,
+        ids: np.ndarray,
+        names: np.ndarray,
+        districts: np.ndarray,
+        lats: np.ndarray,
+        lons: np.ndarray,
+        db_fingerprint: str = "",
+    ):
+        if len(lats) == 0:
+            housing_logger.error("Cannot build a geo index without estates.")
+            raise ValueError("Cannot build a geo index without estates.")
+        self.db_fingerprint = db_fingerprint
+        self.min_lat, self.max_lat = float(lats.min()), float(lats.max())
+        self.min_lon, self.max_lon = float(lons.min()), float(lons.max())
+        # Cells roughly square in km, at the latitude furthest from the equator
+        self.lon_scale = max(math.cos(math.radians(max(abs(self.min_lat), abs(self.max_lat)))), 1e-6)
+        height = max(self.max_lat - self.min_lat, 1e-9)
+        width = max((self.max_lon - self.min_lon) * self.lon_scale, 1e-9)
+        cell_size = math.sqrt(height * width * POINTS_PER_CELL / len(lats))
+        self.rows = max(1, min(4096, math.ceil(height / cell_size)))
+        self.cols = max(1, min(4096, math.ceil(width / cell_size)))
+        self.cell_lat = height / self.rows
+        self.cell_lon = (self.max_lon - self.min_lon or 1e-9) / self.cols
+
+        cells = self._cell_rows(lats) * self.cols + self._cell_cols(lons)
+        order = np.argsort(cells, kind="stable")
+        self.ids = ids[order]
+        self.names = names[order]
+        self.lats = lats[order].astype(np.float64)
+        self.lons = lons[order].astype(np.float64)
+        self.district_names, self.district_codes = np.unique(districts[order], return_inverse=True)
+        self.cell_starts = np.searchsorted(cells[order], np.arange(self.rows * self.cols + 1))
+        self.by_lat = np.argsort(self.lats, kind="stable")
+        self.by_lon = np.argsort(self.lons, kind="stable")
+        # Same orders grouped by district, each district one slice
+        self.district_by_lat = self.by_lat[np.argsort(self.district_codes[self.by_lat], kind="stable")]
+        self.district_by_lon = self.by_lon[np.argsort(self.district_codes[self.by_lon], kind="stable")]
+        self.district_starts = np.searchsorted(
+            self.district_codes[self.district_by_lat], np.arange(len(self.district_names) + 1)
+        )
+        self._name_lookup = {str(name).lower(): i for i, name in enumerate(self.names)}
+        self._file_signature: Optional[tuple[int, int]] = None
+
+    def __len__(self) -> int:
+        return len(self.lats)
+
+    def _cell_rows(self, lats: np.ndarray) -> np.ndarray:
+        return np.clip(((lats - self.min_lat) / self.cell_lat).astype(np.int64), 0, self.rows - 1)
+
+    def _cell_cols(self, lons: np.ndarray) -> np.ndarray:
+        return np.clip(((lons - self.min_lon) / self.cell_lon).astype(np.int64), 0, self.cols - 1)
+
+    def _window(self, min_lat: float, min_lon: float, max_lat: float, max_lon: float) -> np.ndarray:
+        """
+        Positions of every estate in the grid cells overlapping the box, a superset of the box.
+        """
+        if max_lat < self.min_lat or min_lat > self.max_lat or max_lon < self.min_lon or min_lon > self.max_lon:
+            return np.empty(0, dtype=np.int64)
+        row_start, row_end = self._cell_rows(np.array([min_lat, max_lat]))
+        col_start, col_end = self._cell_cols(np.array([min_lon, max_lon]))
+        slices = [
+            np.arange(
+                self.cell_starts[row * self.cols + col_start],
+                self.cell_starts[row * self.cols + col_end + 1],
+            )
+            for row in range(row_start, row_end + 1)
+        ]
+        return np.concatenate(slices)
+
+    def _radius_window(self, lat: float, lon: float, radius_km: float) -> np.ndarray:
+        dlat = radius_km / KM_PER_DEGREE
+        dlon = radius_km / (KM_PER_DEGREE * max(math.cos(math.radians(min(abs(lat) + dlat, 89.9))), 1e-6))
+        return self._window(lat - dlat, lon - dlon, lat + dlat, lon + dlon)
+
+    def within_radius(
+        self, lat: float, lon: float, radius_km: float, limit: Optional[int] = None
+    ) -> tuple[np.ndarray, np.ndarray]:
+        """
+        (positions, distances) of estates within radius_km of the point, nearest first.
+        """
+        candidates = self._radius_window(lat, lon, radius_km)
+        distances = haversine_km(lat, lon, self.lats[candidates], self.lons[candidates])
+        inside = distances <= radius_km
+        candidates, distances = candidates[inside], distances[inside]
+        order = np.argsort(distances, kind="stable")[:limit]
+        return candidates[order], distances[order]
+
+    def nearest(self, lat: float, lon: float, n: int = 5) -> tuple[np.ndarray, np.ndarray]:
+        """
+        (positions, distances) of the n estates nearest the point, nearest first.
+        Searches a radius sized for n estates at average density and doubles it until
+        n estates fall inside, since then no estate outside can be nearer.
+        """
+        n = min(n, len(self))
+        if n <= 0:
+            return np.empty(0, dtype=np.int64), np.empty(0)
+        area_km2 = (self.rows * self.cell_lat * KM_PER_DEGREE) * (self.cols * self.cell_lon * KM_PER_DEGREE * self.lon_scale)
+        radius_km = max(math.sqrt(area_km2 * n / (len(self) * math.pi)), 1e-3)
+        span_km = KM_PER_DEGREE * (
+            abs(lat - self.min_lat) + abs(lat - self.max_lat) + abs(lon - self.min_lon) + abs(lon - self.max_lon)
+        )
+        while True:
+            positions, distances = self.within_radius(lat, lon, radius_km, limit=n)
+            if len(positions) >= n or radius_km > span_km:
+                return positions, distances
+            radius_km *= 2
+
+    def in_bounding_box(
+        self, min_lat: float, min_lon: float, max_lat: float, max_lon: float, limit: Optional[int] = None
+    ) -> np.ndarray:
+        """
+        Positions of estates inside the box, north to south.
+        """
+        candidates = self._window(min_lat, min_lon, max_lat, max_lon)
+        lats, lons = self.lats[candidates], self.lons[candidates]
+        candidates = candidates[(lats >= min_lat) & (lats <= max_lat) & (lons >= min_lon) & (lons <= max_lon)]
+        order = np.argsort(-self.lats[candidates], kind="stable")[:limit]
+        return candidates[order]
+
+    def extreme(self, direction: Direction, n: int = 3, district: Optional[str] = None) -> np.ndarray:
+        """
+        Positions of the n northernmost, southernmost, easternmost or westernmost estates,
+        optionally within one district.
+        """
+        if direction not in ("north", "south", "east", "west"):
+            housing_logger.error(f"Unknown direction '{direction}'.")
+            raise ValueError(f"Unknown direction '{direction}'.")
+        order = self.by_lat if direction in ("north", "south") else self.by_lon
+        if district is not None:
+            code = self.district_code(district)
+            if code is None:
+                return np.empty(0, dtype=np.int64)
+            order = self.district_by_lat if direction in ("north", "south") else self.district_by_lon
+            order = order[self.district_starts[code] : self.district_starts[code + 1]]
+        if direction in ("north", "east"):
+            order = order[::-1]
+        return order[:n]
+
+    def district_code(self, district: str) -> Optional[int]:
+        matches = np.flatnonzero(np.char.lower(self.district_names.astype(str)) == district.lower())
+        return int(matches[0]) if len(matches) else None
+
+    def find_estate(self, name: str) -> Optional[int]:
+        """
+        Position of the estate with this name, ignoring case.
+        """
+        return self._name_lookup.get(name.strip().lower())
+
+    def locations(self, positions: np.ndarray, distances: Optional[np.ndarray] = None) -> list[EstateLocation]:
+        return [
+            EstateLocation(
+                estate_id=str(self.ids[position]),
+                estate_name=str(self.names[position]),
+                district=str(self.district_names[self.district_codes[position]]) or None,
+                latitude=float(self.lats[position]),
+                longitude=float(self.lons[position]),
+                distance_km=float(distances[i]) if distances is not None else None,
+            )
+            for i, position in enumerate(positions)
+        ]
+
+    def save(self, path: str) -> None:
+        # Write then rename, so a concurrent reader never loads a partial file
+        temp_path = f"{path}.{os.getpid()}.tmp.npz"
+        np.savez(
+            temp_path,
+            version=INDEX_VERSION,
+            db_fingerprint=self.db_fingerprint,
+            ids=self.ids,
+            names=self.names,
+            districts=self.district_names[self.district_codes],
+            lats=self.lats,
+            lons=self.lons,
+        )
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "EstateGeoIndex":
+        with np.load(path, allow_pickle=False) as data:
+            if int(data["version"]) != INDEX_VERSION:
+                raise ValueError(f"Geo index {path} has version {int(data['version'])}.")
+            return cls(
+                data["ids"],
+                data["names"],
+                data["districts"],
+                data["lats"],
+                data["lons"],
+                db_fingerprint=str(data["db_fingerprint"]),
+            )
+
+    @classmethod
+    def from_duckdb(cls, db_path: Optional[str] = None, table_name: str = "estate_info") -> "EstateGeoIndex":
+        """
+        Build the index from the latitude/longitude columns of table_name.
+        """
+        db_path = get_duckdb_file_path(db_path)
+        fingerprint = get_db_fingerprint(db_path)
+        # DuckDB opens the file once per process, so read it through the shared pool
+        with DuckDBPool.get_pool(db_path).cursor() as conn:
+            columns = conn.execute(
+                f"""
+                SELECT CAST(estate_id AS VARCHAR) AS ids,
+                    CAST(estate_name AS VARCHAR) AS names,
+                    COALESCE(CAST(district AS VARCHAR), '') AS districts,
+                    CAST(latitude AS DOUBLE) AS lats,
+                    CAST(longitude AS DOUBLE) AS lons
+                FROM {table_name}
+                WHERE latitude IS NOT NULL AND longitude IS NOT NULL
+                """
+            ).fetchnumpy()
+        # Fixed-width strings, so the index saves without pickling
+        return cls(
+            np.asarray(columns["ids"], dtype=str),
+            np.asarray(columns["names"], dtype=str),
+            np.asarray(columns["districts"], dtype=str),
+            np.asarray(columns["lats"], dtype=np.float64),
+            np.asarray(columns["lons"], dtype=np.float64),
+            db_fingerprint=fingerprint,
+        )
+
+    @staticmethod
+    def index_path(db_path: str, table_name: str = "estate_info") -> str:
+        return f"{db_path}.{table_name}.geo.npz"
+
+    @classmethod
+    def load_or_build(cls, db_path: Optional[str] = None, table_name: str = "estate_info") -> "EstateGeoIndex":
+        """
+        Saved index of the database, rebuilt and saved again if the database changed.
+        """
+        db_path = get_duckdb_file_path(db_path)
+        path = cls.index_path(db_path, table_name)
+        fingerprint = get_db_fingerprint(db_path)
+        if os.path.exists(path):
+            try:
+                index = cls.load(path)
+                if index.db_fingerprint == fingerprint:
+                    return index
+                housing_logger.info(f"Database changed since the geo index was saved, rebuilding {path}.")
+            except Exception as e:
+                housing_logger.warning(f"Rebuilding unreadable geo index {path}: {e}")
+        index = cls.from_duckdb(db_path, table_name)
+        try:
+            index.save(path)
+        except OSError as e:
+            housing_logger.warning(f"Could not save geo index next to the database: {e}")
+        housing_logger.info(f"Built geo index of {len(index)} estates at {path}.")
+        return index
+
+    @classmethod
+    def get(cls, db_path: Optional[str] = None, table_name: str = "estate_info") -> "EstateGeoIndex":
+        """
+        Process-wide index of the database. A stat of the file on each call tells whether
+        the crawler replaced it, so queries never rehash the file.
+        """
+        db_path = get_duckdb_file_path(db_path)
+        stat = os.stat(db_path)
+        signature = (stat.st_size, stat.st_mtime_ns)
+        key = (db_path, table_name)
+        with cls._indexes_lock:
+            index = cls._indexes.get(key)
+            if index is None or index._file_signature != signature:
+                index = cls.load_or_build(db_path, table_name)
+                index._file_signature = signature
+                cls._indexes[key] = index
+        return index
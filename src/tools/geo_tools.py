@@ -0,0 +1,218 @@
+from typing import Callable, List, Optional
+
+from langchain_core.callbacks import CallbackManagerForToolRun
+from langchain_core.tools import BaseTool
+from pydantic import BaseModel, ConfigDict, Field
+
+from logger import housing_logger
+from .geo_index import Direction, EstateGeoIndex, EstateLocation
+
+MAX_RESULTS = 50
+
+
+def render_locations(locations: list[EstateLocation]) -> str:
+    """
+    Markdown table of estates, compact enough to feed back to the model.
+    """
+    if not locations:
+        return "No estates found."
+    with_distance = locations[0].distance_km is not None
+    header = "| estate_id | estate_name | district | latitude | longitude |"
+    header += " distance_km |" if with_distance else ""
+    lines = [header, "|" + "---|" * (6 if with_distance else 5)]
+    for location in locations:
+        line = (
+            f"| {location.estate_id} | {location.estate_name} | {location.district or ''} "
+            f"| {location.latitude:.6f} | {location.longitude:.6f} |"
+        )
+        if with_distance:
+            line += f" {location.distance_km:.3f} |"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+class PointInput(BaseModel):
+    estate_name: Optional[str] = Field(None, description="Estate to search around, instead of coordinates")
+    latitude: Optional[float] = Field(None, description="Latitude of the point to search around")
+    longitude: Optional[float] = Field(None, description="Longitude of the point to search around")
+
+
+class NearestInput(PointInput):
+    n: int = Field(5, description="Number of estates to return")
+
+
+class RadiusInput(PointInput):
+    radius_km: float = Field(..., description="Search radius in kilometres")
+    limit: int = Field(20, description="Maximum estates to return, nearest first")
+
+
+class BoundingBoxInput(BaseModel):
+    min_latitude: float = Field(..., description="Southern edge")
+    min_longitude: float = Field(..., description="Western edge")
+    max_latitude: float = Field(..., description="Northern edge")
+    max_longitude: float = Field(..., description="Eastern edge")
+    limit: int = Field(20, description="Maximum estates to return, north to south")
+
+
+class ExtremeInput(BaseModel):
+    direction: Direction = Field(..., description="north, south, east or west")
+    n: int = Field(3, description="Number of estates to return")
+    district: Optional[str] = Field(None, description="Only consider estates in this district")
+
+
+class GeoIndexTool(BaseTool):
+    """
+    Base of the estate location tools. The index is fetched on every call, so a
+    rebuilt database is picked up without recreating the agent.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    get_index: Callable[[], EstateGeoIndex] = Field(exclude=True)
+
+    def _point(
+        self,
+        index: EstateGeoIndex,
+        estate_name: Optional[str],
+        latitude: Optional[float],
+        longitude: Optional[float],
+    ) -> tuple[float, float, Optional[int]]:
+        if estate_name:
+            position = index.find_estate(estate_name)
+            if position is None:
+                raise ValueError(f"No estate named '{estate_name}'.")
+            return float(index.lats[position]), float(index.lons[position]), position
+        if latitude is None or longitude is None:
+            raise ValueError("Give an estate_name, or both latitude and longitude.")
+        return latitude, longitude, None
+
+    def _safe_run(self, run: Callable[[EstateGeoIndex], list[EstateLocation]]) -> str:
+        try:
+            return render_locations(run(self.get_index()))
+        except Exception as e:
+            housing_logger.warning(f"Geo tool {self.name} failed: {e}")
+            # Same error format as the SQL tools, the agent prompt relies on it
+            return f"Error: {e}"
+
+
+class NearestEstatesTool(GeoIndexTool):
+    name: str = "estate_nearest"
+    description: str = (
+        "Find the estates nearest to a named estate or to a latitude/longitude. "
+        "Returns estate_id, name, district, coordinates and distance in km."
+    )
+    args_schema: type[BaseModel] = NearestInput
+
+    def _run(
+        self,
+        estate_name: Optional[str] = None,
+        latitude: Optional[float] = None,
+        longitude: Optional[float] = None,
+        n: int = 5,
+        run_manager: Optional[CallbackManagerForToolRun] = None,
+    ) -> str:
+        def run(index: EstateGeoIndex) -> list[EstateLocation]:
+            lat, lon, position = self._point(index, estate_name, latitude, longitude)
+            count = min(n, MAX_RESULTS)
+            # The anchor estate is its own nearest neighbour, skip it
+            positions, distances = index.nearest(lat, lon, count + (position is not None))
+            keep = positions != position
+            return index.locations(positions[keep][:count], distances[keep][:count])
+
+        return self._safe_run(run)
+
+
+class EstatesWithinRadiusTool(GeoIndexTool):
+    name: str = "estate_within_radius"
+    description: str = (
+        "Find estates within radius_km kilometres of a named estate or a latitude/longitude, "
+        "nearest first."
+    )
+    args_schema: type[BaseModel] = RadiusInput
+
+    def _run(
+        self,
+        radius_km: float,
+        estate_name: Optional[str] = None,
+        latitude: Optional[float] = None,
+        longitude: Optional[float] = None,
+        limit: int = 20,
+        run_manager: Optional[CallbackManagerForToolRun] = None,
+    ) -> str:
+        def run(index: EstateGeoIndex) -> list[EstateLocation]:
+            lat, lon, position = self._point(index, estate_name, latitude, longitude)
+            positions, distances = index.within_radius(lat, lon, radius_km)
+            keep = positions != position
+            count = min(limit, MAX_RESULTS)
+            return index.locations(positions[keep][:count], distances[keep][:count])
+
+        return self._safe_run(run)
+
+
+class EstatesInBoundingBoxTool(GeoIndexTool):
+    name: str = "estate_in_bounding_box"
+    description: str = "Find estates inside a latitude/longitude bounding box, north to south."
+    args_schema: type[BaseModel] = BoundingBoxInput
+
+    def _run(
+        self,
+        min_latitude: float,
+        min_longitude: float,
+        max_latitude: float,
+        max_longitude: float,
+        limit: int = 20,
+        run_manager: Optional[CallbackManagerForToolRun] = None,
+    ) -> str:
+        def run(index: EstateGeoIndex) -> list[EstateLocation]:
+            positions = index.in_bounding_box(
+                min(min_latitude, max_latitude),
+                min(min_longitude, max_longitude),
+                max(min_latitude, max_latitude),
+                max(min_longitude, max_longitude),
+                limit=min(limit, MAX_RESULTS),
+            )
+            return index.locations(positions)
+
+        return self._safe_run(run)
+
+
+class ExtremeEstatesTool(GeoIndexTool):
+    name: str = "estate_extreme"
+    description: str = (
+        "Find the northernmost, southernmost, easternmost or westernmost estates, "
+        "in Hong Kong or in one district."
+    )
+    args_schema: type[BaseModel] = ExtremeInput
+
+    def _run(
+        self,
+        direction: Direction,
+        n: int = 3,
+        district: Optional[str] = None,
+        run_manager: Optional[CallbackManagerForToolRun] = None,
+    ) -> str:
+        def run(index: EstateGeoIndex) -> list[EstateLocation]:
+            return index.locations(index.extreme(direction, min(n, MAX_RESULTS), district))
+
+        return self._safe_run(run)
+
+
+def get_geo_tools(db_path: Optional[str] = None, table_name: str = "estate_info") -> List[BaseTool]:
+    """
+    Estate location tools over the geo index of the DuckDB file, the configured one by default.
+    The index is loaded or built here, so a missing table fails at agent setup.
+    """
+    EstateGeoIndex.get(db_path, table_name)
+
+    def get_index() -> EstateGeoIndex:
+        return EstateGeoIndex.get(db_path, table_name)
+
+    return [
+        tool_class(get_index=get_index)
+        for tool_class in (
+            NearestEstatesTool,
+            EstatesWithinRadiusTool,
+            EstatesInBoundingBoxTool,
+            ExtremeEstatesTool,
+        )
+    ]
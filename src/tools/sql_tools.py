@@ -0,0 +1,82 @@
+from typing import List, Optional
+
+from langchain_community.agent_toolkits import SQLDatabaseToolkit
+from langchain_community.tools.sql_database.tool import QuerySQLDatabaseTool
+from langchain_core.callbacks import CallbackManagerForToolRun
+from langchain_core.tools import BaseTool
+from pydantic import ConfigDict, Field
+
+from db import ResultSummarizer
+from logger import housing_logger
+
+# The stock description points at the schema and checker tools
+SCHEMA_IN_PROMPT_QUERY_DESCRIPTION = (
+    "Input to this tool is a detailed and correct SQL query, output is a result from the "
+    "database. If the query is not correct, an error message will be returned. If an error "
+    "is returned, rewrite the query using the schema you were given and try again."
+)
+
+
+class SummarizedQuerySQLDatabaseTool(QuerySQLDatabaseTool):
+    """
+    sql_db_query that answers with a bounded markdown summary instead of the raw result,
+    so the context fed back on every agent turn does not grow with the result size.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    summarizer: ResultSummarizer = Field(exclude=True)
+
+    def _run(
+        self,
+        query: str,
+        run_manager: Optional[CallbackManagerForToolRun] = None,
+    ) -> str:
+        try:
+            summary = self.summarizer.summarize_engine(self.db._engine, query)
+        except Exception as e:
+            housing_logger.warning(f"Agent query failed: {e}")
+            # Same error format as SQLDatabase.run_no_throw, the agent prompt relies on it
+            return f"Error: {e}"
+        return self.summarizer.render(summary)
+
+
+class AgentSQLDatabaseToolkit(SQLDatabaseToolkit):
+    """
+    SQLDatabaseToolkit for agents that may have the schema in their prompt. Then only
+    sql_db_query is offered, since listing tables, fetching schemas and checking
+    queries with another model call would only cost turns.
+    """
+
+    schema_in_prompt: bool = Field(False, description="Whether the agent prompt holds the table info")
+
+    def get_tools(self) -> List[BaseTool]:
+        tools = super().get_tools()
+        if not self.schema_in_prompt:
+            return tools
+        return [
+            QuerySQLDatabaseTool(db=self.db, description=SCHEMA_IN_PROMPT_QUERY_DESCRIPTION)
+            for tool in tools
+            if isinstance(tool, QuerySQLDatabaseTool)
+        ]
+
+
+class SummarizingSQLDatabaseToolkit(AgentSQLDatabaseToolkit):
+    """
+    SQLDatabaseToolkit whose query tool returns result summaries.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    summarizer: ResultSummarizer = Field(exclude=True)
+
+    def get_tools(self) -> List[BaseTool]:
+        tools = super().get_tools()
+        return [
+            SummarizedQuerySQLDatabaseTool(
+                db=self.db, description=tool.description, summarizer=self.summarizer
+            )
+            if isinstance(tool, QuerySQLDatabaseTool)
+            else tool
+            for tool in tools
+        ]
@@ -1,6 +1,10 @@
 from logger import housing_logger
+import importlib
 import time
 
+# Rough chars-per-token ratio of OpenAI style BPE tokenizers on English text
+CHARS_PER_TOKEN = 4
+
 
 def timer(function: callable) -> callable:
     """
@@ -8,9 +12,9 @@ def timer(function: callable) -> callable:
     """
 
     def wrapper(*args, **kwargs):
-        start_time = time.time()
+        start_time = time.perf_counter()
         result = function(*args, **kwargs)
-        end_time = time.time()
+        end_time = time.perf_counter()
         elapsed_time = end_time - start_time
         housing_logger.info(
             f"Function '{function.__name__}' executed in {elapsed_time:.4f} seconds"
@@ -18,3 +22,30 @@ def timer(function: callable) -> callable:
         return result
 
     return wrapper
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Approximate token count without loading a tokenizer.
+    """
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def lazy_exports(package: str, exports: dict[str, str]) -> tuple[callable, callable]:
+    """
+    Module __getattr__ and __dir__ that import a package's public names on first use.
+    exports maps each name to the relative submodule defining it.
+    """
+
+    def __getattr__(name: str) -> any:
+        if name not in exports:
+            raise AttributeError(f"module '{package}' has no attribute '{name}'")
+        value = getattr(importlib.import_module(exports[name], package), name)
+        # Cache on the package so later lookups skip __getattr__
+        setattr(importlib.import_module(package), name, value)
+        return value
+
+    def __dir__() -> list[str]:
+        return sorted(set(vars(importlib.import_module(package))) | set(exports))
+
+    return __getattr__, __dir__